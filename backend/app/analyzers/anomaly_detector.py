@@ -0,0 +1,255 @@
+"""
+Streaming error-rate anomaly detection
+
+Errors are counted per fixed-length time bucket for every user, error type
+and file. When a bucket closes, its count updates an exponentially weighted
+mean and variance of that series; while a bucket is open, its running count
+is compared to the expected rate. Every update is O(1), and the state is a
+handful of arrays indexed by series, so alerts are available as soon as an
+error is ingested without any batch recomputation. A series only alerts
+once min_history buckets have closed; before that its mean and variance
+describe too little history to tell a burst from its normal rate.
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.parsers.timeline import timestamp_epoch
+
+# Redis keys of the serialized detector state and its alerts
+ANOMALY_STATE_KEY = "anomaly_state"
+ANOMALY_ALERTS_KEY = "anomaly_alerts"
+
+# Error fields that each form their own set of rate series
+ANOMALY_DIMENSIONS = ('user', 'type', 'filename')
+
+# Closed buckets replayed when a series skips over empty buckets; after this
+# many zero buckets the mean and variance have decayed to (almost) nothing
+_MAX_ZERO_BUCKETS = 64
+
+
+class AnomalyDetector:
+    """EWMA mean/variance of per-bucket error counts for every (dimension, value) series"""
+
+    def __init__(
+        self,
+        bucket_seconds: int = 300,
+        alpha: float = 0.3,
+        z_threshold: float = 3.0,
+        min_count: int = 5,
+        max_alerts: int = 500,
+        min_history: int = 6
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+        self.max_alerts = max_alerts
+        self.min_history = min_history
+
+        self.series: Dict[Tuple[str, str], int] = {}
+        self.keys: List[Tuple[str, str]] = []
+        self.last_bucket = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.float64)
+        self.mean = np.zeros(0, dtype=np.float64)
+        self.var = np.zeros(0, dtype=np.float64)
+        self.buckets_seen = np.zeros(0, dtype=np.int64)
+        # Index into self.alerts of the open bucket's alert (-1 = none)
+        self.alert_index = np.zeros(0, dtype=np.int64)
+
+        self.alerts: List[Dict[str, Any]] = []
+        self.latest_bucket: Optional[int] = None
+
+    @classmethod
+    def from_settings(cls) -> "AnomalyDetector":
+        return cls(
+            bucket_seconds=settings.ANOMALY_BUCKET_SECONDS,
+            alpha=settings.ANOMALY_EWMA_ALPHA,
+            z_threshold=settings.ANOMALY_Z_THRESHOLD,
+            min_count=settings.ANOMALY_MIN_COUNT,
+            max_alerts=settings.ANOMALY_MAX_ALERTS,
+            min_history=settings.ANOMALY_MIN_HISTORY_BUCKETS
+        )
+
+    def _series_index(self, key: Tuple[str, str], bucket: int) -> int:
+        index = self.series.get(key)
+        if index is not None:
+            return index
+
+        index = len(self.keys)
+        if index == len(self.count):
+            # Grow all arrays geometrically so appends stay amortized O(1)
+            capacity = max(16, 2 * index)
+            self.last_bucket = np.resize(self.last_bucket, capacity)
+            self.count = np.resize(self.count, capacity)
+            self.mean = np.resize(self.mean, capacity)
+            self.var = np.resize(self.var, capacity)
+            self.buckets_seen = np.resize(self.buckets_seen, capacity)
+            self.alert_index = np.resize(self.alert_index, capacity)
+
+        self.series[key] = index
+        self.keys.append(key)
+        self.last_bucket[index] = bucket
+        self.count[index] = 0.0
+        self.mean[index] = 0.0
+        self.var[index] = 0.0
+        self.buckets_seen[index] = 0
+        self.alert_index[index] = -1
+        return index
+
+    def _close_buckets(self, index: int, bucket: int):
+        """Fold the open bucket (and any empty buckets after it) into the EWMA statistics"""
+        alpha = self.alpha
+        mean = self.mean[index]
+        var = self.var[index]
+        value = self.count[index]
+        gap = int(bucket - self.last_bucket[index])
+
+        for _ in range(min(gap, _MAX_ZERO_BUCKETS)):
+            diff = value - mean
+            increment = alpha * diff
+            mean += increment
+            var = (1 - alpha) * (var + diff * increment)
+            value = 0.0
+
+        self.mean[index] = mean
+        self.var[index] = var
+        self.buckets_seen[index] += gap
+        self.last_bucket[index] = bucket
+        self.count[index] = 0.0
+        self.alert_index[index] = -1
+
+    def _check(self, index: int):
+        """Raise or update the alert of the open bucket if its count is anomalous"""
+        count = self.count[index]
+        if count < self.min_count or self.buckets_seen[index] < self.min_history:
+            return
+
+        expected = self.mean[index]
+        # Unit floor keeps a flat history from turning every extra error into an alert
+        std = max(math.sqrt(self.var[index]), 1.0)
+        z_score = (count - expected) / std
+        if z_score < self.z_threshold:
+            return
+
+        dimension, value = self.keys[index]
+        alert = {
+            'dimension': dimension,
+            'value': value,
+            'bucket_start': int(self.last_bucket[index] * self.bucket_seconds),
+            'bucket_seconds': self.bucket_seconds,
+            'count': int(count),
+            'expected': round(float(expected), 2),
+            'std': round(float(std), 2),
+            'z_score': round(float(z_score), 2),
+            'history_buckets': int(self.buckets_seen[index])
+        }
+
+        if self.alert_index[index] >= 0:
+            self.alerts[self.alert_index[index]] = alert
+        else:
+            self.alert_index[index] = len(self.alerts)
+            self.alerts.append(alert)
+            if len(self.alerts) > self.max_alerts:
+                self._trim_alerts()
+
+    def _trim_alerts(self):
+        """Drop the oldest half of the alerts once the alert list is full"""
+        dropped = len(self.alerts) - self.max_alerts // 2
+        self.alerts = self.alerts[dropped:]
+        active = self.alert_index >= 0
+        self.alert_index[active] -= dropped
+        self.alert_index[self.alert_index < 0] = -1
+
+    def update(self, error: Dict[str, Any]):
+        """Count one error (errors should arrive in time order)"""
+        epoch = timestamp_epoch(error.get('timestamp', ''))
+        if epoch is None:
+            return
+        bucket = epoch // self.bucket_seconds
+        if self.latest_bucket is None or bucket > self.latest_bucket:
+            self.latest_bucket = bucket
+
+        for dimension in ANOMALY_DIMENSIONS:
+            value = error.get(dimension)
+            if value is None:
+                continue
+            index = self._series_index((dimension, str(value)), bucket)
+            if bucket > self.last_bucket[index]:
+                self._close_buckets(index, bucket)
+            # Late errors of an already closed bucket count toward the open one
+            self.count[index] += 1
+            self._check(index)
+
+    def current_alerts(self, dimension: Optional[str] = None, window_buckets: Optional[int] = None) -> List[Dict[str, Any]]:
+        return filter_alerts(self.alerts, self.latest_bucket, self.bucket_seconds, dimension, window_buckets)
+
+    def to_json(self) -> Dict[str, Any]:
+        size = len(self.keys)
+        return {
+            'bucket_seconds': self.bucket_seconds,
+            'latest_bucket': self.latest_bucket,
+            'keys': [list(key) for key in self.keys],
+            'last_bucket': self.last_bucket[:size].tolist(),
+            'count': self.count[:size].tolist(),
+            'mean': self.mean[:size].tolist(),
+            'var': self.var[:size].tolist(),
+            'buckets_seen': self.buckets_seen[:size].tolist(),
+            'alert_index': self.alert_index[:size].tolist()
+        }
+
+    def load_state(self, state: Dict[str, Any], alerts: List[Dict[str, Any]]):
+        """Restore serialized state so ingestion can continue where it stopped"""
+        if state.get('bucket_seconds') != self.bucket_seconds:
+            return
+        self.keys = [tuple(key) for key in state['keys']]
+        self.series = {key: index for index, key in enumerate(self.keys)}
+        self.last_bucket = np.asarray(state['last_bucket'], dtype=np.int64)
+        self.count = np.asarray(state['count'], dtype=np.float64)
+        self.mean = np.asarray(state['mean'], dtype=np.float64)
+        self.var = np.asarray(state['var'], dtype=np.float64)
+        self.buckets_seen = np.asarray(state['buckets_seen'], dtype=np.int64)
+        self.alert_index = np.asarray(state['alert_index'], dtype=np.int64)
+        self.latest_bucket = state.get('latest_bucket')
+        self.alerts = list(alerts)
+
+
+def filter_alerts(
+    alerts: List[Dict[str, Any]],
+    latest_bucket: Optional[int],
+    bucket_seconds: int,
+    dimension: Optional[str] = None,
+    window_buckets: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Alerts ordered by z-score, optionally restricted to one dimension and to
+    the last window_buckets buckets of the stream
+    """
+    if dimension:
+        alerts = [alert for alert in alerts if alert['dimension'] == dimension]
+    if window_buckets is not None and latest_bucket is not None:
+        start = (latest_bucket - window_buckets + 1) * bucket_seconds
+        alerts = [alert for alert in alerts if alert['bucket_start'] >= start]
+    return sorted(alerts, key=lambda alert: alert['z_score'], reverse=True)
+
+
+def save_anomaly_detector(storage, detector: AnomalyDetector, ttl: int = 3600):
+    """Store detector state and alerts"""
+    storage.set_json(ANOMALY_STATE_KEY, ttl, detector.to_json())
+    storage.set_json(ANOMALY_ALERTS_KEY, ttl, {
+        'latest_bucket': detector.latest_bucket,
+        'bucket_seconds': detector.bucket_seconds,
+        'alerts': list(detector.alerts)
+    })
+
+
+def load_anomaly_detector(storage) -> AnomalyDetector:
+    """Restore the stored detector, or a fresh one if nothing is stored"""
+    detector = AnomalyDetector.from_settings()
+    state = storage.get_json(ANOMALY_STATE_KEY)
+    stored_alerts = storage.get_json(ANOMALY_ALERTS_KEY)
+    if state and stored_alerts:
+        detector.load_state(state, stored_alerts['alerts'])
+    return detector
@@ -0,0 +1,57 @@
+"""
+Precomputed error group index
+
+Groups errors by a fingerprint field in one pass at ingest time, so triage
+views load in O(groups) instead of clustering every row.
+"""
+from typing import Any, Dict, List
+
+from app.parsers.timeline import timestamp_sort_key
+
+
+def build_group_index(errors: List[Dict[str, Any]], key: str = 'fingerprint', sample_size: int = 5) -> List[Dict[str, Any]]:
+    """
+    Group errors by the given fingerprint field
+
+    Returns:
+        List of groups (count, first/last seen, users, sample IDs), largest first
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+
+    for error in errors:
+        fingerprint = error.get(key)
+        if not fingerprint:
+            continue
+
+        timestamp = error.get('timestamp', '')
+        group = groups.get(fingerprint)
+        if group is None:
+            group = groups[fingerprint] = {
+                'fingerprint': fingerprint,
+                'type': error.get('type'),
+                'code': error.get('code'),
+                'severity': error.get('severity'),
+                'count': 0,
+                'first_seen': timestamp,
+                'last_seen': timestamp,
+                'users': {},
+                'sample_ids': [],
+                'sample_content': error.get('content', '')
+            }
+
+        group['count'] += 1
+        group['users'][error.get('user')] = group['users'].get(error.get('user'), 0) + 1
+        if len(group['sample_ids']) < sample_size:
+            group['sample_ids'].append(error.get('id'))
+
+        # Errors normally arrive time-ordered, but don't rely on it here
+        sort_key = timestamp_sort_key(timestamp)
+        if sort_key < timestamp_sort_key(group['first_seen']):
+            group['first_seen'] = timestamp
+        if sort_key > timestamp_sort_key(group['last_seen']):
+            group['last_seen'] = timestamp
+
+    result = sorted(groups.values(), key=lambda g: g['count'], reverse=True)
+    for group in result:
+        group['user_count'] = len(group['users'])
+    return result
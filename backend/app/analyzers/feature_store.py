@@ -0,0 +1,111 @@
+"""
+Incremental hashed text features for similarity and clustering
+
+Term counts come from a stateless HashingVectorizer, so there is no
+vocabulary to fit or keep in memory, and document frequencies are updated
+as rows are appended. New errors are featurized once and appended to the
+stored count matrix; TF-IDF weights are derived on demand from the current
+IDF statistics, so history is never re-tokenized.
+"""
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from app.core.config import settings
+
+
+class HashingFeatureStore:
+    """Hashed term-count matrix with incrementally maintained document frequencies"""
+
+    def __init__(self, n_features: int = 2 ** 18):
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None
+        )
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.counts = sp.csr_matrix((0, n_features), dtype=np.float64)
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+
+    @property
+    def n_documents(self) -> int:
+        return len(self.ids)
+
+    def append(self, ids: Iterable[int], texts: List[str]):
+        """Featurize new rows only and append them to the stored matrix"""
+        new_counts = self.vectorizer.transform(texts).tocsr()
+        new_counts.sum_duplicates()
+        self.ids = np.concatenate([self.ids, np.asarray(list(ids), dtype=np.int64)])
+        self.counts = sp.vstack([self.counts, new_counts], format='csr')
+        self.document_frequency += np.bincount(new_counts.indices, minlength=self.n_features)
+
+    def idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency (same formula as TfidfVectorizer)"""
+        return np.log((1 + self.n_documents) / (1 + self.document_frequency)) + 1
+
+    def rows_for_ids(self, ids: Iterable[int]) -> Optional[np.ndarray]:
+        """Matrix rows of the given error IDs, or None if any ID is not stored"""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        order = np.argsort(self.ids, kind='stable')
+        positions = np.searchsorted(self.ids[order], ids)
+        positions = np.minimum(positions, max(len(order) - 1, 0))
+        if len(order) == 0 or not np.array_equal(self.ids[order][positions], ids):
+            return None
+        return order[positions]
+
+    def tfidf(self, rows: Optional[np.ndarray] = None) -> sp.csr_matrix:
+        """L2-normalized TF-IDF rows based on the current IDF statistics"""
+        counts = self.counts if rows is None else self.counts[rows]
+        return normalize(counts @ sp.diags(self.idf()), norm='l2', copy=False).tocsr()
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            temp_path,
+            n_features=np.array([self.n_features]),
+            ids=self.ids,
+            data=self.counts.data,
+            indices=self.counts.indices,
+            indptr=self.counts.indptr,
+            document_frequency=self.document_frequency
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashingFeatureStore":
+        with np.load(path) as data:
+            store = cls(int(data['n_features'][0]))
+            store.ids = data['ids']
+            store.counts = sp.csr_matrix(
+                (data['data'], data['indices'], data['indptr']), shape=(len(store.ids), store.n_features)
+            )
+            store.document_frequency = data['document_frequency']
+        return store
+
+
+def feature_store_path(version: str) -> str:
+    """File path of the feature store of a dataset version"""
+    return os.path.join(settings.UPLOAD_DIR, "features", f"features_{version}.npz")
+
+
+def save_feature_store(version: str, store: HashingFeatureStore) -> str:
+    """Persist a feature store for a dataset version (the dataset registry removes replaced versions)"""
+    path = feature_store_path(version)
+    store.save(path)
+    return path
+
+
+def load_feature_store(version: str) -> Optional[HashingFeatureStore]:
+    """Load the feature store of a dataset version, if one was written"""
+    path = feature_store_path(version)
+    if not os.path.exists(path):
+        return None
+    return HashingFeatureStore.load(path)
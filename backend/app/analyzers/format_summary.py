@@ -0,0 +1,158 @@
+"""
+Per-format summaries of a dataset (Visual Objects and .NET logs)
+
+Rows are labelled with their log format once, and every histogram is then
+a single bincount over format and category code together, so both formats
+are summarized in one pass over the column view of the dataset. .NET rows
+additionally group their exception classes by namespace and by chain of
+inner exceptions.
+"""
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.parsers.sniffer import DOTNET, VISUAL_OBJECTS
+from app.utils.dataset_cache import MISSING_TIME, ErrorColumns
+
+# Format of row index i in the per-format arrays
+FORMATS = (VISUAL_OBJECTS, DOTNET)
+
+TIMESTAMP_FORMAT = '%d.%m.%Y %H:%M:%S'
+
+
+def row_formats(columns: ErrorColumns) -> np.ndarray:
+    """Format index (position in FORMATS) of every row; only .NET rows carry a stack trace"""
+    return np.fromiter(('frames' in error for error in columns.errors), dtype=np.int64, count=columns.size)
+
+
+def _counts_by_format(formats: np.ndarray, codes: np.ndarray, labels: np.ndarray) -> List[Dict[str, int]]:
+    """Value counts of a coded column (-1 = missing) per format, most frequent first"""
+    size = len(labels)
+    valid = codes >= 0
+    counts = np.bincount(
+        formats[valid] * size + codes[valid], minlength=len(FORMATS) * size
+    ).reshape(len(FORMATS), size)
+    result = []
+    for row in counts:
+        order = np.argsort(row, kind='stable')[::-1]
+        result.append({str(labels[i]): int(row[i]) for i in order if row[i] > 0})
+    return result
+
+
+def _code_severity_by_format(formats: np.ndarray, codes: np.ndarray, severity_codes: np.ndarray,
+                             severities: np.ndarray) -> List[Dict[str, Dict[str, int]]]:
+    """Severity counts per error code and format"""
+    code_ids, code_values = pd.factorize(codes)
+    valid = (codes >= 0) & (severity_codes >= 0)
+    shape = (len(FORMATS), len(code_values), len(severities))
+    counts = np.bincount(
+        np.ravel_multi_index((formats[valid], code_ids[valid], severity_codes[valid]), shape),
+        minlength=int(np.prod(shape))
+    ).reshape(shape)
+    return [
+        {
+            str(code_values[c]): {str(severities[s]): int(counts[f, c, s]) for s in np.flatnonzero(counts[f, c])}
+            for c in np.argsort(code_values)
+            if counts[f, c].any()
+        }
+        for f in range(len(FORMATS))
+    ]
+
+
+def _time_range(times: np.ndarray) -> Dict[str, Optional[str]]:
+    times = times[times != MISSING_TIME]
+    if not len(times):
+        return {"start": None, "end": None}
+    return {
+        "start": pd.Timestamp(int(times.min()), unit='s').strftime(TIMESTAMP_FORMAT),
+        "end": pd.Timestamp(int(times.max()), unit='s').strftime(TIMESTAMP_FORMAT)
+    }
+
+
+def exception_hierarchy(class_counts: Dict[str, int]) -> List[Dict[str, Any]]:
+    """
+    Exception classes as a namespace tree (System -> IO -> FileNotFoundException),
+    counts summed up the tree, largest first
+    """
+    root: Dict[str, Any] = {}
+    for name, count in class_counts.items():
+        level = root
+        for part in name.split('.'):
+            node = level.setdefault(part, {"count": 0, "children": {}})
+            node["count"] += count
+            level = node["children"]
+
+    def to_list(level: Dict[str, Any]) -> List[Dict[str, Any]]:
+        nodes = [
+            {"name": name, "count": node["count"], "children": to_list(node["children"])}
+            for name, node in level.items()
+        ]
+        return sorted(nodes, key=lambda node: node["count"], reverse=True)
+
+    return to_list(root)
+
+
+def _exception_classes(errors: Iterable[Dict[str, Any]], top_chains: int) -> Dict[str, Any]:
+    classes: Counter = Counter()
+    chains: Counter = Counter()
+    for error in errors:
+        exceptions = error.get('exceptions') or []
+        classes[exceptions[0] if exceptions else error.get('type', 'Unknown')] += 1
+        if len(exceptions) > 1:
+            chains[" -> ".join(exceptions)] += 1
+    return {
+        "exception_types": dict(classes.most_common()),
+        "exception_hierarchy": exception_hierarchy(classes),
+        "exception_chains": [{"chain": chain, "count": count} for chain, count in chains.most_common(top_chains)]
+    }
+
+
+def summarize_formats(columns: ErrorColumns, filenames: Optional[List[str]] = None,
+                      top_chains: int = 10) -> Dict[str, Dict[str, Any]]:
+    """
+    Summaries of the Visual Objects and of the .NET rows of a dataset
+
+    Args:
+        columns: Column view of the dataset
+        filenames: Only summarize rows of these files (all files if empty)
+        top_chains: Number of inner-exception chains listed for .NET
+
+    Returns:
+        Summary per format name
+    """
+    rows = np.arange(columns.size)
+    if filenames:
+        wanted = np.flatnonzero(np.isin(columns.categories['filename'], filenames))
+        rows = rows[np.isin(columns.category_codes['filename'], wanted)]
+
+    formats = row_formats(columns)[rows]
+    codes = columns.codes[rows]
+    category = {field: columns.category_codes[field][rows] for field in ('type', 'user', 'severity', 'filename')}
+    counts = {
+        field: _counts_by_format(formats, field_codes, columns.categories[field])
+        for field, field_codes in category.items()
+    }
+    code_labels, code_ids = np.unique(codes[codes >= 0], return_inverse=True)
+    code_column = np.full(len(codes), -1, dtype=np.int64)
+    code_column[codes >= 0] = code_ids
+    code_counts = _counts_by_format(formats, code_column, code_labels)
+    code_severity = _code_severity_by_format(formats, codes, category['severity'], columns.categories['severity'])
+
+    summaries = {}
+    for index, name in enumerate(FORMATS):
+        selected = formats == index
+        summaries[name] = {
+            "total_exceptions" if name == DOTNET else "total_errors": int(selected.sum()),
+            "error_types": counts['type'][index],
+            "severities": counts['severity'][index],
+            "codes": code_counts[index],
+            "code_severity": code_severity[index],
+            "time_range": _time_range(columns.times[rows[selected]]),
+            "users": counts['user'][index],
+            "files": sorted(counts['filename'][index])
+        }
+
+    summaries[DOTNET].update(_exception_classes(columns.rows(rows[formats == FORMATS.index(DOTNET)]), top_chains))
+    return summaries
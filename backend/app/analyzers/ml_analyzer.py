@@ -4,7 +4,7 @@ Provides advanced analytics including user risk scoring, error clustering,
 and auto-categorization of error patterns.
 """
 
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -15,19 +15,44 @@ from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import DBSCAN
 import re
 
+from app.analyzers.feature_store import HashingFeatureStore
+from app.core.metrics import stage
+
 
 class MLAnalyzer:
     """Advanced ML-based analyzer for error log insights"""
     
-    def __init__(self):
+    def __init__(self, feature_store: Optional[HashingFeatureStore] = None):
         self.vectorizer = TfidfVectorizer(
             stop_words='english',
             max_features=1000,
             ngram_range=(1, 2)
         )
+        # Optional incremental hashed features; used instead of refitting TF-IDF
+        # whenever every requested error is already in the store
+        self.feature_store = feature_store
         self.error_clusters = {}
         self.user_profiles = {}
     
+    def append_features(self, errors: List[Dict[str, Any]]):
+        """Featurize new errors and append them to the feature store"""
+        if self.feature_store is None or not errors:
+            return
+        self.feature_store.append(
+            [error.get('id') for error in errors],
+            [self._prepare_error_text(error) for error in errors]
+        )
+    
+    def _vectorize(self, texts: List[str], error_ids: List[Any]):
+        """TF-IDF rows for the given errors, from the feature store when possible"""
+        if self.feature_store is not None:
+            rows = self.feature_store.rows_for_ids(error_ids)
+            if rows is not None:
+                with stage("ml.feature_store"):
+                    return self.feature_store.tfidf(rows)
+        with stage("ml.tfidf"):
+            return self.vectorizer.fit_transform(texts)
+    
     def calculate_user_risk_scores(self, errors: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
         """
         Calculate comprehensive risk scores for users based on their error patterns
@@ -38,7 +63,8 @@ class MLAnalyzer:
         if not errors:
             return {}
         
-        df = pd.DataFrame(errors)
+        with stage("ml.dataframe"):
+            df = pd.DataFrame(errors)
         user_scores = {}
         
         for user in df['user'].unique():
@@ -139,7 +165,10 @@ class MLAnalyzer:
             # Convert timestamps and sort
             user_errors = user_errors.copy()
             user_errors['date'] = pd.to_datetime(user_errors['timestamp'], format='%d.%m.%Y %H:%M:%S', errors='coerce')
-            user_errors = user_errors.dropna(subset=['date']).sort_values('date')
+            user_errors = user_errors.dropna(subset=['date'])
+            # Uploaded datasets are already time-ordered; only sort foreign input
+            if not user_errors['date'].is_monotonic_increasing:
+                user_errors = user_errors.sort_values('date')
             
             if len(user_errors) < 2:
                 return 5.0
@@ -233,8 +262,9 @@ class MLAnalyzer:
         all_texts = [target_text] + candidate_texts
         
         try:
-            tfidf_matrix = self.vectorizer.fit_transform(all_texts)
-            similarities = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
+            tfidf_matrix = self._vectorize(all_texts, [target_id] + candidates['id'].tolist())
+            with stage("ml.similarity"):
+                similarities = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
             
             # Add similarity scores to candidates
             candidates = candidates.copy()
@@ -260,6 +290,95 @@ class MLAnalyzer:
             same_type = candidates[candidates['type'] == target_error.get('type', '')]
             return same_type.head(limit).to_dict('records')
     
+    def find_similar_errors_batch(self, target_ids: List[int], all_errors: List[Dict[str, Any]], limit: int = 5,
+                                  block_size: int = 256) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Find the top-k similar errors for many target errors at once
+        
+        TF-IDF is fitted once and similarities are computed block by block as
+        sparse matrix products, so memory per block stays bounded.
+        
+        Returns:
+            Dict of target error ID -> similar errors with similarity scores
+        """
+        if not all_errors:
+            return {}
+        
+        row_of = {error.get('id'): row for row, error in enumerate(all_errors)}
+        target_rows = np.array([row_of[error_id] for error_id in target_ids if error_id in row_of], dtype=np.int64)
+        if len(target_rows) == 0:
+            return {}
+        
+        neighbor_rows, neighbor_scores = self._blocked_top_k(all_errors, target_rows, limit, block_size)
+        
+        result = {}
+        for target_row, rows, scores in zip(target_rows, neighbor_rows, neighbor_scores):
+            similar = []
+            for row, score in zip(rows, scores):
+                if row < 0:
+                    break
+                error_dict = dict(all_errors[row])
+                error_dict['similarity_score'] = round(float(score), 3)
+                error_dict['similarity_percentage'] = round(float(score) * 100, 1)
+                similar.append(error_dict)
+            result[all_errors[target_row].get('id')] = similar
+        
+        return result
+    
+    def build_neighbor_table(self, all_errors: List[Dict[str, Any]], limit: int = 10,
+                             block_size: int = 256) -> Dict[str, np.ndarray]:
+        """
+        Compute the nearest-neighbour table for every error in the dataset
+        
+        Returns:
+            Dict with 'ids' (n), 'neighbors' (n x limit error IDs, 0 = none)
+            and 'scores' (n x limit similarities)
+        """
+        ids = np.array([error.get('id', 0) for error in all_errors], dtype=np.int64)
+        if len(all_errors) == 0:
+            return {'ids': ids, 'neighbors': np.zeros((0, limit), dtype=np.int64), 'scores': np.zeros((0, limit), dtype=np.float32)}
+        
+        neighbor_rows, neighbor_scores = self._blocked_top_k(all_errors, np.arange(len(all_errors)), limit, block_size)
+        neighbors = np.where(neighbor_rows >= 0, ids[np.maximum(neighbor_rows, 0)], 0)
+        
+        return {'ids': ids, 'neighbors': neighbors, 'scores': neighbor_scores.astype(np.float32)}
+    
+    def _blocked_top_k(self, all_errors: List[Dict[str, Any]], target_rows: np.ndarray, limit: int,
+                       block_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k cosine neighbours of the target rows (-1 marks missing neighbours)"""
+        texts = [self._prepare_error_text(error) for error in all_errors]
+        # TF-IDF rows are L2-normalized, so the sparse dot product is the cosine similarity
+        tfidf_matrix = self._vectorize(texts, [error.get('id') for error in all_errors]).tocsr()
+        tfidf_transposed = tfidf_matrix.T.tocsc()
+        
+        neighbor_rows = np.full((len(target_rows), limit), -1, dtype=np.int64)
+        neighbor_scores = np.zeros((len(target_rows), limit), dtype=np.float64)
+        
+        for start in range(0, len(target_rows), block_size):
+            block = target_rows[start:start + block_size]
+            similarities = (tfidf_matrix[block] @ tfidf_transposed).tocsr()
+            
+            for offset, target_row in enumerate(block):
+                row_start, row_end = similarities.indptr[offset], similarities.indptr[offset + 1]
+                columns = similarities.indices[row_start:row_end]
+                scores = similarities.data[row_start:row_end]
+                
+                # Never return the target itself
+                keep = columns != target_row
+                columns, scores = columns[keep], scores[keep]
+                if len(scores) == 0:
+                    continue
+                
+                if len(scores) > limit:
+                    top = np.argpartition(-scores, limit - 1)[:limit]
+                    columns, scores = columns[top], scores[top]
+                order = np.argsort(-scores, kind='stable')
+                count = len(order)
+                neighbor_rows[start + offset, :count] = columns[order]
+                neighbor_scores[start + offset, :count] = scores[order]
+        
+        return neighbor_rows, neighbor_scores
+    
     def _prepare_error_text(self, error: Dict[str, Any]) -> str:
         """Prepare error text for similarity analysis"""
         parts = []
@@ -303,11 +422,13 @@ class MLAnalyzer:
         
         try:
             # Use TF-IDF for feature extraction
-            tfidf_matrix = self.vectorizer.fit_transform(error_texts)
+            tfidf_matrix = self._vectorize(error_texts, [error.get('id') for error in errors])
             
-            # Use DBSCAN for clustering (automatically determines number of clusters)
+            # Use DBSCAN for clustering (automatically determines number of clusters);
+            # cosine DBSCAN accepts the sparse matrix directly
             clustering = DBSCAN(eps=0.3, min_samples=2, metric='cosine')
-            cluster_labels = clustering.fit_predict(tfidf_matrix.toarray())
+            with stage("ml.dbscan"):
+                cluster_labels = clustering.fit_predict(tfidf_matrix)
             
             # Analyze clusters
             categories = {}
@@ -444,7 +565,10 @@ class MLAnalyzer:
         
         try:
             df['datetime'] = pd.to_datetime(df['timestamp'], format='%d.%m.%Y %H:%M:%S', errors='coerce')
-            df = df.dropna(subset=['datetime']).sort_values('datetime')
+            df = df.dropna(subset=['datetime'])
+            # Uploaded datasets are already time-ordered; only sort foreign input
+            if not df['datetime'].is_monotonic_increasing:
+                df = df.sort_values('datetime')
             
             # Look for error bursts (multiple errors within short time windows)
             time_threshold = timedelta(minutes=30)  # 30-minute window
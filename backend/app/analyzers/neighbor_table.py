@@ -0,0 +1,54 @@
+"""
+On-disk nearest-neighbour tables
+
+An all-pairs similarity run writes one table per dataset version, so later
+similar-error lookups are an array lookup instead of a TF-IDF refit.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def neighbor_table_path(version: str) -> str:
+    """File path of the neighbour table of a dataset version"""
+    return os.path.join(settings.UPLOAD_DIR, "neighbors", f"neighbors_{version}.npz")
+
+
+def save_neighbor_table(version: str, table: Dict[str, np.ndarray]) -> str:
+    """Write a neighbour table to disk (the dataset registry removes replaced versions)"""
+    path = neighbor_table_path(version)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first so readers never see a partial table
+    temp_path = path + ".tmp.npz"
+    np.savez_compressed(temp_path, **table)
+    os.replace(temp_path, path)
+    return path
+
+
+def load_neighbor_table(version: str) -> Optional[Dict[str, np.ndarray]]:
+    """Load the neighbour table of a dataset version, if one was built"""
+    path = neighbor_table_path(version)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def lookup_neighbors(table: Dict[str, np.ndarray], error_id: int, limit: int) -> Optional[List[Tuple[int, float]]]:
+    """Neighbour (error ID, score) pairs of one error, or None if the table can't answer"""
+    if limit > table['neighbors'].shape[1]:
+        return None
+    rows = np.flatnonzero(table['ids'] == error_id)
+    if len(rows) == 0:
+        return None
+    row = rows[0]
+    return [
+        (int(neighbor), float(score))
+        for neighbor, score in zip(table['neighbors'][row][:limit], table['scores'][row][:limit])
+        if neighbor > 0
+    ]
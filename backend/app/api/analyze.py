@@ -1,71 +1,91 @@
 """
 Analysis API endpoints
 """
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.storage import StorageBackend
+from app.parsers.sniffer import DOTNET, VISUAL_OBJECTS, sniff_log
+from app.analyzers.format_summary import summarize_formats
+from app.utils.archives import is_archive
+from app.utils.dataset_cache import get_error_columns, get_versioned
+from app.utils.datasets import get_dataset_storage
 
 router = APIRouter()
 
+class FormatAnalysisRequest(BaseModel):
+    filenames: List[str] = []  # Restrict the analysis to these files; all files when empty
+
+def _format_summary(storage: StorageBackend, log_format: str, filenames: List[str]) -> Dict[str, Any]:
+    """Summary of one format, cached per dataset version unless restricted to some files"""
+    columns = get_error_columns(storage)
+    if filenames:
+        return summarize_formats(columns, filenames)[log_format]
+    summaries = get_versioned("format_summaries", lambda client, version: summarize_formats(columns), storage)
+    return summaries[log_format]
+
 @router.post("/analyze/detect-types")
-async def detect_log_types(filenames: List[str]):
+async def detect_log_types(files: List[UploadFile] = File(...)):
     """
-    Auto-detect log file types (Visual Objects vs .NET)
+    Detect log format and encoding of uploaded files from their first bytes
+    
+    Only LOG_SNIFF_BYTES of each file are read, so clients may send just the
+    beginning of every file (the web client sends a slice). The encoding is
+    "unknown" while those bytes are plain ASCII.
     """
     try:
-        # TODO: Implement log type detection
         detected_types = {}
-        for filename in filenames:
-            if filename.startswith("E_"):
-                detected_types[filename] = "visual_objects"
-            elif filename.startswith("EC_"):
-                detected_types[filename] = ".net"
-            else:
-                detected_types[filename] = "unknown"
+        encodings = {}
+        for file in files:
+            if is_archive(file.filename):
+                detected_types[file.filename] = "archive"
+                continue
+            sniff = sniff_log(await file.read(settings.LOG_SNIFF_BYTES), file.filename)
+            detected_types[file.filename] = sniff.log_format or "unknown"
+            encodings[file.filename] = sniff.encoding or "unknown"
         
-        return {"detected_types": detected_types}
+        return {"detected_types": detected_types, "encodings": encodings}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Type detection failed: {str(e)}")
 
 @router.post("/analyze/visual-objects")
-async def analyze_visual_objects_logs(filenames: List[str]):
+async def analyze_visual_objects_logs(request: Optional[FormatAnalysisRequest] = None,
+                                      storage: StorageBackend = Depends(get_dataset_storage)):
     """
-    Analyze Visual Objects error logs (E_*.LOG files)
+    Analyze Visual Objects error logs (E_*.LOG files) of the stored dataset:
+    error types, codes with their severities, time range and errors per user
     """
     try:
-        # TODO: Implement Visual Objects analysis
+        filenames = request.filenames if request else []
+        summary = _format_summary(storage, VISUAL_OBJECTS, filenames)
         return {
             "analysis_type": "visual_objects",
-            "files_analyzed": filenames,
-            "summary": {
-                "total_errors": 0,
-                "error_types": {},
-                "time_range": {},
-                "users": []
-            }
+            "files_analyzed": summary["files"],
+            "summary": summary
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Visual Objects analysis failed: {str(e)}")
 
 @router.post("/analyze/dotnet")
-async def analyze_dotnet_logs(filenames: List[str]):
+async def analyze_dotnet_logs(request: Optional[FormatAnalysisRequest] = None,
+                              storage: StorageBackend = Depends(get_dataset_storage)):
     """
-    Analyze .NET error logs (EC_*.LOG files)
+    Analyze .NET error logs (EC_*.LOG files) of the stored dataset: exception
+    classes with their namespace hierarchy and inner-exception chains, codes,
+    time range and exceptions per user
     """
     try:
-        # TODO: Implement .NET analysis
+        filenames = request.filenames if request else []
+        summary = _format_summary(storage, DOTNET, filenames)
         return {
             "analysis_type": "dotnet",
-            "files_analyzed": filenames,
-            "summary": {
-                "total_exceptions": 0,
-                "exception_types": {},
-                "time_range": {},
-                "users": []
-            }
+            "files_analyzed": summary["files"],
+            "summary": summary
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f".NET analysis failed: {str(e)}")
-
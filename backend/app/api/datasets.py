@@ -0,0 +1,35 @@
+"""
+Dataset registry endpoints
+"""
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.datasets import delete_dataset, list_datasets
+
+router = APIRouter()
+
+@router.get("/datasets")
+async def get_datasets():
+    """
+    List stored datasets with size, creation, publish and last access time
+    
+    Pass a dataset ID as the dataset query parameter of the errors and ML
+    endpoints to read that dataset instead of the current one.
+    """
+    try:
+        return {"datasets": list_datasets()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list datasets: {str(e)}")
+
+@router.delete("/datasets/{dataset_id}")
+async def remove_dataset(dataset_id: str):
+    """Delete a dataset and its derived files"""
+    try:
+        # Waits for the registry lock, which another worker may hold
+        if not await run_in_threadpool(delete_dataset, dataset_id):
+            raise HTTPException(status_code=404, detail=f"Dataset '{dataset_id}' not found")
+        return {"message": "Dataset deleted", "dataset_id": dataset_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete dataset: {str(e)}")
@@ -1,28 +1,35 @@
 """
 Error analysis endpoints
 """
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
-import redis
-import json
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import random
+import numpy as np
 
-router = APIRouter()
+from app.core.config import settings
+from app.core.storage import StorageBackend, get_storage
+from app.parsers.sniffer import decode_log
+from app.parsers.stack_trace import FrameTable
+from app.utils.dataset_cache import get_error_columns, get_versioned
+from app.utils.datasets import get_dataset_storage
+from app.utils.query_dsl import QueryError, compile_query
+from app.utils.inverted_index import get_content_index
+from app.utils.raw_logs import raw_log_encoding, read_raw_entry
+from app.utils.sketches import DAY_SECONDS, HOUR_SECONDS, load_sketch_history
 
-# Redis connection for storing analysis results
-redis_client = redis.Redis(host='redis', port=6379, db=0, decode_responses=True)
+router = APIRouter()
 
 @router.get("/errors/summary")
-async def get_error_summary():
+async def get_error_summary(storage: StorageBackend = Depends(get_dataset_storage)):
     """Get summary statistics of analyzed errors"""
     try:
-        # Try to get summary from Redis
-        summary_data = redis_client.get("error_summary")
-        if summary_data:
-            return json.loads(summary_data)
+        # Try to get summary from storage
+        summary = storage.get_json("error_summary")
+        if summary is not None:
+            return summary
         
-        # If no data in Redis, return empty summary
+        # If no data in storage, return empty summary
         return {
             "total_errors": 0,
             "critical_errors": 0,
@@ -32,15 +39,59 @@ async def get_error_summary():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get error summary: {str(e)}")
 
+def _parse_history_bound(value: Optional[str]) -> Optional[int]:
+    """Epoch seconds of an ISO date or datetime query parameter"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return int((parsed - datetime(1970, 1, 1, tzinfo=parsed.tzinfo)).total_seconds())
+
+@router.get("/errors/summary/history")
+async def get_error_summary_history(
+    granularity: str = "hour",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    top: int = 5
+):
+    """
+    Get approximate per-hour or per-day statistics over the ingest history
+    
+    Distinct users and fingerprints come from HyperLogLog sketches and type
+    counts from Count-Min sketches; each bucket reports its error bounds.
+    start and end are ISO dates or datetimes (end exclusive).
+    """
+    bucket_lengths = {"hour": HOUR_SECONDS, "day": DAY_SECONDS}
+    if granularity not in bucket_lengths:
+        raise HTTPException(status_code=400, detail="granularity must be 'hour' or 'day'")
+    try:
+        start_epoch = _parse_history_bound(start)
+        end_epoch = _parse_history_bound(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be ISO dates or datetimes")
+    
+    try:
+        # The history spans all datasets and lives in the shared storage
+        history = get_versioned("sketch_history", lambda client, version: load_sketch_history(client), get_storage())
+        buckets = history.rollup(bucket_lengths[granularity], start_epoch, end_epoch)
+        
+        return {
+            "granularity": granularity,
+            "buckets": [
+                {"bucket_start": datetime.utcfromtimestamp(bucket_start).isoformat(), **bucket.summary(top)}
+                for bucket_start, bucket in buckets.items()
+            ],
+            "total": history.total(start_epoch, end_epoch).summary(top)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get summary history: {str(e)}")
+
 @router.get("/errors")
-async def get_errors(page: int = 1, limit: int = 100):
+async def get_errors(page: int = 1, limit: int = 100, storage: StorageBackend = Depends(get_dataset_storage)):
     """Get paginated list of all errors"""
     try:
-        # Try to get errors from Redis
-        errors_data = redis_client.get("analyzed_errors")
-        if errors_data:
-            all_errors = json.loads(errors_data)
-            
+        # Try to get errors from storage
+        all_errors = storage.get_json("analyzed_errors")
+        if all_errors is not None:
             # Paginate results
             start_idx = (page - 1) * limit
             end_idx = start_idx + limit
@@ -65,14 +116,173 @@ async def get_errors(page: int = 1, limit: int = 100):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get errors: {str(e)}")
 
+@router.get("/errors/query")
+async def query_errors(q: str, page: int = 1, limit: int = 100, storage: StorageBackend = Depends(get_dataset_storage)):
+    """
+    Evaluate a query such as
+    severity:Critical AND user:GAM AND time:[26.06.2025 10:00 TO 26.06.2025 12:00] AND content:"ACCESS"
+    and return one page of matches with facet counts over all matches
+    """
+    try:
+        plan = compile_query(q)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid query: {str(e)}")
+    
+    try:
+        columns = get_error_columns(storage)
+        matches = np.flatnonzero(plan(columns)) if columns.size else np.array([], dtype=np.int64)
+        
+        # Paginate results
+        start_idx = (page - 1) * limit
+        end_idx = start_idx + limit
+        
+        return {
+            "query": q,
+            "errors": columns.rows(matches[start_idx:end_idx]),
+            "total": int(len(matches)),
+            "page": page,
+            "limit": limit,
+            "has_more": end_idx < len(matches),
+            "facets": {field: columns.facet(field, matches) for field in settings.QUERY_FACET_FIELDS}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to query errors: {str(e)}")
+
+@router.get("/errors/search")
+async def search_errors(q: str, page: int = 1, limit: int = 100, storage: StorageBackend = Depends(get_dataset_storage)):
+    """
+    Full-text search over error content using the inverted index
+    
+    Terms are combined with AND, OR separates alternatives and "quoted
+    phrases" must appear verbatim, e.g. DoThing OR "ACCESS VIOLATION"
+    """
+    try:
+        index = get_content_index(storage)
+        columns = get_error_columns(storage)
+        
+        def phrase_check(ids: np.ndarray, phrase: str) -> np.ndarray:
+            # Only the candidates from the posting intersection are inspected
+            phrase = phrase.lower()
+            rows = np.searchsorted(columns.ids, ids)
+            keep = np.array([phrase in columns.content_lower.iat[row] for row in rows], dtype=bool)
+            return ids[keep]
+        
+        ids = index.search(q, phrase_check)
+        
+        # Paginate results
+        start_idx = (page - 1) * limit
+        end_idx = start_idx + limit
+        rows = np.searchsorted(columns.ids, ids[start_idx:end_idx])
+        
+        return {
+            "query": q,
+            "errors": columns.rows(rows),
+            "total": int(len(ids)),
+            "page": page,
+            "limit": limit,
+            "has_more": end_idx < len(ids)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search errors: {str(e)}")
+
+@router.get("/errors/groups")
+async def get_error_groups(by: str = "message", limit: int = 50, offset: int = 0,
+                           storage: StorageBackend = Depends(get_dataset_storage)):
+    """
+    Get precomputed error groups (same fingerprint) with count, first/last
+    seen, users and sample IDs
+    
+    by: "message" groups by normalized message fingerprint,
+        "stack" groups .NET errors by stack trace fingerprint
+    """
+    group_keys = {"message": "error_groups", "stack": "stack_groups"}
+    if by not in group_keys:
+        raise HTTPException(status_code=400, detail=f"Invalid grouping '{by}'. Allowed: {list(group_keys)}")
+    
+    try:
+        groups = storage.get_json(group_keys[by]) or []
+        
+        return {
+            "by": by,
+            "groups": groups[offset:offset + limit],
+            "total_groups": len(groups),
+            "total_errors": sum(group['count'] for group in groups),
+            "offset": offset,
+            "limit": limit,
+            "has_more": offset + limit < len(groups)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get error groups: {str(e)}")
+
+@router.get("/errors/{error_id}/stack")
+async def get_error_stack(error_id: int, storage: StorageBackend = Depends(get_dataset_storage)):
+    """Get exception chain and resolved stack frames of a single error"""
+    try:
+        errors = storage.get_json("analyzed_errors")
+        if errors is None:
+            raise HTTPException(status_code=404, detail="No error data found")
+        
+        error = next((e for e in errors if e.get('id') == error_id), None)
+        if error is None:
+            raise HTTPException(status_code=404, detail="Error not found")
+        
+        frame_table = FrameTable(storage.get_json("stack_frames") or [])
+        
+        return {
+            "id": error_id,
+            "type": error.get('type'),
+            "exceptions": error.get('exceptions', []),
+            "frames": frame_table.resolve(error.get('frames', [])),
+            "stack_fingerprint": error.get('stack_fingerprint')
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get stack trace: {str(e)}")
+
+@router.get("/errors/{error_id}/raw")
+async def get_error_raw(error_id: int, storage: StorageBackend = Depends(get_dataset_storage)):
+    """Get the complete original log entry of a single error from the kept upload file"""
+    try:
+        columns = get_error_columns(storage)
+        if not columns.size:
+            raise HTTPException(status_code=404, detail="No error data found")
+        
+        # IDs are assigned in list order, so the column is sorted
+        row = int(np.searchsorted(columns.ids, error_id))
+        if row == columns.size or columns.ids[row] != error_id:
+            raise HTTPException(status_code=404, detail="Error not found")
+        error = columns.errors[row]
+        
+        entry = None
+        if error.get('file_id'):
+            entry = read_raw_entry(error['file_id'], error['offset'], error['length'])
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Original log entry is no longer available")
+        
+        return {
+            "id": error_id,
+            "filename": error.get('filename'),
+            "file_id": error['file_id'],
+            "offset": error['offset'],
+            "length": error['length'],
+            # With the encoding the file was parsed with; unrecorded (ASCII so far, or kept
+            # before encodings were) the entry's own bytes decide
+            "raw_log_entry": decode_log(entry, raw_log_encoding(error['file_id']))
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get log entry: {str(e)}")
+
 @router.get("/errors/timeline")
-async def get_error_timeline():
+async def get_error_timeline(storage: StorageBackend = Depends(get_dataset_storage)):
     """Get error timeline data for charts"""
     try:
-        # Try to get timeline from Redis
-        timeline_data = redis_client.get("error_timeline")
-        if timeline_data:
-            return json.loads(timeline_data)
+        # Try to get timeline from storage
+        timeline = storage.get_json("error_timeline")
+        if timeline is not None:
+            return timeline
         
         # Generate demo timeline data
         now = datetime.now()
@@ -87,13 +297,13 @@ async def get_error_timeline():
         raise HTTPException(status_code=500, detail=f"Failed to get timeline: {str(e)}")
 
 @router.get("/errors/types")
-async def get_error_types():
+async def get_error_types(storage: StorageBackend = Depends(get_dataset_storage)):
     """Get error types distribution for pie chart"""
     try:
-        # Try to get types from Redis
-        types_data = redis_client.get("error_types")
-        if types_data:
-            return json.loads(types_data)
+        # Try to get types from storage
+        types = storage.get_json("error_types")
+        if types is not None:
+            return types
         
         # Generate demo error types data
         return {
@@ -104,13 +314,13 @@ async def get_error_types():
         raise HTTPException(status_code=500, detail=f"Failed to get error types: {str(e)}")
 
 @router.get("/errors/users")
-async def get_user_activity():
+async def get_user_activity(storage: StorageBackend = Depends(get_dataset_storage)):
     """Get user activity data for bar chart"""
     try:
-        # Try to get user activity from Redis
-        users_data = redis_client.get("user_activity")
-        if users_data:
-            return json.loads(users_data)
+        # Try to get user activity from storage
+        users = storage.get_json("user_activity")
+        if users is not None:
+            return users
         
         # Generate demo user activity data
         return {
@@ -121,13 +331,13 @@ async def get_user_activity():
         raise HTTPException(status_code=500, detail=f"Failed to get user activity: {str(e)}")
 
 @router.get("/errors/critical")
-async def get_critical_errors():
+async def get_critical_errors(storage: StorageBackend = Depends(get_dataset_storage)):
     """Get list of critical errors that need attention"""
     try:
-        # Try to get critical errors from Redis
-        critical_data = redis_client.get("critical_errors")
-        if critical_data:
-            return json.loads(critical_data)
+        # Try to get critical errors from storage
+        critical = storage.get_json("critical_errors")
+        if critical is not None:
+            return critical
         
         # Generate demo critical errors
         return {
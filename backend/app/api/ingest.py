@@ -0,0 +1,24 @@
+"""
+Directory ingestion endpoints
+"""
+from fastapi import APIRouter
+
+from app.core.storage import get_storage
+from app.utils.datasets import dataset_storage
+from app.utils.tail_ingest import TAIL_CHECKPOINTS_KEY, TAIL_DATASET_ID, get_tail_ingestor
+
+router = APIRouter()
+
+@router.get("/ingest/status")
+async def get_ingest_status():
+    """Status of the watched-directory ingestion and its per-file checkpoints"""
+    ingestor = get_tail_ingestor()
+    if ingestor is None:
+        return {"enabled": False}
+    stored = dataset_storage(TAIL_DATASET_ID, get_storage()).get_json(TAIL_CHECKPOINTS_KEY) or {}
+    return {
+        "enabled": True,
+        "dataset": TAIL_DATASET_ID,
+        **ingestor.status(),
+        "files": stored.get("files", {})
+    }
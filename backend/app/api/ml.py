@@ -2,17 +2,31 @@
 Machine Learning API endpoints for advanced error analysis
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-import redis
-import json
+from starlette.concurrency import run_in_threadpool
 import asyncio
-from ..core.config import get_redis_client
+from ..core.config import settings
+from ..core.metrics import record_cache
 from ..analyzers.ml_analyzer import MLAnalyzer
+from ..analyzers.feature_store import load_feature_store
+from ..analyzers.anomaly_detector import ANOMALY_ALERTS_KEY, ANOMALY_DIMENSIONS, filter_alerts
+from ..analyzers.neighbor_table import load_neighbor_table, lookup_neighbors, save_neighbor_table
+from ..utils.dataset_cache import get_error_columns, get_versioned
+from ..utils.datasets import get_dataset_storage
+from ..utils.http_cache import get_dataset_version
+from ..utils.query_dsl import QueryError, compile_query
 
 router = APIRouter(prefix="/api/ml", tags=["machine-learning"])
 
+def _create_analyzer(storage) -> MLAnalyzer:
+    """Create an analyzer, attached to the stored feature store in hashing mode"""
+    if settings.ML_FEATURE_MODE != "hashing":
+        return MLAnalyzer()
+    feature_store = get_versioned("feature_store", lambda client, version: load_feature_store(version), storage)
+    return MLAnalyzer(feature_store=feature_store)
+
 # Response models
 class UserRiskScore(BaseModel):
     user: str
@@ -34,6 +48,17 @@ class SimilarError(BaseModel):
     similarity_score: float
     similarity_percentage: float
 
+class BatchSimilarRequest(BaseModel):
+    error_ids: List[int] = []
+    query: Optional[str] = None  # Select targets with the /api/errors/query language
+    limit: int = 5
+    all_pairs: bool = False  # Build the neighbour table for the whole dataset
+
+class BatchSimilarResult(BaseModel):
+    results: Dict[int, List[SimilarError]]
+    targets: int
+    neighbor_table: Optional[str] = None
+
 class CategoryResult(BaseModel):
     name: str
     count: int
@@ -46,6 +71,22 @@ class AutoCategorizationResult(BaseModel):
     total_clusters: int
     outliers: int
 
+class AnomalyAlert(BaseModel):
+    dimension: str
+    value: str
+    bucket_start: int
+    bucket_seconds: int
+    count: int
+    expected: float
+    std: float
+    z_score: float
+    history_buckets: int
+
+class AnomalyResult(BaseModel):
+    alerts: List[AnomalyAlert]
+    total_alerts: int
+    latest_bucket_start: Optional[int] = None
+
 class RootCauseSuggestion(BaseModel):
     type: str
     title: str
@@ -56,18 +97,16 @@ class RootCauseSuggestion(BaseModel):
 
 
 @router.get("/user-risk-scores", response_model=List[UserRiskScore])
-async def get_user_risk_scores(redis_client = Depends(get_redis_client)):
+async def get_user_risk_scores(storage = Depends(get_dataset_storage)):
     """
     Calculate and return user risk scores based on error patterns
     """
     try:
-        # Get errors from Redis
-        errors_data = redis_client.get("analyzed_errors")
-        if not errors_data:
+        # Get errors from storage
+        errors = storage.get_json("analyzed_errors")
+        if errors is None:
             raise HTTPException(status_code=404, detail="No error data found")
         
-        errors = json.loads(errors_data)
-        
         # Initialize ML analyzer
         analyzer = MLAnalyzer()
         
@@ -92,18 +131,16 @@ async def get_user_risk_scores(redis_client = Depends(get_redis_client)):
 
 
 @router.get("/similar-errors/{error_id}", response_model=List[SimilarError])
-async def get_similar_errors(error_id: int, limit: int = 5, redis_client = Depends(get_redis_client)):
+async def get_similar_errors(error_id: int, limit: int = 5, storage = Depends(get_dataset_storage)):
     """
     Find errors similar to the specified error using ML clustering
     """
     try:
-        # Get errors from Redis
-        errors_data = redis_client.get("analyzed_errors")
-        if not errors_data:
+        # Get errors from storage
+        errors = storage.get_json("analyzed_errors")
+        if errors is None:
             raise HTTPException(status_code=404, detail="No error data found")
         
-        errors = json.loads(errors_data)
-        
         # Find target error
         target_error = None
         for error in errors:
@@ -114,11 +151,24 @@ async def get_similar_errors(error_id: int, limit: int = 5, redis_client = Depen
         if not target_error:
             raise HTTPException(status_code=404, detail="Target error not found")
         
-        # Initialize ML analyzer
-        analyzer = MLAnalyzer()
-        
-        # Find similar errors
-        similar_errors = analyzer.find_similar_errors(target_error, errors, limit)
+        # Answer from a precomputed neighbour table when one exists for this dataset
+        similar_errors = None
+        neighbor_table = load_neighbor_table(get_dataset_version(storage))
+        neighbors = lookup_neighbors(neighbor_table, error_id, limit) if neighbor_table else None
+        record_cache("neighbor_table", neighbors is not None)
+        if neighbors is not None:
+            errors_by_id = {error.get('id'): error for error in errors}
+            similar_errors = [
+                dict(errors_by_id[neighbor_id], similarity_score=round(score, 3), similarity_percentage=round(score * 100, 1))
+                for neighbor_id, score in neighbors if neighbor_id in errors_by_id
+            ]
+        
+        if similar_errors is None:
+            # Initialize ML analyzer
+            analyzer = _create_analyzer(storage)
+            
+            # Find similar errors
+            similar_errors = analyzer.find_similar_errors(target_error, errors, limit)
         
         # Convert to response format
         result = []
@@ -139,21 +189,88 @@ async def get_similar_errors(error_id: int, limit: int = 5, redis_client = Depen
         raise HTTPException(status_code=500, detail=f"Error finding similar errors: {str(e)}")
 
 
+@router.post("/similar-errors/batch", response_model=BatchSimilarResult)
+async def get_similar_errors_batch(request: BatchSimilarRequest, storage = Depends(get_dataset_storage)):
+    """
+    Find the top-k similar errors for many errors in one pass
+    
+    Targets are the given error_ids plus all errors matching query. With
+    all_pairs, the neighbour table of the whole dataset is written to disk
+    and used by later /similar-errors/{error_id} lookups.
+    """
+    try:
+        columns = get_error_columns(storage)
+        errors = columns.errors
+        if not errors:
+            raise HTTPException(status_code=404, detail="No error data found")
+        
+        analyzer = _create_analyzer(storage)
+        
+        if request.all_pairs:
+            # The blocked all-pairs search runs off the event loop so other requests are served meanwhile
+            table = await run_in_threadpool(
+                analyzer.build_neighbor_table,
+                errors, max(request.limit, settings.NEIGHBOR_TABLE_SIZE), settings.SIMILARITY_BLOCK_SIZE
+            )
+            path = await run_in_threadpool(save_neighbor_table, columns.version, table)
+            return BatchSimilarResult(results={}, targets=len(errors), neighbor_table=path)
+        
+        # Collect target IDs
+        target_ids = list(dict.fromkeys(request.error_ids))
+        if request.query:
+            try:
+                plan = compile_query(request.query)
+            except QueryError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid query: {str(e)}")
+            selected = set(target_ids)
+            target_ids.extend(int(error_id) for error_id in columns.ids[plan(columns)] if error_id not in selected)
+        
+        if len(target_ids) > settings.SIMILARITY_MAX_TARGETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many target errors ({len(target_ids)}). Use all_pairs for the whole dataset"
+            )
+        
+        similar = await run_in_threadpool(
+            analyzer.find_similar_errors_batch, target_ids, errors, request.limit, settings.SIMILARITY_BLOCK_SIZE
+        )
+        
+        results = {}
+        for target_id, similar_errors in similar.items():
+            results[target_id] = [
+                SimilarError(
+                    id=error.get('id', 0),
+                    type=error.get('type', 'Unknown'),
+                    user=error.get('user', 'Unknown'),
+                    timestamp=error.get('timestamp', ''),
+                    severity=error.get('severity', 'Unknown'),
+                    similarity_score=error.get('similarity_score', 0.0),
+                    similarity_percentage=error.get('similarity_percentage', 0.0)
+                )
+                for error in similar_errors
+            ]
+        
+        return BatchSimilarResult(results=results, targets=len(results))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding similar errors: {str(e)}")
+
+
 @router.get("/auto-categorize", response_model=AutoCategorizationResult)
-async def auto_categorize_errors(redis_client = Depends(get_redis_client)):
+async def auto_categorize_errors(storage = Depends(get_dataset_storage)):
     """
     Automatically categorize errors using ML clustering
     """
     try:
-        # Get errors from Redis
-        errors_data = redis_client.get("analyzed_errors")
-        if not errors_data:
+        # Get errors from storage
+        errors = storage.get_json("analyzed_errors")
+        if errors is None:
             raise HTTPException(status_code=404, detail="No error data found")
         
-        errors = json.loads(errors_data)
-        
         # Initialize ML analyzer
-        analyzer = MLAnalyzer()
+        analyzer = _create_analyzer(storage)
         
         # Auto-categorize errors
         categorization_result = analyzer.auto_categorize_errors(errors)
@@ -179,18 +296,52 @@ async def auto_categorize_errors(redis_client = Depends(get_redis_client)):
         raise HTTPException(status_code=500, detail=f"Error auto-categorizing: {str(e)}")
 
 
+@router.get("/anomalies", response_model=AnomalyResult)
+async def get_anomalies(
+    dimension: Optional[str] = None,
+    window: Optional[int] = None,
+    limit: int = 50,
+    storage = Depends(get_dataset_storage)
+):
+    """
+    Get error-rate anomaly alerts raised by the streaming detector during ingest
+
+    dimension restricts alerts to user, type or filename series; window keeps
+    only alerts from the last N buckets of the ingested stream.
+    """
+    if dimension and dimension not in ANOMALY_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of: {', '.join(ANOMALY_DIMENSIONS)}")
+    
+    try:
+        stored = storage.get_json(ANOMALY_ALERTS_KEY)
+        if not stored:
+            raise HTTPException(status_code=404, detail="No anomaly data found")
+        
+        alerts = filter_alerts(
+            stored['alerts'], stored['latest_bucket'], stored['bucket_seconds'], dimension, window
+        )
+        latest_bucket = stored['latest_bucket']
+        
+        return AnomalyResult(
+            alerts=[AnomalyAlert(**alert) for alert in alerts[:limit]],
+            total_alerts=len(alerts),
+            latest_bucket_start=latest_bucket * stored['bucket_seconds'] if latest_bucket is not None else None
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading anomalies: {str(e)}")
+
+
 @router.get("/root-cause-suggestions", response_model=List[RootCauseSuggestion])
-async def get_root_cause_suggestions(redis_client = Depends(get_redis_client)):
+async def get_root_cause_suggestions(storage = Depends(get_dataset_storage)):
     """
     Find potential root causes by analyzing error correlations
     """
     try:
-        # Get errors from Redis
-        errors_data = redis_client.get("analyzed_errors")
-        if not errors_data:
-            return _get_demo_root_causes()
-        
-        errors = json.loads(errors_data)
+        # Get errors from storage
+        errors = storage.get_json("analyzed_errors")
         if not errors:
             return _get_demo_root_causes()
         
@@ -220,19 +371,15 @@ async def get_root_cause_suggestions(redis_client = Depends(get_redis_client)):
 
 
 @router.get("/user-risk-heatmap")
-async def get_user_risk_heatmap(redis_client = Depends(get_redis_client)):
+async def get_user_risk_heatmap(storage = Depends(get_dataset_storage)):
     """
     Get user risk data formatted for heatmap visualization
     """
     try:
-        # Get errors from Redis
-        errors_data = redis_client.get("analyzed_errors")
-        if not errors_data:
-            # Fallback to demo data
-            return _get_demo_heatmap_data()
-        
-        errors = json.loads(errors_data)
+        # Get errors from storage
+        errors = storage.get_json("analyzed_errors")
         if not errors:
+            # Fallback to demo data
             return _get_demo_heatmap_data()
         
         # Initialize ML analyzer
@@ -274,20 +421,18 @@ async def get_user_risk_heatmap(redis_client = Depends(get_redis_client)):
 
 
 @router.get("/insights-summary")
-async def get_ml_insights_summary(redis_client = Depends(get_redis_client)):
+async def get_ml_insights_summary(storage = Depends(get_dataset_storage)):
     """
     Get a comprehensive summary of all ML insights
     """
     try:
-        # Get errors from Redis
-        errors_data = redis_client.get("analyzed_errors")
-        if not errors_data:
+        # Get errors from storage
+        errors = storage.get_json("analyzed_errors")
+        if errors is None:
             raise HTTPException(status_code=404, detail="No error data found")
         
-        errors = json.loads(errors_data)
-        
         # Initialize ML analyzer
-        analyzer = MLAnalyzer()
+        analyzer = _create_analyzer(storage)
         
         # Run all analyses
         risk_scores = analyzer.calculate_user_risk_scores(errors)
@@ -1,47 +1,336 @@
 """
 File upload API endpoints
 """
-from typing import List
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-import redis
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 import json
+import asyncio
 import tempfile
+import tarfile
+import zipfile
 import os
 from datetime import datetime
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from app.core.config import settings
-from app.validators.file_validator import validate_uploaded_files
+from app.core.metrics import count_items, observe_payload, record_cache, stage
+from app.core.storage import get_storage
+from app.validators.file_validator import validate_announced_files, validate_uploaded_files
+from app.parsers.timeline import sort_run, merge_runs
+from app.parsers.stack_trace import FrameTable, attach_stack_trace
+from app.parsers.fingerprint import message_fingerprint
+from app.parsers.parse_cache import StreamingHasher, load_file_state, load_parsed, save_parsed
+from app.parsers.sniffer import (
+    DOTNET, LOG_DELIMITERS, VISUAL_OBJECTS, VISUAL_OBJECTS_DELIMITER, DOTNET_DELIMITER, ascii_compatible,
+    decode_complete, decode_log, delimiter_bytes, detect_log_format, sniff_encoding, sniff_log
+)
+from app.analyzers.error_groups import build_group_index
+from app.utils.inverted_index import CONTENT_INDEX_KEY, InvertedIndexBuilder
+from app.analyzers.ml_analyzer import MLAnalyzer
+from app.analyzers.anomaly_detector import AnomalyDetector, save_anomaly_detector
+from app.analyzers.feature_store import HashingFeatureStore, save_feature_store
+from app.utils.sketches import SKETCH_HISTORY_KEY, load_sketch_history, save_sketch_history
+from app.utils.datasets import new_dataset_id, publish_version, record_shared_size, stage_dataset
+from app.utils.http_cache import new_dataset_version
+from app.utils.archives import (
+    ArchiveLimitError, ArchiveMember, ByteBudget, archive_members, is_archive, read_member,
+    supports_parallel_members
+)
+from app.utils.raw_logs import adopt_raw_log, entry_spans, raw_log_path, save_raw_log
+from app.utils.upload_sessions import (
+    SessionBusyError, SessionFile, UploadSession, create_session, discard_session, get_session
+)
+from app.utils.upload_progress import (
+    FINAL_STATUSES, STATUS_FAILED, get_progress_snapshot, get_upload_progress, new_upload_id,
+    start_upload_progress
+)
 
 router = APIRouter()
 
-# Redis connection for storing analysis results
-redis_client = redis.Redis(host='redis', port=6379, db=0, decode_responses=True)
+# Storage holding the analysis results
+storage = get_storage()
 
-def parse_log_file(file_content: str, filename: str) -> List[dict]:
-    """Parse a single log file and extract error entries"""
-    errors = []
-    
+# (content hash, content hash of the file it extends or None, that file's size, errors)
+SketchSource = Tuple[str, Optional[str], int, List[dict]]
+
+# Held while a dataset is read and replaced, so uploads and directory
+# ingestion of this process do not overwrite each other's results. It does
+# not reach other workers; the registry and the pointers they share are
+# protected by the storage lock taken in publish_version()
+dataset_lock = asyncio.Lock()
+
+def _spans(raw: Optional[bytes], log_format: str, encoding: Optional[str]):
+    if raw is None or not ascii_compatible(encoding):
+        return None
+    return entry_spans(raw, delimiter_bytes(log_format, encoding))
+
+def parse_log_format(log_format: Optional[str], file_content: str, filename: str, frame_table: FrameTable,
+                     raw: Optional[bytes] = None, encoding: Optional[str] = "utf-8") -> List[dict]:
+    """Parse file content of a known log format (raw in the given encoding)"""
     try:
-        if filename.upper().startswith('E_'):
+        if log_format == VISUAL_OBJECTS:
             # Parse Visual Objects logs
-            errors = parse_visual_objects_log(file_content, filename)
-        elif filename.upper().startswith('EC_'):
+            return parse_visual_objects_log(file_content, filename, _spans(raw, log_format, encoding))
+        if log_format == DOTNET:
             # Parse .NET logs
-            errors = parse_dotnet_log(file_content, filename)
-        else:
-            # Try to auto-detect format
-            if '***********************ERROR********************************' in file_content:
-                errors = parse_visual_objects_log(file_content, filename)
-            elif '------------------------------' in file_content:
-                errors = parse_dotnet_log(file_content, filename)
+            return parse_dotnet_log(file_content, filename, frame_table, _spans(raw, log_format, encoding))
     except Exception as e:
         print(f"Error parsing {filename}: {str(e)}")
+    return []
+
+def parse_log_file(file_content: str, filename: str, frame_table: Optional[FrameTable] = None,
+                   raw: Optional[bytes] = None) -> List[dict]:
+    """
+    Parse a single log file and extract error entries
+    
+    With the undecoded file bytes as raw, every error records the byte offset
+    and length of its complete entry in the file.
+    """
+    frame_table = frame_table if frame_table is not None else FrameTable()
+    return parse_log_format(detect_log_format(file_content, filename), file_content, filename, frame_table, raw)
+
+def parse_log_bytes(raw: bytes, filename: str, frame_table: FrameTable) -> Tuple[Optional[str], List[dict], str]:
+    """
+    Parse undecoded file content, format sniffed from its first bytes and
+    encoding decided by all of them: (format, errors, encoding)
+    """
+    content, encoding = decode_complete(raw)
+    log_format = detect_log_format(content, filename)
+    return log_format, parse_log_format(log_format, content, filename, frame_table, raw, encoding), encoding
+
+def _parse_appended(raw: bytes, filename: str, frame_table: FrameTable,
+                    previous: dict) -> Optional[Tuple[List[dict], str]]:
+    """
+    Parse a file that grew by appending to an already parsed version:
+    (errors, encoding of the appended part)
+    
+    Errors before the last entry of the previous version are reused; parsing
+    restarts at that entry's delimiter since the entry itself may have grown.
+    """
+    if previous["format"] not in LOG_DELIMITERS or not ascii_compatible(sniff_encoding(raw[:settings.LOG_SNIFF_BYTES])):
+        return None
+    resume = raw.rfind(delimiter_bytes(previous["format"], None), 0, previous["size"])
+    if resume < 0:
+        return None
+    
+    if any("offset" not in error for error in previous["errors"]):
+        return None  # No safe cut point without entry offsets
+    kept = [error for error in previous["errors"] if error["offset"] < resume]
+    
+    tail = raw[resume:]
+    content, encoding = decode_complete(tail)
+    tail_errors = parse_log_format(previous["format"], content, filename, frame_table, tail, encoding)
+    for error in tail_errors:
+        if "offset" not in error:
+            return None
+        error["offset"] += resume
+    count_items("upload.tail_bytes_parsed", len(tail))
+    return kept + tail_errors, encoding
+
+def cache_parsed(content_hash: str, filename: str, log_format: Optional[str], size: int,
+                 errors: List[dict], frame_table: FrameTable):
+    """Store a file's parse in the parse cache, counted against the dataset memory budget"""
+    key, stored_size = save_parsed(storage, content_hash, filename, log_format, size, errors, frame_table)
+    record_shared_size(storage, key, stored_size, settings.PARSE_CACHE_TTL)
+
+def parse_uploaded_file(raw: bytes, filename: str, frame_table: FrameTable, content_hash: str,
+                        file_state: Optional[dict] = None,
+                        prefix_hash: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Parse an uploaded file, reusing the cached parse of identical content or
+    of the version this file was appended to: (errors, encoding they were
+    decoded with, None for a cached parse)
     
+    file_state is the stored hash and size of the file's last parsed version
+    and prefix_hash the hash of this upload's first file_state["size"] bytes.
+    """
+    if not settings.PARSE_CACHE_ENABLED:
+        return parse_log_bytes(raw, filename, frame_table)[1:]
+    
+    cached = load_parsed(storage, content_hash, filename, frame_table)
+    record_cache("parse", cached is not None)
+    if cached is not None:
+        return cached["errors"], None
+    
+    appended = None
+    if file_state and prefix_hash == file_state["hash"] and len(raw) > file_state["size"]:
+        previous = load_parsed(storage, file_state["hash"], filename, frame_table)
+        if previous is not None:
+            appended = _parse_appended(raw, filename, frame_table, previous)
+        record_cache("parse_append", appended is not None)
+    if appended is not None:
+        log_format = previous["format"]
+        errors, encoding = appended
+    else:
+        log_format, errors, encoding = parse_log_bytes(raw, filename, frame_table)
+    
+    cache_parsed(content_hash, filename, log_format, len(raw), errors, frame_table)
+    return errors, encoding
+
+class LogStreamParser:
+    """
+    Incremental parser of a log file arriving in chunks
+    
+    Format and encoding are sniffed from the first LOG_SNIFF_BYTES; bytes of
+    a file that turns out not to be a known log are dropped as they arrive.
+    If those bytes are plain ASCII the encoding is decided by the first
+    parsed entries that are not.
+    Complete entries are parsed as soon as the next delimiter arrives; the
+    unfinished last entry is carried over to the next feed(). Delimiters are
+    found left to right like str.split, so the result equals parsing the
+    whole file at once. With offsets=True errors record entry offsets
+    relative to the start of the file.
+    """
+    
+    def __init__(self, filename: str, frame_table: FrameTable, offsets: bool = False):
+        self.filename = filename
+        self.frame_table = frame_table
+        self.offsets = offsets
+        self.log_format: Optional[str] = None
+        self._sniffed = False
+        self.encoding: Optional[str] = None  # None while only ASCII bytes were parsed
+        self._delimiter = b""
+        self._buffer = bytearray()
+        self._base = 0  # File offset of the buffer start
+        self._scan_from = 0
+    
+    def _sniff(self):
+        self.log_format, self.encoding = sniff_log(bytes(self._buffer[:settings.LOG_SNIFF_BYTES]), self.filename)
+        self._sniffed = True
+        if self.log_format is None:
+            self._base += len(self._buffer)
+            self._buffer = bytearray()
+        else:
+            self._delimiter = delimiter_bytes(self.log_format, self.encoding)
+    
+    def _parse(self, segment: bytes) -> List[dict]:
+        if self.encoding is None:
+            self.encoding = sniff_encoding(segment)
+        errors = parse_log_format(
+            self.log_format, decode_log(segment, self.encoding), self.filename, self.frame_table,
+            segment if self.offsets else None, self.encoding
+        )
+        if self.offsets:
+            for error in errors:
+                if "offset" in error:
+                    error["offset"] += self._base
+        return errors
+    
+    def feed(self, chunk: bytes) -> List[dict]:
+        """Add the next chunk; returns the errors of entries it completed"""
+        if self._sniffed and self.log_format is None:
+            self._base += len(chunk)
+            return []
+        self._buffer += chunk
+        if not self._sniffed:
+            if len(self._buffer) < settings.LOG_SNIFF_BYTES:
+                return []
+            self._sniff()
+            if self.log_format is None:
+                return []
+        buffer = self._buffer
+        delimiter = self._delimiter
+        
+        # Start of the last delimiter in the buffer
+        cut = -1
+        position = self._scan_from
+        while True:
+            found = buffer.find(delimiter, position)
+            if found < 0:
+                break
+            cut = found
+            position = found + len(delimiter)
+        self._scan_from = max(position, len(buffer) - len(delimiter) + 1)
+        
+        if cut <= 0:
+            return []
+        errors = self._parse(bytes(buffer[:cut]))
+        del buffer[:cut]
+        self._base += cut
+        self._scan_from -= cut
+        return errors
+    
+    def close(self) -> List[dict]:
+        """Parse the last entry once the file is complete"""
+        if not self._sniffed:
+            self._sniff()
+        errors = self._parse(bytes(self._buffer)) if self._buffer else []
+        self._base += len(self._buffer)
+        self._buffer = bytearray()
+        self._scan_from = 0
+        return errors
+
+def parse_log_stream(chunks: Iterable[bytes], filename: str, frame_table: FrameTable) -> List[dict]:
+    """
+    Parse a log file arriving in chunks
+    
+    Only the unfinished last entry and one chunk are held in memory. Entry
+    offsets are not recorded.
+    """
+    parser = LogStreamParser(filename, frame_table)
+    errors = []
+    for chunk in chunks:
+        errors.extend(parser.feed(chunk))
+    errors.extend(parser.close())
     return errors
 
-def parse_visual_objects_log(content: str, filename: str) -> List[dict]:
+def _parse_member(member: ArchiveMember, budget: ByteBudget) -> Tuple[List[dict], FrameTable, int, Optional[str], str]:
+    """Parse one archive member with its own frame table (safe to run concurrently)"""
+    local_frames = FrameTable()
+    parser = LogStreamParser(os.path.basename(member.name), local_frames)
+    hasher = StreamingHasher()
+    size = 0
+    errors = []
+    for chunk in read_member(member, budget):
+        size += len(chunk)
+        hasher.update(chunk)
+        errors.extend(parser.feed(chunk))
+    errors.extend(parser.close())
+    return errors, local_frames, size, parser.log_format, hasher.hexdigest()
+
+def parse_archive(fileobj, filename: str, frame_table: FrameTable,
+                  budget: Optional[ByteBudget] = None) -> List[Tuple[str, int, List[dict], Optional[str], str]]:
+    """
+    Parse the log members of an uploaded archive:
+    [(member name, decompressed size, errors, sniffed log format, content hash)]
+    
+    Zip members are parsed on ARCHIVE_PARSE_WORKERS threads; their frames
+    are interned into frame_table afterwards in member order.
+    """
+    budget = budget or ByteBudget()
+    fileobj.seek(0)
+    members = archive_members(fileobj, filename)
+    if supports_parallel_members(filename) and settings.ARCHIVE_PARSE_WORKERS > 1:
+        members = list(members)
+        with ThreadPoolExecutor(max_workers=settings.ARCHIVE_PARSE_WORKERS) as executor:
+            parsed = list(executor.map(lambda member: _parse_member(member, budget), members))
+    else:
+        parsed = []
+        member_list = []
+        for member in members:
+            parsed.append(_parse_member(member, budget))
+            member_list.append(member)
+        members = member_list
+    
+    results = []
+    for member, (errors, local_frames, size, log_format, content_hash) in zip(members, parsed):
+        for error in errors:
+            if "frames" in error:
+                error["frames"] = [frame_table.intern(local_frames.frames[i]) for i in error["frames"]]
+        results.append((member.name, size, errors, log_format, content_hash))
+    return results
+
+def _add_span(error: dict, spans, block_index: int):
+    """Record where the entry of block block_index lies in the original file"""
+    if spans is not None:
+        error["offset"], error["length"] = spans[block_index]
+
+def parse_visual_objects_log(content: str, filename: str, spans=None) -> List[dict]:
     """Parse Visual Objects log format"""
     errors = []
     
@@ -50,7 +339,9 @@ def parse_visual_objects_log(content: str, filename: str) -> List[dict]:
     user = user_match.group(1) if user_match else "Unknown"
     
     # Split by error delimiter
-    error_blocks = content.split('***********************ERROR********************************')
+    error_blocks = content.split(VISUAL_OBJECTS_DELIMITER)
+    if spans is not None and len(spans) != len(error_blocks):
+        spans = None  # Decoding changed the block structure; offsets would be wrong
     
     for i, block in enumerate(error_blocks):
         if i == 0:  # Skip first block (usually header)
@@ -68,8 +359,9 @@ def parse_visual_objects_log(content: str, filename: str) -> List[dict]:
             
             # Determine severity
             severity = "Critical" if error_code == 50 else ("High" if error_code in [2, 33] else "Medium")
+            content = block.strip()[:200]  # First 200 chars
             
-            errors.append({
+            error = {
                 "id": len(errors) + 1,
                 "filename": filename,
                 "user": user,
@@ -77,21 +369,27 @@ def parse_visual_objects_log(content: str, filename: str) -> List[dict]:
                 "type": error_type,
                 "code": error_code,
                 "severity": severity,
-                "content": block.strip()[:200]  # First 200 chars
-            })
+                "content": content,
+                "fingerprint": message_fingerprint(error_type, error_code, content)
+            }
+            _add_span(error, spans, i)
+            errors.append(error)
     
     return errors
 
-def parse_dotnet_log(content: str, filename: str) -> List[dict]:
-    """Parse .NET log format"""
+def parse_dotnet_log(content: str, filename: str, frame_table: Optional[FrameTable] = None, spans=None) -> List[dict]:
+    """Parse .NET log format, including exception chain and interned stack frames"""
     errors = []
+    frame_table = frame_table if frame_table is not None else FrameTable()
     
     # Extract user from filename (EC_YYYYMMDD_USER.LOG)
     user_match = re.search(r'EC_\d{8}_([^.]+)\.', filename)
     user = user_match.group(1) if user_match else "Unknown"
     
     # Split by error delimiter
-    error_blocks = content.split('------------------------------')
+    error_blocks = content.split(DOTNET_DELIMITER)
+    if spans is not None and len(spans) != len(error_blocks):
+        spans = None  # Decoding changed the block structure; offsets would be wrong
     
     for i, block in enumerate(error_blocks):
         if i == 0:  # Skip first block
@@ -110,8 +408,9 @@ def parse_dotnet_log(content: str, filename: str) -> List[dict]:
             # Assign codes based on exception type
             code = 50 if 'AccessViolation' in exception_type else (51 if 'Memory' in exception_type else 52)
             severity = "Critical" if code == 50 else "High"
+            content = block.strip()[:200]  # First 200 chars
             
-            errors.append({
+            error = {
                 "id": len(errors) + 1,
                 "filename": filename,
                 "user": user,
@@ -119,19 +418,33 @@ def parse_dotnet_log(content: str, filename: str) -> List[dict]:
                 "type": error_type,
                 "code": code,
                 "severity": severity,
-                "content": block.strip()[:200]  # First 200 chars
-            })
+                "content": content,
+                "fingerprint": message_fingerprint(error_type, code, content)
+            }
+            
+            # Exception chain, frame IDs and stack fingerprint
+            attach_stack_trace(error, block, frame_table, settings.STACK_FINGERPRINT_FRAMES, settings.STACK_MAX_FRAMES)
+            _add_span(error, spans, i)
+            errors.append(error)
     
     return errors
 
 @router.post("/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+async def upload_files(files: List[UploadFile] = File(...), upload_id: Optional[str] = None):
     """
     Upload multiple log files for analysis
+    
+    Pass a client-generated upload_id to follow progress on
+    /api/upload/{upload_id}/events while the upload is received and processed.
     """
+    upload_id = upload_id or new_upload_id()
+    # Created by UploadProgressMiddleware when the request started
+    progress = get_upload_progress(upload_id)
+    
     try:
         # Validate files
-        validation_result = await validate_uploaded_files(files)
+        with stage("upload.validate"):
+            validation_result = await validate_uploaded_files(files)
         
         if not validation_result.valid:
             raise HTTPException(
@@ -143,85 +456,114 @@ async def upload_files(files: List[UploadFile] = File(...)):
                 }
             )
         
+        if progress is None:
+            progress = start_upload_progress(
+                upload_id,
+                total_files=len(validation_result.valid_files),
+                total_bytes=sum(file.size or 0 for file in validation_result.valid_files)
+            )
+        else:
+            progress.total_files = len(validation_result.valid_files)
+        
         # Process and analyze valid files
-        all_errors = []
         uploaded_files = []
-        user_counts = {}
-        error_type_counts = {}
-        critical_error_count = 0
+        sorted_runs = []
+        sketch_sources = []
+        frame_table = FrameTable()
+        
+        budget = ByteBudget()
         
         for file in validation_result.valid_files:
-            # Read file content
-            content = await file.read()
-            content_str = content.decode('utf-8', errors='ignore')
+            if is_archive(file.filename):
+                # Members are decompressed straight from the spooled upload into the parser
+                with stage("upload.archive"):
+                    try:
+                        members = await run_in_threadpool(parse_archive, file.file, file.filename, frame_table, budget)
+                    except ArchiveLimitError as e:
+                        raise HTTPException(status_code=413, detail=str(e))
+                    except (zipfile.BadZipFile, tarfile.TarError, OSError, EOFError) as e:
+                        raise HTTPException(status_code=400, detail=f"Invalid archive '{file.filename}': {str(e)}")
+                if not progress.body_counted:
+                    progress.add_bytes(file.size or 0)
+                
+                for member_name, member_size, member_errors, member_format, member_hash in members:
+                    progress.add_file_errors(member_errors)
+                    with stage("upload.sort"):
+                        sorted_runs.append(sort_run(member_errors))
+                    sketch_sources.append((member_hash, None, 0, member_errors))
+                    uploaded_files.append({
+                        "filename": os.path.basename(member_name),
+                        "size": member_size,
+                        "content_type": None,
+                        "detected_type": member_format or "unknown",
+                        "archive": file.filename,
+                        "file_id": None,
+                        "errors_found": len(member_errors)
+                    })
+                continue
+            
+            # Hash while reading; with a known earlier version of the file
+            # also hash its length of prefix to detect appended content
+            file_state = load_file_state(storage, file.filename) if settings.PARSE_CACHE_ENABLED else None
+            hasher = StreamingHasher(file_state["size"] if file_state else None)
+            
+            # Read file content in chunks so progress can be reported
+            chunks = []
+            with stage("upload.read"):
+                while True:
+                    chunk = await file.read(settings.UPLOAD_READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    hasher.update(chunk)
+                    if not progress.body_counted:
+                        progress.add_bytes(len(chunk))
+            raw = b"".join(chunks)
+            observe_payload("upload.file", len(raw))
             
-            # Parse the log file
-            file_errors = parse_log_file(content_str, file.filename)
+            # Parse the log file off the event loop so progress streams stay responsive
+            with stage("upload.parse"):
+                file_errors, encoding = await run_in_threadpool(
+                    parse_uploaded_file, raw, file.filename, frame_table,
+                    hasher.hexdigest(), file_state, hasher.prefix_digest
+                )
             
-            # Update error IDs to be globally unique
+            # Keep the original file so complete entries can be served on demand
+            with stage("upload.keep_raw"):
+                file_id = await run_in_threadpool(save_raw_log, raw, encoding)
             for error in file_errors:
-                error['id'] = len(all_errors) + 1
-                all_errors.append(error)
-                
-                # Count users
-                user = error['user']
-                user_counts[user] = user_counts.get(user, 0) + 1
-                
-                # Count error types
-                error_type = error['type']
-                error_type_counts[error_type] = error_type_counts.get(error_type, 0) + 1
-                
-                # Count critical errors
-                if error['severity'] == 'Critical':
-                    critical_error_count += 1
+                if "offset" in error:
+                    error["file_id"] = file_id
+            progress.add_file_errors(file_errors)
+            
+            # Each file becomes one time-sorted run
+            with stage("upload.sort"):
+                sorted_runs.append(sort_run(file_errors))
+            appended_to = file_state["hash"] if file_state and hasher.prefix_digest == file_state["hash"] else None
+            sketch_sources.append((
+                hasher.hexdigest(), appended_to, file_state["size"] if appended_to else 0, file_errors
+            ))
             
             file_info = {
                 "filename": file.filename,
                 "size": file.size,
                 "content_type": file.content_type,
                 "detected_type": validation_result.file_types.get(file.filename),
+                "file_id": file_id,
                 "errors_found": len(file_errors)
             }
             uploaded_files.append(file_info)
         
-        # Generate analytics data
-        summary_data = {
-            "total_errors": len(all_errors),
-            "critical_errors": critical_error_count,
-            "active_users": len(user_counts),
-            "files_analyzed": len(uploaded_files)
-        }
+        dataset_id, all_errors, summary_data = await _publish_runs(sorted_runs, frame_table, uploaded_files, sketch_sources)
         
-        # Prepare chart data
-        error_types_data = {
-            "labels": list(error_type_counts.keys())[:5],  # Top 5 error types
-            "data": list(error_type_counts.values())[:5]
-        }
-        
-        user_activity_data = {
-            "labels": list(user_counts.keys()),
-            "data": list(user_counts.values())
-        }
-        
-        # Get critical errors for alerts
-        critical_errors = [error for error in all_errors if error['severity'] == 'Critical'][:10]
-        critical_errors_data = {
-            "critical_errors": critical_errors
-        }
-        
-        # Generate timeline data (simplified - group by date)
-        timeline_data = generate_timeline_data(all_errors)
-        
-        # Store all data in Redis
-        redis_client.setex("error_summary", 3600, json.dumps(summary_data))
-        redis_client.setex("analyzed_errors", 3600, json.dumps(all_errors))
-        redis_client.setex("error_types", 3600, json.dumps(error_types_data))
-        redis_client.setex("user_activity", 3600, json.dumps(user_activity_data))
-        redis_client.setex("critical_errors", 3600, json.dumps(critical_errors_data))
-        redis_client.setex("error_timeline", 3600, json.dumps(timeline_data))
+        progress.finish()
+        count_items("upload.files", len(uploaded_files))
+        count_items("upload.errors", len(all_errors))
         
         return {
             "message": "Files analyzed successfully",
+            "dataset_id": dataset_id,
+            "upload_id": upload_id,
             "files": uploaded_files,
             "total_files": len(uploaded_files),
             "total_errors": len(all_errors),
@@ -229,9 +571,185 @@ async def upload_files(files: List[UploadFile] = File(...)):
             "warnings": validation_result.warnings
         }
     
+    except HTTPException as e:
+        if progress:
+            progress.finish(STATUS_FAILED, str(e.detail))
+        raise
     except Exception as e:
+        if progress:
+            progress.finish(STATUS_FAILED, str(e))
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+async def _publish_runs(sorted_runs: List[List[dict]], frame_table: FrameTable, uploaded_files: List[dict],
+                        sketch_sources: List[SketchSource]) -> Tuple[str, List[dict], dict]:
+    """Merge the sorted runs of an upload and publish them as a new dataset, made current"""
+    all_errors = []
+    
+    # Merge all runs into one time-ordered list; IDs follow time order
+    with stage("upload.merge"):
+        for error in merge_runs(sorted_runs):
+            error['id'] = len(all_errors) + 1
+            all_errors.append(error)
+    
+    dataset_id = new_dataset_id()
+    async with dataset_lock:
+        summary_data = await publish_dataset(
+            dataset_id, all_errors, all_errors, frame_table, len(uploaded_files), AnomalyDetector.from_settings(),
+            sketch_sources=sketch_sources,
+            extra_info={"source": "upload", "filenames": [info["filename"] for info in uploaded_files][:20]}
+        )
+    return dataset_id, all_errors, summary_data
+
+async def publish_dataset(dataset_id: str, all_errors: List[dict], new_errors: List[dict], frame_table: FrameTable,
+                          files_analyzed: int, anomaly_detector: AnomalyDetector,
+                          feature_store: Optional[HashingFeatureStore] = None,
+                          extra: Optional[Dict[str, Any]] = None, stage_prefix: str = "upload",
+                          make_current: bool = True, extra_info: Optional[Dict[str, Any]] = None,
+                          sketch_sources: Optional[List[SketchSource]] = None,
+                          dataset_version: Optional[str] = None) -> dict:
+    """
+    Compute the aggregates of a complete error list and store it as a dataset
+    
+    all_errors is the whole dataset in ID order and new_errors the part of it
+    not seen before, which is fed to the anomaly detector, the sketch history
+    and the feature store (a fresh one if none is given). With sketch_sources
+    the sketch history instead gets the errors of each source file it has
+    not seen yet (see fold_sketch_history). extra holds further
+    keys written with the dataset. All keys are written under a new version
+    that readers only see once publish_version() swaps the dataset's version
+    pointer (evicting others beyond the memory budget); with make_current the
+    dataset is shown by requests without a dataset parameter. dataset_version
+    names the new version (a fresh one by default).
+    Returns the summary.
+    """
+    feature_bytes = 0
+    content_index = InvertedIndexBuilder()
+    user_counts = {}
+    error_type_counts = {}
+    critical_error_count = 0
+    
+    with stage(f"{stage_prefix}.index"):
+        for error in new_errors:
+            anomaly_detector.update(error)
+        
+        for error in all_errors:
+            content_index.add(error['id'], error['content'])
+            
+            # Count users
+            user = error['user']
+            user_counts[user] = user_counts.get(user, 0) + 1
+            
+            # Count error types
+            error_type = error['type']
+            error_type_counts[error_type] = error_type_counts.get(error_type, 0) + 1
+            
+            # Count critical errors
+            if error['severity'] == 'Critical':
+                critical_error_count += 1
+    
+    # Generate analytics data
+    summary_data = {
+        "total_errors": len(all_errors),
+        "critical_errors": critical_error_count,
+        "active_users": len(user_counts),
+        "files_analyzed": files_analyzed
+    }
+    
+    # Prepare chart data
+    error_types_data = {
+        "labels": list(error_type_counts.keys())[:5],  # Top 5 error types
+        "data": list(error_type_counts.values())[:5]
+    }
+    
+    user_activity_data = {
+        "labels": list(user_counts.keys()),
+        "data": list(user_counts.values())
+    }
+    
+    # Get critical errors for alerts
+    critical_errors = [error for error in all_errors if error['severity'] == 'Critical'][:10]
+    critical_errors_data = {
+        "critical_errors": critical_errors
+    }
+    
+    with stage(f"{stage_prefix}.aggregate"):
+        # Generate timeline data (simplified - group by date)
+        timeline_data = generate_timeline_data(all_errors)
+        
+        # Precompute fingerprint group indexes for triage views
+        message_groups = build_group_index(all_errors, 'fingerprint')
+        stack_groups = build_group_index(all_errors, 'stack_fingerprint')
+        content_index_data = content_index.build().to_json()
+    
+    dataset_version = dataset_version or new_dataset_version()
+    dataset = stage_dataset(dataset_id, dataset_version, storage)
+    
+    # Featurize the new rows once for incremental similarity features
+    if settings.ML_FEATURE_MODE == "hashing":
+        with stage(f"{stage_prefix}.features"):
+            if feature_store is None:
+                feature_store = HashingFeatureStore(settings.HASHING_N_FEATURES)
+                new_features = all_errors
+            else:
+                new_features = new_errors
+            MLAnalyzer(feature_store=feature_store).append_features(new_features)
+            feature_path = await run_in_threadpool(save_feature_store, dataset_version, feature_store)
+            feature_bytes = os.path.getsize(feature_path)
+    
+    results = {
+        "error_summary": summary_data,
+        "analyzed_errors": all_errors,
+        "error_types": error_types_data,
+        "user_activity": user_activity_data,
+        "critical_errors": critical_errors_data,
+        "error_timeline": timeline_data,
+        "stack_frames": frame_table.frames,
+        "error_groups": message_groups,
+        "stack_groups": stack_groups,
+        CONTENT_INDEX_KEY: content_index_data,
+        **(extra or {})
+    }
+    
+    # Store all data; backends that serialize time it as storage.encode
+    with stage(f"{stage_prefix}.store"):
+        for key, value in results.items():
+            dataset.set_json(key, settings.DATASET_TTL, value)
+    with stage(f"{stage_prefix}.anomaly_store"):
+        save_anomaly_detector(dataset, anomaly_detector, settings.DATASET_TTL)
+    
+    # Fold the new errors into the long-running history
+    with stage(f"{stage_prefix}.sketch_history"):
+        await run_in_threadpool(fold_sketch_history, new_errors if sketch_sources is None else [], sketch_sources or [])
+    
+    # Publish: swap the version pointer and tell every worker to drop its caches
+    evicted = await run_in_threadpool(
+        publish_version, storage, dataset_id, dataset_version, sum(dataset.sizes.values()) + feature_bytes, list(dataset.sizes),
+        {"total_errors": len(all_errors), "files_analyzed": files_analyzed, **(extra_info or {})},
+        make_current
+    )
+    if evicted:
+        count_items("dataset.evicted", len(evicted))
+    return summary_data
+
+def fold_sketch_history(new_errors: List[dict], sketch_sources: List[SketchSource]):
+    """
+    Add errors to the shared sketch history
+    
+    new_errors are added as they are. Each (content hash, content hash of
+    the file it extends or None, that file's size, errors) source adds only
+    errors the history has not counted yet, so re-uploads do not count twice.
+    The read-modify-write holds the history's storage lock, so concurrent
+    uploads of any worker do not lose each other's counts.
+    """
+    with storage.lock(SKETCH_HISTORY_KEY):
+        history = load_sketch_history(storage)
+        history.add_all(new_errors)
+        for source, base, base_size, errors in sketch_sources:
+            history.add_source(source, errors, base, base_size)
+        history.trim()
+        history_size = save_sketch_history(storage, history)
+    record_shared_size(storage, SKETCH_HISTORY_KEY, history_size, settings.SKETCH_HISTORY_TTL, evictable=False)
+
 def generate_timeline_data(errors: List[dict]) -> dict:
     """Generate timeline data from errors"""
     from collections import defaultdict
@@ -266,5 +784,333 @@ async def get_upload_status(upload_id: str):
     """
     Get upload status by ID
     """
-    # TODO: Implement upload status tracking
-    return {"upload_id": upload_id, "status": "completed"}
\ No newline at end of file
+    snapshot = get_progress_snapshot(upload_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return snapshot
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _upload_progress_events(upload_id: str):
+    """Yield progress events until the upload completes or fails"""
+    last_sequence = None
+    critical_sent = 0
+    waited = 0.0
+    idle = 0.0
+    
+    while True:
+        snapshot = get_progress_snapshot(upload_id)
+        
+        if snapshot is None:
+            # The client may subscribe before the upload request arrives
+            if waited >= settings.UPLOAD_PROGRESS_WAIT:
+                yield _sse_event("error", {"upload_id": upload_id, "message": "Upload not found"})
+                return
+        elif snapshot["sequence"] != last_sequence:
+            last_sequence = snapshot["sequence"]
+            idle = 0.0
+            
+            # Push newly parsed critical errors before the counters
+            critical_errors = snapshot.pop("critical_errors", [])
+            for error in critical_errors[critical_sent:]:
+                yield _sse_event("critical", error)
+            critical_sent = max(critical_sent, len(critical_errors))
+            
+            yield _sse_event("progress", snapshot)
+            if snapshot["status"] in FINAL_STATUSES:
+                yield _sse_event(snapshot["status"], snapshot)
+                return
+        elif idle >= 15:
+            # Comment line keeps proxies from closing an idle stream
+            idle = 0.0
+            yield ": keep-alive\n\n"
+        
+        await asyncio.sleep(settings.UPLOAD_PROGRESS_INTERVAL)
+        waited += settings.UPLOAD_PROGRESS_INTERVAL
+        idle += settings.UPLOAD_PROGRESS_INTERVAL
+
+@router.get("/upload/{upload_id}/events")
+async def stream_upload_progress(upload_id: str):
+    """
+    Stream upload progress (bytes read, files parsed, running type and user
+    counters) and the first critical errors as Server-Sent Events
+    """
+    return StreamingResponse(
+        _upload_progress_events(upload_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # Marks the stream as encoded so GZipMiddleware doesn't buffer events
+            "Content-Encoding": "identity"
+        }
+    )
+
+class UploadSessionFileSpec(BaseModel):
+    filename: str
+    size: int
+
+class UploadSessionRequest(BaseModel):
+    files: List[UploadSessionFileSpec]
+
+def _session_or_404(session_id: str) -> UploadSession:
+    session = get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+def _session_busy(session_file: Optional[SessionFile] = None) -> HTTPException:
+    detail = {"message": "Upload session is in use by another request"}
+    if session_file is not None:
+        detail["received"] = session_file.received
+    return HTTPException(status_code=409, detail=detail)
+
+def _session_progress(session: UploadSession):
+    """Progress tracker of a session, recreated if the session started in another process"""
+    progress = get_upload_progress(session.session_id)
+    if progress is None:
+        progress = start_upload_progress(
+            session.session_id, total_files=len(session.files), total_bytes=session.total_bytes
+        )
+        progress.add_bytes(session.received_bytes)
+    return progress
+
+def _replay_file(session: UploadSession, session_file: SessionFile):
+    """
+    Parse the committed bytes of a file this process has not parsed yet
+    (received by another worker or before a restart)
+    """
+    if session_file.parser is None:
+        session_file.parser = LogStreamParser(session_file.filename, session.frame_table, offsets=True)
+    if session_file.parsed >= session_file.received:
+        return
+    path = raw_log_path(session_file.file_id) if session_file.file_id else session_file.path
+    try:
+        with open(path, "rb") as handle:
+            handle.seek(session_file.parsed)
+            while session_file.parsed < session_file.received:
+                data = handle.read(min(settings.UPLOAD_READ_CHUNK_SIZE, session_file.received - session_file.parsed))
+                if not data:
+                    raise OSError(f"{path} is shorter than the bytes received")
+                session_file.hasher.update(data)
+                session_file.errors.extend(session_file.parser.feed(data))
+                session_file.parsed += len(data)
+    except OSError as e:
+        # The bytes are gone (e.g. a pruned raw log): the client sends the file again
+        print(f"Error replaying upload session file {path}: {str(e)}")
+        session_file.reset()
+        session_file.received = 0
+        session_file.file_id = None
+        open(session_file.path, "wb").close()
+        session.save()
+        return
+    if session_file.file_id is not None:
+        # Completed in another process; its raw log is kept already
+        session_file.errors.extend(session_file.parser.close())
+        for error in session_file.errors:
+            if "offset" in error:
+                error["file_id"] = session_file.file_id
+
+def _append_chunk(session: UploadSession, session_file: SessionFile, handle, data: bytes):
+    """Write a chunk to the partial file, parse the entries it completes and commit it"""
+    handle.write(data)
+    handle.flush()
+    session_file.hasher.update(data)
+    session_file.errors.extend(session_file.parser.feed(data))
+    session_file.parsed += len(data)
+    session_file.received += len(data)
+    session.save()
+
+def _complete_file(session: UploadSession, session_file: SessionFile):
+    """Parse the last entry of a fully received file and keep the file"""
+    session_file.errors.extend(session_file.parser.close())
+    content_hash = session_file.hasher.hexdigest()
+    session_file.file_id = adopt_raw_log(session_file.path, content_hash, session_file.parser.encoding)
+    session.save()
+    for error in session_file.errors:
+        if "offset" in error:
+            error["file_id"] = session_file.file_id
+    if settings.PARSE_CACHE_ENABLED:
+        # A later multipart upload of the same file is a cache hit
+        cache_parsed(content_hash, session_file.filename, session_file.parser.log_format,
+                     session_file.size, session_file.errors, session.frame_table)
+
+@router.post("/upload-sessions")
+async def create_upload_session(request: UploadSessionRequest):
+    """
+    Start a resumable chunked upload of log files
+    
+    Send every file with PUT /api/upload-sessions/{session_id}/files/{index}
+    in chunks at increasing offsets, then POST .../finalize. Progress streams
+    on /api/upload/{session_id}/events like a regular upload. Sessions are
+    kept on disk, so any worker can continue them, also after a restart.
+    """
+    try:
+        errors = validate_announced_files([(spec.filename, spec.size) for spec in request.files])
+        if errors:
+            raise HTTPException(
+                status_code=400,
+                detail={"message": "File validation failed", "errors": errors, "warnings": []}
+            )
+        
+        session = create_session()
+        for spec in request.files:
+            session_file = session.add_file(os.path.basename(spec.filename), spec.size)
+            session_file.parser = LogStreamParser(session_file.filename, session.frame_table, offsets=True)
+        session.save()
+        start_upload_progress(session.session_id, total_files=len(session.files), total_bytes=session.total_bytes)
+        return session.info()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create upload session: {str(e)}")
+
+@router.get("/upload-sessions/{session_id}")
+async def get_upload_session(session_id: str):
+    """Bytes received per file, to resume an interrupted upload"""
+    return _session_or_404(session_id).info()
+
+@router.put("/upload-sessions/{session_id}/files/{file_index}")
+async def put_upload_chunk(session_id: str, file_index: int, request: Request, offset: int = 0):
+    """
+    Append a chunk (the raw request body) to a file at the given byte offset
+    
+    The offset must equal the bytes received so far; otherwise 409 reports
+    the offset to continue from. Complete entries are parsed on arrival.
+    """
+    session = _session_or_404(session_id)
+    if not 0 <= file_index < len(session.files):
+        raise HTTPException(status_code=404, detail="File not found in upload session")
+    session_file = session.files[file_index]
+    
+    async with session.lock:
+        try:
+            with session.exclusive():
+                # State committed while waiting for the lock
+                session = _session_or_404(session_id)
+                session_file = session.files[file_index]
+                if session.finalized:
+                    raise HTTPException(status_code=409, detail="Upload session is already finalized")
+                await run_in_threadpool(_replay_file, session, session_file)
+                if offset != session_file.received:
+                    raise HTTPException(
+                        status_code=409,
+                        detail={"message": "Chunk offset does not match the bytes received", "received": session_file.received}
+                    )
+                
+                progress = _session_progress(session)
+                pending = bytearray()
+                try:
+                    with open(session_file.path, "r+b") as handle:
+                        # Drop bytes of a write that was never committed
+                        handle.truncate(session_file.received)
+                        handle.seek(session_file.received)
+                        async for piece in request.stream():
+                            if session_file.received + len(pending) + len(piece) > session_file.size:
+                                raise HTTPException(status_code=400, detail="Chunk extends past the announced file size")
+                            pending += piece
+                            if len(pending) >= settings.UPLOAD_READ_CHUNK_SIZE:
+                                with stage("upload.parse"):
+                                    await run_in_threadpool(_append_chunk, session, session_file, handle, bytes(pending))
+                                progress.add_bytes(len(pending))
+                                pending.clear()
+                        if pending:
+                            with stage("upload.parse"):
+                                await run_in_threadpool(_append_chunk, session, session_file, handle, bytes(pending))
+                            progress.add_bytes(len(pending))
+                except ClientDisconnect:
+                    # Bytes committed so far are kept; the client resumes from "received"
+                    return session_file.info()
+                
+                if session_file.complete and session_file.file_id is None:
+                    with stage("upload.keep_raw"):
+                        await run_in_threadpool(_complete_file, session, session_file)
+                    progress.add_file_errors(session_file.errors)
+                return session_file.info()
+        except SessionBusyError:
+            raise _session_busy(session_file)
+
+@router.post("/upload-sessions/{session_id}/finalize")
+async def finalize_upload_session(session_id: str):
+    """Publish the parsed files of a completely received session as the new dataset"""
+    session = _session_or_404(session_id)
+    progress = None
+    
+    try:
+        async with session.lock:
+            with session.exclusive():
+                session = _session_or_404(session_id)
+                if session.finalized:
+                    raise HTTPException(status_code=409, detail="Upload session is already finalized")
+                incomplete = [session_file.info() for session_file in session.files if not session_file.complete]
+                if incomplete:
+                    raise HTTPException(
+                        status_code=409,
+                        detail={"message": "Upload session has incomplete files", "files": incomplete}
+                    )
+                progress = _session_progress(session)
+                
+                uploaded_files = []
+                sorted_runs = []
+                sketch_sources = []
+                for session_file in session.files:
+                    await run_in_threadpool(_replay_file, session, session_file)
+                    if session_file.file_id is None:
+                        # Empty files never received a chunk
+                        await run_in_threadpool(_complete_file, session, session_file)
+                    with stage("upload.sort"):
+                        sorted_runs.append(sort_run(session_file.errors))
+                    sketch_sources.append((session_file.hasher.hexdigest(), None, 0, session_file.errors))
+                    uploaded_files.append({
+                        "filename": session_file.filename,
+                        "size": session_file.size,
+                        "content_type": None,
+                        "detected_type": (session_file.parser and session_file.parser.log_format) or "unknown",
+                        "file_id": session_file.file_id,
+                        "errors_found": len(session_file.errors)
+                    })
+                
+                dataset_id, all_errors, summary_data = await _publish_runs(
+                    sorted_runs, session.frame_table, uploaded_files, sketch_sources
+                )
+                session.finalized = True
+                session.save()
+        
+        discard_session(session_id)
+        progress.finish()
+        count_items("upload.files", len(uploaded_files))
+        count_items("upload.errors", len(all_errors))
+        
+        return {
+            "message": "Files analyzed successfully",
+            "dataset_id": dataset_id,
+            "upload_id": session_id,
+            "files": uploaded_files,
+            "total_files": len(uploaded_files),
+            "total_errors": len(all_errors),
+            "summary": summary_data,
+            "warnings": []
+        }
+    except SessionBusyError:
+        raise _session_busy()
+    except HTTPException:
+        raise
+    except Exception as e:
+        if progress:
+            progress.finish(STATUS_FAILED, str(e))
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@router.delete("/upload-sessions/{session_id}")
+async def delete_upload_session(session_id: str):
+    """Abort an upload session and delete its partial files"""
+    session = _session_or_404(session_id)
+    async with session.lock:
+        try:
+            with session.exclusive():
+                _session_progress(session).finish(STATUS_FAILED, "Upload cancelled")
+                discard_session(session_id)
+        except SessionBusyError:
+            raise _session_busy()
+    return {"message": "Upload session deleted", "session_id": session_id}
@@ -0,0 +1,192 @@
+"""
+Compact encoding of stored values
+
+Every value written through set_json is encoded as
+
+    MAGIC (4 bytes) | format version | compression | layout | body
+
+Lists of records (the error list, groups, critical errors) use a columnar
+layout: one entry per field instead of repeating every key in every row,
+and low-cardinality string fields (type, user, severity, filename) stored
+once in a dictionary with integer codes. The body is JSON compressed with
+zstd when the zstandard package is installed, zlib otherwise.
+
+Values without the magic prefix are decoded as plain JSON, so data written
+before the codec existed stays readable until it expires.
+"""
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Union
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is used instead
+    zstandard = None
+
+# Starts with a NUL byte so it can never be mistaken for JSON text
+MAGIC = b"\x00ELC"
+FORMAT_VERSION = 1
+HEADER_SIZE = len(MAGIC) + 3
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_NAMES = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "zstd": COMPRESSION_ZSTD}
+
+LAYOUT_JSON = 0
+LAYOUT_COLUMNAR = 1
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 256
+
+# Lists with fewer records are kept row-wise
+MIN_COLUMNAR_RECORDS = 8
+
+# Key marking a columnar-packed record list inside the body
+COLUMNS_KEY = "__columns__"
+
+
+class CodecError(ValueError):
+    """Raised for payloads that cannot be decoded"""
+
+
+def _compression(name: Optional[str] = None) -> int:
+    name = name or settings.STORAGE_CODEC
+    if name == "auto":
+        return COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+    if name not in COMPRESSION_NAMES:
+        raise ValueError(f"Unknown storage codec '{name}'. Allowed: auto, {', '.join(COMPRESSION_NAMES)}")
+    if name == "zstd" and zstandard is None:
+        raise ValueError("Storage codec 'zstd' requires the zstandard package")
+    return COMPRESSION_NAMES[name]
+
+
+def _is_record_list(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) >= MIN_COLUMNAR_RECORDS
+        and all(isinstance(item, dict) for item in value)
+    )
+
+
+def _encode_column(key: str, values: List[Any], absent: List[int]) -> Dict[str, Any]:
+    column: Dict[str, Any] = {"k": key}
+    if absent:
+        column["a"] = absent
+    if all(isinstance(value, str) or value is None for value in values):
+        codes_by_value: Dict[str, int] = {}
+        codes = [
+            -1 if value is None else codes_by_value.setdefault(value, len(codes_by_value))
+            for value in values
+        ]
+        # Dictionary-encode only fields that actually repeat
+        if len(codes_by_value) * 2 <= len(values):
+            column["d"] = list(codes_by_value)
+            column["c"] = codes
+            return column
+    column["v"] = values
+    return column
+
+
+def encode_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Columnar form of a list of dicts"""
+    keys: Dict[str, None] = {}
+    for record in records:
+        for key in record:
+            if key not in keys:
+                keys[key] = None
+
+    columns = []
+    for key in keys:
+        values = [record.get(key) for record in records]
+        absent = [row for row, record in enumerate(records) if key not in record]
+        columns.append(_encode_column(key, values, absent))
+    return {"n": len(records), "columns": columns}
+
+
+def decode_records(packed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rebuild the list of dicts from its columnar form"""
+    rows: List[Dict[str, Any]] = [{} for _ in range(packed["n"])]
+    for column in packed["columns"]:
+        key = column["k"]
+        if "d" in column:
+            dictionary = column["d"]
+            values = [dictionary[code] if code >= 0 else None for code in column["c"]]
+        else:
+            values = column["v"]
+        if "a" in column:
+            absent = set(column["a"])
+            for row_index, (row, value) in enumerate(zip(rows, values)):
+                if row_index not in absent:
+                    row[key] = value
+        else:
+            for row, value in zip(rows, values):
+                row[key] = value
+    return rows
+
+
+def _pack(value: Any) -> Any:
+    """Columnar-pack record lists at the top level and one level down"""
+    if _is_record_list(value):
+        return {COLUMNS_KEY: encode_records(value)}
+    if isinstance(value, dict):
+        return {
+            key: {COLUMNS_KEY: encode_records(item)} if _is_record_list(item) else item
+            for key, item in value.items()
+        }
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    if isinstance(value, dict):
+        if COLUMNS_KEY in value and len(value) == 1:
+            return decode_records(value[COLUMNS_KEY])
+        return {
+            key: decode_records(item[COLUMNS_KEY])
+            if isinstance(item, dict) and COLUMNS_KEY in item and len(item) == 1 else item
+            for key, item in value.items()
+        }
+    return value
+
+
+def encode_value(value: Any, codec: Optional[str] = None, columnar: Optional[bool] = None) -> bytes:
+    """Encode a JSON-compatible value (codec and layout default to the settings)"""
+    if columnar is None:
+        columnar = settings.STORAGE_COLUMNAR
+    layout = LAYOUT_COLUMNAR if columnar else LAYOUT_JSON
+    body = json.dumps(_pack(value) if columnar else value, separators=(",", ":")).encode("utf-8")
+
+    compression = _compression(codec)
+    if len(body) < MIN_COMPRESS_BYTES:
+        compression = COMPRESSION_NONE
+    if compression == COMPRESSION_ZSTD:
+        body = zstandard.ZstdCompressor(level=settings.STORAGE_ZSTD_LEVEL).compress(body)
+    elif compression == COMPRESSION_ZLIB:
+        body = zlib.compress(body, settings.STORAGE_ZLIB_LEVEL)
+
+    return MAGIC + bytes((FORMAT_VERSION, compression, layout)) + body
+
+
+def decode_value(data: Union[bytes, str]) -> Any:
+    """Decode a stored value, either codec-encoded or legacy plain JSON"""
+    if isinstance(data, str) or not data.startswith(MAGIC):
+        return json.loads(data)
+
+    version, compression, layout = data[len(MAGIC):HEADER_SIZE]
+    if version != FORMAT_VERSION:
+        raise CodecError(f"Unsupported payload format version {version}")
+    body = data[HEADER_SIZE:]
+
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise CodecError("Payload is zstd-compressed but the zstandard package is not installed")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif compression == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+    elif compression != COMPRESSION_NONE:
+        raise CodecError(f"Unknown payload compression {compression}")
+
+    value = json.loads(body)
+    return _unpack(value) if layout == LAYOUT_COLUMNAR else value
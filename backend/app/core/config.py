@@ -1,9 +1,8 @@
 """
 Application configuration settings
 """
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
-import redis
 
 class Settings(BaseSettings):
     """Application settings"""
@@ -18,13 +17,93 @@ class Settings(BaseSettings):
     
     # File Upload Settings
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100MB
-    ALLOWED_FILE_EXTENSIONS: List[str] = [".log", ".LOG"]
+    ALLOWED_FILE_EXTENSIONS: List[str] = [".log", ".LOG", ".zip", ".gz", ".tgz"]  # .gz covers .tar.gz
+    MAX_DECOMPRESSED_SIZE: int = 2 * 1024 * 1024 * 1024  # 2GB of log data per upload after decompressing archives
+    ARCHIVE_PARSE_WORKERS: int = 4  # Zip members parsed concurrently
     UPLOAD_DIR: str = "uploads"
+    UPLOAD_READ_CHUNK_SIZE: int = 1024 * 1024  # 1MB per read
+    RAW_LOG_RETENTION_SECONDS: int = 7 * 24 * 3600  # Uploaded files kept for full-entry retrieval
+    RAW_LOG_OPEN_FILES: int = 64  # Kept files memory-mapped at a time
+    
+    # Tail Ingestion Settings (server-side ingestion of a watched log directory)
+    TAIL_WATCH_DIR: Optional[str] = None  # Directory to watch; ingestion is off when unset
+    TAIL_FILE_PATTERNS: List[str] = ["E_*.LOG", "EC_*.LOG"]  # Matched case-insensitively
+    TAIL_POLL_INTERVAL: float = 5.0  # Seconds between directory scans
+    TAIL_SETTLE_SECONDS: float = 10.0  # Idle time after which a file's last entry counts as complete
+    TAIL_PUBLISH_INTERVAL: float = 30.0  # Seconds new errors are collected over polls before they are published
+    TAIL_PUBLISH_BATCH: int = 1000  # ... or until this many are pending
+    
+    # Chunked Upload Settings (resumable upload sessions)
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # Chunk size suggested to clients
+    UPLOAD_SESSION_TTL: int = 24 * 3600  # Idle sessions and their partial files are discarded after this
+    
+    # Upload Progress Settings
+    UPLOAD_PROGRESS_INTERVAL: float = 0.25  # Seconds between progress updates
+    UPLOAD_PROGRESS_CRITICAL_LIMIT: int = 10  # Critical errors pushed while parsing
+    UPLOAD_PROGRESS_WAIT: float = 30.0  # Seconds to wait for an upload to start
+    
+    # Parser Settings
+    LOG_SNIFF_BYTES: int = 64 * 1024  # Prefix of a file inspected to detect its format and encoding
+    LOG_FALLBACK_ENCODING: str = "cp1252"  # Encoding of files that are not valid UTF-8
+    PARSE_CACHE_ENABLED: bool = True  # Reuse parse results of files uploaded before
+    PARSE_CACHE_TTL: int = 7 * 24 * 3600
+    STACK_FINGERPRINT_FRAMES: int = 5  # Top frames used for stack fingerprints
+    STACK_MAX_FRAMES: int = 100  # Frames kept per .NET error
+    
+    # ML Feature Settings
+    ML_FEATURE_MODE: str = "tfidf"  # "tfidf" (refit per request) or "hashing" (incremental store)
+    HASHING_N_FEATURES: int = 2 ** 18
+    
+    # Similarity Settings
+    SIMILARITY_BLOCK_SIZE: int = 256  # Target rows per sparse matrix block
+    SIMILARITY_MAX_TARGETS: int = 5000  # Targets per batch request (use all_pairs beyond)
+    NEIGHBOR_TABLE_SIZE: int = 10  # Neighbours stored per error in all-pairs mode
+    
+    # Anomaly Detection Settings
+    ANOMALY_BUCKET_SECONDS: int = 300  # Length of the counted time buckets
+    ANOMALY_EWMA_ALPHA: float = 0.3  # Weight of the newest bucket in the EWMA
+    ANOMALY_Z_THRESHOLD: float = 3.0  # Standard deviations above the expected rate
+    ANOMALY_MIN_COUNT: int = 5  # Errors per bucket before a series can alert
+    ANOMALY_MIN_HISTORY_BUCKETS: int = 6  # Closed buckets of a series before it can alert (its warm-up)
+    ANOMALY_MAX_ALERTS: int = 500  # Alerts kept (oldest dropped first)
+    
+    # Sketch Settings (approximate history statistics)
+    SKETCH_HLL_PRECISION: int = 12  # 4096 registers, ~1.6% distinct-count error
+    SKETCH_CMS_WIDTH: int = 512  # Count-Min overcount <= e/width of the bucket total
+    SKETCH_CMS_DEPTH: int = 4  # ... with probability 1 - e^-depth
+    SKETCH_TOP_K: int = 20  # Heavy-hitter candidates kept per bucket
+    SKETCH_HISTORY_MAX_HOURS: int = 24 * 90  # Hourly buckets kept
+    SKETCH_HISTORY_TTL: int = 90 * 24 * 3600
+    
+    # Storage Settings
+    STORAGE_BACKEND: str = "redis"  # redis, memory (in-process, single worker only) or file
+    STORAGE_DIR: str = "storage"  # Directory of the file backend
+    STORAGE_CODEC: str = "auto"  # Compression of stored values: auto (zstd if installed, else zlib), zstd, zlib or none
+    STORAGE_COLUMNAR: bool = True  # Store record lists column-wise with dictionary-encoded strings
+    STORAGE_ZSTD_LEVEL: int = 3
+    STORAGE_ZLIB_LEVEL: int = 6
+    STORAGE_LOCK_TIMEOUT: int = 60  # Seconds after which a storage lock of a crashed holder expires (redis)
+    STORAGE_MEMORY_SWEEP_KEYS: int = 8  # Keys the memory backend checks for expiry on every write
+    
+    # Dataset Settings (every upload is its own dataset)
+    DATASET_MEMORY_BUDGET: int = 512 * 1024 * 1024  # Stored bytes of all datasets, parse cache and sketch history; parse cache, then least recently used datasets are evicted beyond
+    DATASET_TTL: int = 7 * 24 * 3600  # Stored data expires this long after its last publish (safety net behind the budget)
+    DATASET_ACCESS_RESOLUTION: float = 30.0  # Seconds between persisted last-access updates of a dataset
+    DATASET_RETIRE_GRACE: int = 60  # Seconds a replaced dataset version stays readable for requests still using it
+    DATASET_POINTER_CACHE_SECONDS: float = 30.0  # Max age of in-process version pointers (only while pub/sub works)
     
     # Redis Settings
     REDIS_URL: str = "redis://localhost:6379"
     REDIS_CACHE_TTL: int = 3600  # 1 hour
     
+    # HTTP Caching Settings
+    RESPONSE_CACHE_MAX_ENTRIES: int = 256  # Cached response bodies per dataset version
+    
+    # Query Settings
+    QUERY_PLAN_CACHE_SIZE: int = 256  # Compiled query plans kept per process
+    QUERY_FACET_FIELDS: List[str] = ["severity", "type", "user"]
+    SEARCH_POSTINGS_CACHE_IDS: int = 4_000_000  # Decoded posting list IDs kept per dataset version (8 bytes each)
+    
     # Environment
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
@@ -34,12 +113,3 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-# Redis client instance
-_redis_client = None
-
-def get_redis_client():
-    """Get Redis client instance"""
-    global _redis_client
-    if _redis_client is None:
-        _redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
-    return _redis_client
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+In-process metrics: per-stage and per-endpoint timing histograms, payload
+sizes and cache hit counters, rendered in the Prometheus text format
+
+Pipeline code wraps its stages in `with stage("name"):`. Every stage is
+recorded in the stage_seconds histogram; requests sent with an `X-Profile: 1`
+header additionally collect their own stages and get them back as a
+Server-Timing header.
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(float(1024 * 4 ** i) for i in range(11))  # 1KB .. 1GB
+
+PROFILE_HEADER = "x-profile"
+
+# Stages of the current request while it is profiled (None when not profiled)
+_profile: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("metrics_profile", default=None)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> (per-bucket counts, sum, count)
+        self.values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            counts, total, count = self.values.get(labels) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.values[labels] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.label_names + ("le",), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(self.label_names + ("le",), labels + ("+Inf",))
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+stage_seconds = Histogram("errlog_stage_seconds", "Duration of pipeline stages", ("stage",))
+request_seconds = Histogram("errlog_http_request_seconds", "Duration of HTTP requests", ("method", "route", "status"))
+payload_bytes = Histogram("errlog_payload_bytes", "Size of payloads read, parsed or stored", ("payload",), SIZE_BUCKETS)
+cache_requests = Counter("errlog_cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+items_processed = Counter("errlog_items_total", "Items processed by pipeline stage", ("item",))
+
+_metrics = [stage_seconds, request_seconds, payload_bytes, cache_requests, items_processed]
+
+# Callbacks rendering extra lines at scrape time (e.g. gauges of other modules)
+_collectors: List[Callable[[], List[str]]] = []
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, name)
+        profile = _profile.get()
+        if profile is not None:
+            profile.append((name, elapsed))
+
+
+def observe_payload(name: str, size: int):
+    """Record the size in bytes of a payload"""
+    payload_bytes.observe(float(size), name)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup"""
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def count_items(item: str, amount: int):
+    """Count processed items (files, errors, rows)"""
+    items_processed.inc(item, amount=float(amount))
+
+
+def register_collector(collector: Callable[[], List[str]]):
+    """Render extra metric lines at every scrape"""
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            print(f"Error collecting metrics: {str(e)}")
+    return "\n".join(lines) + "\n"
+
+
+def route_label(scope: Scope) -> str:
+    """
+    The route template the router matched (e.g. /api/uploads/{upload_id}), so
+    labels stay bounded; requests that matched no route share one label
+    """
+    path = getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+def server_timing(profile: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value, summing repeated stages (e.g. one parse per file)"""
+    totals: Dict[str, Tuple[float, int]] = {}
+    for name, elapsed in profile:
+        total, count = totals.get(name, (0.0, 0))
+        totals[name] = (total + elapsed, count + 1)
+    return ", ".join(
+        f'{re.sub(r"[^A-Za-z0-9_-]", "_", name)};dur={total * 1000:.2f}' + (f';desc="x{count}"' if count > 1 else "")
+        for name, (total, count) in totals.items()
+    )
+
+
+class MetricsMiddleware:
+    """
+    Record the duration of every HTTP request, and return a Server-Timing
+    stage breakdown for requests sent with an X-Profile header
+    """
+
+    def __init__(self, app: ASGIApp, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        profiled = Headers(scope=scope).get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+        profile: Optional[List[Tuple[str, float]]] = [] if profiled else None
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    headers = MutableHeaders(raw=message["headers"])
+                    total = ("total", time.perf_counter() - started)
+                    headers["Server-Timing"] = server_timing(profile + [total])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _profile.reset(token)
+            request_seconds.observe(
+                time.perf_counter() - started, scope["method"], route_label(scope), str(status)
+            )
@@ -0,0 +1,452 @@
+"""
+Pluggable key-value storage for analysis results
+
+All stored data goes through a StorageBackend chosen by settings.STORAGE_BACKEND:
+
+    redis   Shared Redis server (REDIS_URL); values are stored encoded
+            and compressed (app.core.codec)
+    memory  In-process dict holding native Python objects, no serialization
+            and no network hop; suited to single-process deployments,
+            benchmarks and running the API without external services.
+            Expired keys are dropped when read and, so keys never read
+            again do not pile up, a few are checked on every write
+    file    Encoded files under STORAGE_DIR; survives restarts without a server
+
+Strings go through get/setex, structured values through get_json/set_json.
+Objects returned by the memory backend are shared with the store and must
+be treated as read-only. NamespacedStorage gives one dataset its own key
+space inside the shared backend.
+
+publish/subscribe broadcast short messages (such as "a dataset was
+published") to every process sharing the storage: through Redis pub/sub,
+or in-process for the other backends. Only where `broadcasts` is true do
+other processes hear them; the file backend delivers to its own process
+only.
+
+lock() serializes read-modify-write sequences (such as the dataset
+registry) across all processes sharing the storage: a Redis key set with
+NX and an expiry, an flock()ed file for the file backend, and a thread lock
+in memory. setex_many() writes several strings as one transaction where
+the backend has them (Redis MULTI, the memory backend's lock).
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.core.codec import decode_value, encode_value
+from app.core.config import settings
+from app.core.metrics import observe_payload, stage
+
+
+def _key_family(key: str) -> str:
+    """Metric label of a key (upload_progress:<id> -> upload_progress)"""
+    return key.split(":", 1)[0]
+
+
+class StorageBackend:
+    """Key-value store with expiring entries"""
+
+    name = "base"
+
+    def __init__(self):
+        # channel -> callbacks of this process
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    @property
+    def broadcasts(self) -> bool:
+        """Whether published messages reach every process sharing this storage"""
+        return False
+
+    def publish(self, channel: str, message: str):
+        """Send a message to the subscribers of a channel"""
+        for callback in list(self._subscribers.get(channel, [])):
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"Error handling message on {channel}: {str(e)}")
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        """Call callback with every message published on a channel"""
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    @contextmanager
+    def lock(self, name: str) -> Iterator[None]:
+        """
+        Hold the lock called name against every process sharing this storage
+
+        Here only threads of this process are excluded, which covers the
+        in-process memory backend.
+        """
+        with self._locks_guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            yield
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def setex_bytes(self, key: str, ttl: int, value: bytes):
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> int:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[str]:
+        data = self.get_bytes(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def setex(self, key: str, ttl: int, value: str):
+        self.setex_bytes(key, ttl, value.encode("utf-8"))
+
+    def setex_many(self, values: Dict[str, str], ttl: int):
+        """Set several strings; readers see all or none of them where the backend supports it"""
+        for key, value in values.items():
+            self.setex(key, ttl, value)
+
+    def get_json(self, key: str) -> Any:
+        """Get a structured value (None if missing)"""
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        with stage("storage.decode"):
+            return decode_value(data)
+
+    def set_json(self, key: str, ttl: int, value: Any) -> int:
+        """Store a JSON-compatible value; returns the stored size in bytes"""
+        with stage("storage.encode"):
+            data = encode_value(value)
+        observe_payload(f"storage.{_key_family(key)}", len(data))
+        self.setex_bytes(key, ttl, data)
+        return len(data)
+
+
+class RedisStorage(StorageBackend):
+    """Storage on a Redis server"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis
+        super().__init__()
+        # Raw bytes: encoded values are binary
+        self.client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def setex_bytes(self, key: str, ttl: int, value: bytes):
+        self.client.setex(key, ttl, value)
+
+    def delete(self, *keys: str) -> int:
+        return self.client.delete(*keys) if keys else 0
+
+    def setex_many(self, values: Dict[str, str], ttl: int):
+        with self.client.pipeline(transaction=True) as pipe:
+            for key, value in values.items():
+                pipe.setex(key, ttl, value)
+            pipe.execute()
+
+    @contextmanager
+    def lock(self, name: str) -> Iterator[None]:
+        """
+        Lock key set with NX; it expires after STORAGE_LOCK_TIMEOUT seconds
+        in case the holder dies
+        """
+        import redis
+        key = f"lock:{name}"
+        token = uuid.uuid4().hex.encode("ascii")
+        delay = 0.005
+        while not self.client.set(key, token, nx=True, ex=settings.STORAGE_LOCK_TIMEOUT):
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            # Delete the key only if it is still ours; it may have expired and been taken since
+            with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    pipe.watch(key)
+                    if pipe.get(key) == token:
+                        pipe.multi()
+                        pipe.delete(key)
+                        pipe.execute()
+                except redis.WatchError:
+                    pass
+
+    @property
+    def broadcasts(self) -> bool:
+        return self._listener is not None and self._listener.is_alive()
+
+    def publish(self, channel: str, message: str):
+        if self.broadcasts:
+            # Delivered to this process as well, by the listener thread
+            self.client.publish(channel, message)
+        else:
+            super().publish(channel, message)
+            self.client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        first = channel not in self._subscribers
+        super().subscribe(channel, callback)
+        if not first:
+            return
+        if self._listener is not None:
+            self._listener.stop()
+        # One listener thread serves all channels of this process
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{
+            name: lambda message: StorageBackend.publish(
+                self, message["channel"].decode("utf-8"), message["data"].decode("utf-8")
+            )
+            for name in self._subscribers
+        })
+        self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+
+class MemoryStorage(StorageBackend):
+    """In-process storage of native objects"""
+
+    name = "memory"
+
+    # One process is all there is
+    broadcasts = True
+
+    def __init__(self):
+        super().__init__()
+        # key -> (expiry time, value, value is a native object rather than str/bytes)
+        self._entries: Dict[str, Tuple[float, Any, bool]] = {}
+        self._lock = threading.Lock()
+        # Keys still to check for expiry in the current sweep pass
+        self._sweep_keys: List[str] = []
+
+    def _entry(self, key: str) -> Optional[Tuple[float, Any, bool]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        return entry
+
+    def _sweep(self, now: float):
+        """Drop the expired among the next few keys of a pass over all keys (call with the lock held)"""
+        for _ in range(settings.STORAGE_MEMORY_SWEEP_KEYS):
+            if not self._sweep_keys:
+                # Snapshot per pass: its cost is spread over len(keys) / STORAGE_MEMORY_SWEEP_KEYS writes
+                self._sweep_keys = list(self._entries)
+                if not self._sweep_keys:
+                    return
+            key = self._sweep_keys.pop()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+
+    def _put(self, key: str, ttl: int, value: Any, native: bool):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + ttl, value, native)
+            self._sweep(now)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        value = self.get(key)
+        return value.encode("utf-8") if isinstance(value, str) else value
+
+    def setex_bytes(self, key: str, ttl: int, value: bytes):
+        self._put(key, ttl, value, False)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        if entry[2]:
+            return json.dumps(entry[1])
+        return entry[1].decode("utf-8") if isinstance(entry[1], bytes) else entry[1]
+
+    def setex(self, key: str, ttl: int, value: str):
+        self._put(key, ttl, value, False)
+
+    def setex_many(self, values: Dict[str, str], ttl: int):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (now + ttl, value, False)
+            self._sweep(now)
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._entries.pop(key, None) is not None)
+
+    def get_json(self, key: str) -> Any:
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        return entry[1] if entry[2] else decode_value(entry[1])
+
+    def set_json(self, key: str, ttl: int, value: Any) -> int:
+        self._put(key, ttl, value, True)
+        return estimate_size(value)
+
+
+class FileStorage(StorageBackend):
+    """Storage in local files, one file per key"""
+
+    name = "file"
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, quote(key, safe="") + ".val")
+
+    @contextmanager
+    def lock(self, name: str) -> Iterator[None]:
+        """flock() on a lock file: excludes processes on this host; released by the OS if the holder dies"""
+        with open(os.path.join(self.directory, quote(name, safe="") + ".lock"), "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                expires = float(handle.readline())
+                if expires <= time.time():
+                    self.delete(key)
+                    return None
+                return handle.read()
+        except (OSError, ValueError):
+            return None
+
+    def setex_bytes(self, key: str, ttl: int, value: bytes):
+        path = self._path(key)
+        # Write to a temporary file first so readers never see a partial value
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(f"{time.time() + ttl}\n".encode("ascii"))
+            handle.write(value)
+        os.replace(temp_path, path)
+
+    def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+                deleted += 1
+            except OSError:
+                pass
+        return deleted
+
+
+class NamespacedStorage(StorageBackend):
+    """
+    The keys of one namespace inside a shared backend
+
+    Keys are stored as ns:<namespace>:<key>. Sizes of the structured values
+    written through this view are recorded per key, so the namespace's
+    footprint is known without listing the backend.
+    """
+
+    def __init__(self, backend: StorageBackend, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+        self.name = backend.name
+        self.prefix = f"ns:{namespace}:"
+        self.sizes: Dict[str, int] = {}
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self.backend.get_bytes(self.prefix + key)
+
+    def setex_bytes(self, key: str, ttl: int, value: bytes):
+        self.backend.setex_bytes(self.prefix + key, ttl, value)
+
+    def delete(self, *keys: str) -> int:
+        return self.backend.delete(*(self.prefix + key for key in keys))
+
+    def lock(self, name: str):
+        return self.backend.lock(self.prefix + name)
+
+    def setex_many(self, values: Dict[str, str], ttl: int):
+        self.backend.setex_many({self.prefix + key: value for key, value in values.items()}, ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.backend.get(self.prefix + key)
+
+    def setex(self, key: str, ttl: int, value: str):
+        self.backend.setex(self.prefix + key, ttl, value)
+
+    def get_json(self, key: str) -> Any:
+        return self.backend.get_json(self.prefix + key)
+
+    def set_json(self, key: str, ttl: int, value: Any) -> int:
+        size = self.backend.set_json(self.prefix + key, ttl, value)
+        self.sizes[key] = size
+        return size
+
+    @property
+    def broadcasts(self) -> bool:
+        return self.backend.broadcasts
+
+    def publish(self, channel: str, message: str):
+        self.backend.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        self.backend.subscribe(channel, callback)
+
+
+def estimate_size(value: Any, sample: int = 64) -> int:
+    """
+    Approximate JSON size of a value without serializing all of it
+
+    Long lists are measured on an evenly spaced sample of their items.
+    """
+    if isinstance(value, list) and len(value) > sample:
+        step = len(value) / sample
+        sampled = [value[int(i * step)] for i in range(sample)]
+        return int(len(json.dumps(sampled)) * len(value) / sample)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + estimate_size(item, sample) for key, item in value.items())
+    return len(json.dumps(value))
+
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend: str) -> StorageBackend:
+    """Create a storage backend by name"""
+    if backend == "redis":
+        return RedisStorage(settings.REDIS_URL)
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "file":
+        return FileStorage(settings.STORAGE_DIR)
+    raise ValueError(f"Unknown storage backend '{backend}'. Allowed: redis, memory, file")
+
+
+def get_storage() -> StorageBackend:
+    """Get the configured storage backend"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage(settings.STORAGE_BACKEND)
+    return _storage
+
+
+def set_storage(storage: Optional[StorageBackend]):
+    """Replace the storage backend (None recreates it from settings on next use)"""
+    global _storage
+    _storage = storage
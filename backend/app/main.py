@@ -4,9 +4,14 @@ Main FastAPI application for Error Log Analytics
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.core.config import settings
-from app.api import upload, analyze, errors, ml
+from app.api import upload, analyze, errors, ml, ingest, datasets
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.utils.http_cache import ConditionalGetMiddleware
+from app.utils.upload_progress import UploadProgressMiddleware
+from app.utils.tail_ingest import start_tail_ingestion, stop_tail_ingestion
 
 # Create FastAPI application
 app = FastAPI(
@@ -19,19 +24,37 @@ app = FastAPI(
 
 # Add middleware
 app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Outside GZip so cached bodies are stored (and served) already compressed
+app.add_middleware(ConditionalGetMiddleware)
+# Counts upload bodies while they arrive, before the route parses the form
+app.add_middleware(UploadProgressMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Outermost, so request timings include every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(upload.router, prefix="/api", tags=["upload"])
 app.include_router(analyze.router, prefix="/api", tags=["analyze"])
 app.include_router(errors.router, prefix="/api", tags=["errors"])
 app.include_router(ml.router, tags=["machine-learning"])
+app.include_router(ingest.router, prefix="/api", tags=["ingest"])
+app.include_router(datasets.router, prefix="/api", tags=["datasets"])
+
+@app.on_event("startup")
+async def startup():
+    """Start ingesting the watched log directory (if TAIL_WATCH_DIR is set)"""
+    start_tail_ingestion()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_tail_ingestion()
 
 @app.get("/")
 async def root():
@@ -42,6 +65,11 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics (stage and request timings, payload sizes, cache hit rates)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,33 @@
+"""
+Normalized message fingerprints
+
+Variable parts of a log message (hex addresses, file paths, numbers) are
+masked so that repeated occurrences of the same error hash to the same
+fingerprint, independent of time, memory addresses or record IDs.
+"""
+import hashlib
+import re
+
+# Masks are applied in order: paths and hex values before plain digits
+MESSAGE_MASKS = [
+    (re.compile(r'[A-Za-z]:\\[^\s"\'<>|]*|\\\\[^\s"\'<>|]+|(?<![\w.])/(?:[\w.-]+/)+[\w.-]*'), '<path>'),
+    (re.compile(r'\b0x[0-9A-Fa-f]+\b'), '<hex>'),
+    (re.compile(r'\b[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}\b'), '<guid>'),
+    (re.compile(r'\b(?=[0-9A-Fa-f]*\d)[0-9A-Fa-f]{8,}\b'), '<hex>'),
+    (re.compile(r'\d+'), '<n>'),
+]
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_message(content: str) -> str:
+    """Mask variable parts of a log message and collapse whitespace"""
+    for pattern, replacement in MESSAGE_MASKS:
+        content = pattern.sub(replacement, content)
+    return WHITESPACE_PATTERN.sub(' ', content).strip()
+
+
+def message_fingerprint(error_type: str, code: int, content: str) -> str:
+    """Stable fingerprint of error type, code and normalized message content"""
+    key = f"{error_type}|{code}|{normalize_message(content)}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,120 @@
+"""
+Parse results cached by file content hash
+
+Operators re-upload overlapping sets of daily log files. Parse results are
+stored per (content hash, filename), so an identical file is never parsed
+twice. Per filename the hash and size of the last parsed version is kept as
+well: when a file comes back longer with the same prefix (the application
+appended to it), only the tail from the last entry on is parsed again.
+
+Stored errors reference stack frames by their index in the entry's own
+frame list and are re-interned into the upload's FrameTable when reused.
+"""
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.parsers.stack_trace import FrameTable
+
+PARSE_CACHE_PREFIX = "parse_cache:"
+PARSE_FILE_PREFIX = "parse_file:"
+
+# Bump when parser output changes so stale cached results are not reused
+PARSE_CACHE_VERSION = 1
+
+
+class StreamingHasher:
+    """SHA-256 of a file fed chunk by chunk, plus the hash of its first prefix_size bytes"""
+
+    def __init__(self, prefix_size: Optional[int] = None):
+        self._hash = hashlib.sha256()
+        self._prefix_size = prefix_size if prefix_size else None
+        self._size = 0
+        self.prefix_digest: Optional[str] = None
+
+    def update(self, chunk: bytes):
+        if self._prefix_size is not None and self.prefix_digest is None:
+            remaining = self._prefix_size - self._size
+            if remaining <= len(chunk):
+                self._hash.update(chunk[:remaining])
+                self.prefix_digest = self._hash.hexdigest()
+                self._hash.update(chunk[remaining:])
+                self._size += len(chunk)
+                return
+        self._hash.update(chunk)
+        self._size += len(chunk)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def _parser_signature() -> str:
+    # Parser settings that change the stored errors
+    return f"{PARSE_CACHE_VERSION}.{settings.STACK_FINGERPRINT_FRAMES}.{settings.STACK_MAX_FRAMES}"
+
+
+def _name_digest(filename: str) -> str:
+    return hashlib.sha256(filename.encode("utf-8")).hexdigest()[:16]
+
+
+def _entry_key(content_hash: str, filename: str) -> str:
+    return f"{PARSE_CACHE_PREFIX}{_parser_signature()}:{content_hash}:{_name_digest(filename)}"
+
+
+def load_file_state(storage, filename: str) -> Optional[Dict[str, Any]]:
+    """Hash and size of the last parsed version of a file"""
+    state = storage.get_json(PARSE_FILE_PREFIX + _name_digest(filename))
+    if state and state.get("signature") == _parser_signature():
+        return state
+    return None
+
+
+def load_parsed(storage, content_hash: str, filename: str, frame_table: FrameTable) -> Optional[Dict[str, Any]]:
+    """
+    Cached parse of a file: {"format", "size", "errors"}
+
+    The errors are fresh copies with frame IDs of frame_table.
+    """
+    entry = storage.get_json(_entry_key(content_hash, filename))
+    if entry is None:
+        return None
+    frames = entry["frames"]
+    errors = []
+    for cached in entry["errors"]:
+        error = dict(cached)
+        if "frames" in error:
+            error["frames"] = [frame_table.intern(frames[index]) for index in error["frames"]]
+        errors.append(error)
+    return {"format": entry["format"], "size": entry["size"], "errors": errors}
+
+
+def save_parsed(storage, content_hash: str, filename: str, log_format: Optional[str], size: int,
+                errors: List[Dict[str, Any]], frame_table: FrameTable) -> Tuple[str, int]:
+    """
+    Cache the parse of a file and remember it as the file's latest version
+
+    Returns the key and stored size of the cached parse.
+    """
+    local_frames = FrameTable()
+    stored = []
+    for error in errors:
+        error = dict(error)
+        error.pop("file_id", None)
+        if "frames" in error:
+            error["frames"] = [local_frames.intern(frame_table.frames[frame_id]) for frame_id in error["frames"]]
+        stored.append(error)
+
+    ttl = settings.PARSE_CACHE_TTL
+    key = _entry_key(content_hash, filename)
+    stored_size = storage.set_json(key, ttl, {
+        "format": log_format,
+        "size": size,
+        "errors": stored,
+        "frames": local_frames.frames
+    })
+    storage.set_json(PARSE_FILE_PREFIX + _name_digest(filename), ttl, {
+        "hash": content_hash,
+        "size": size,
+        "signature": _parser_signature()
+    })
+    return key, stored_size
@@ -0,0 +1,125 @@
+"""
+Log format and encoding detection from the first bytes of a file
+
+Only a bounded prefix (LOG_SNIFF_BYTES) is looked at, so detection costs
+the same for a 1KB and a 1GB file. The format is recognized by its entry
+delimiter, which also classifies renamed files correctly; the E_/EC_
+filename prefix only decides when the prefix holds no delimiter. The
+encoding comes from a byte order mark, else from the first non-ASCII
+bytes: UTF-8 if they decode as such and LOG_FALLBACK_ENCODING (cp1252,
+usual for Visual Objects logs written on Windows) otherwise. A prefix of
+plain ASCII reads the same in both, so its encoding is not known yet
+(None) and is decided by later bytes; a complete file in memory is
+decoded strictly as UTF-8 instead, falling back on any invalid byte.
+"""
+import codecs
+import os
+import re
+from typing import NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+VISUAL_OBJECTS = "visual_objects"
+DOTNET = "dotnet"
+
+# Entry delimiters of the two log formats
+VISUAL_OBJECTS_DELIMITER = '***********************ERROR********************************'
+DOTNET_DELIMITER = '------------------------------'
+
+LOG_DELIMITERS = {VISUAL_OBJECTS: VISUAL_OBJECTS_DELIMITER, DOTNET: DOTNET_DELIMITER}
+
+_BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be")
+)
+
+_NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+# Encodings in which ASCII text keeps its bytes, so byte offsets of delimiters are valid
+_ASCII_COMPATIBLE = ("utf-8", "ascii", "cp1252", "latin-1", "iso-8859-1", "iso-8859-15")
+
+
+class LogSniff(NamedTuple):
+    """Detected format (None if not a known log) and encoding (None while only ASCII was seen) of a file"""
+    log_format: Optional[str]
+    encoding: Optional[str]
+
+
+def sniff_encoding(data: bytes) -> Optional[str]:
+    """
+    Encoding of log bytes judged by their byte order mark or by the
+    LOG_SNIFF_BYTES from their first non-ASCII byte on; None if they are all ASCII
+    """
+    for mark, encoding in _BYTE_ORDER_MARKS:
+        if data.startswith(mark):
+            return encoding
+    first = _NON_ASCII.search(data)
+    if first is None:
+        return None
+    try:
+        # Incremental: a character cut off at the end of the window is not an error
+        window = data[first.start():first.start() + settings.LOG_SNIFF_BYTES]
+        codecs.getincrementaldecoder("utf-8")().decode(window, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return settings.LOG_FALLBACK_ENCODING
+
+
+def format_from_filename(filename: str) -> Optional[str]:
+    """Format implied by the E_/EC_ naming convention"""
+    name = os.path.basename(filename).upper()
+    if name.startswith("EC_"):
+        return DOTNET
+    if name.startswith("E_"):
+        return VISUAL_OBJECTS
+    return None
+
+
+def detect_log_format(text: str, filename: str) -> Optional[str]:
+    """Log format of decoded content (only its first LOG_SNIFF_BYTES characters are searched)"""
+    head = text[:settings.LOG_SNIFF_BYTES]
+    if VISUAL_OBJECTS_DELIMITER in head:
+        return VISUAL_OBJECTS
+    if DOTNET_DELIMITER in head:
+        return DOTNET
+    return format_from_filename(filename)
+
+
+def sniff_log(head: bytes, filename: str = "") -> LogSniff:
+    """Format and encoding of a file from its first bytes (more than LOG_SNIFF_BYTES are ignored)"""
+    head = head[:settings.LOG_SNIFF_BYTES]
+    encoding = sniff_encoding(head)
+    return LogSniff(detect_log_format(head.decode(encoding or "ascii", errors="ignore"), filename), encoding)
+
+
+def ascii_compatible(encoding: Optional[str]) -> bool:
+    """Whether delimiters can be located in the undecoded bytes (needed for entry offsets)"""
+    return codecs.lookup(encoding or "ascii").name in {codecs.lookup(name).name for name in _ASCII_COMPATIBLE}
+
+
+def delimiter_bytes(log_format: str, encoding: Optional[str]) -> bytes:
+    """Entry delimiter of a format as it appears in the file's bytes"""
+    return LOG_DELIMITERS[log_format].encode(encoding or "ascii")
+
+
+def decode_complete(data: bytes) -> Tuple[str, str]:
+    """
+    Decode log bytes that are complete (a whole file or whole entries):
+    (text, encoding). Without a byte order mark they are UTF-8 if all of
+    them decode strictly as such and LOG_FALLBACK_ENCODING otherwise.
+    """
+    for mark, encoding in _BYTE_ORDER_MARKS:
+        if data.startswith(mark):
+            return data.decode(encoding, errors="ignore"), encoding
+    try:
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return data.decode(settings.LOG_FALLBACK_ENCODING, errors="ignore"), settings.LOG_FALLBACK_ENCODING
+
+
+def decode_log(data: bytes, encoding: Optional[str] = None) -> str:
+    """Decode complete log bytes, deciding the encoding from all of them unless given"""
+    if encoding is None:
+        return decode_complete(data)[0]
+    return data.decode(encoding, errors="ignore")
@@ -0,0 +1,97 @@
+"""
+.NET stack trace extraction with an interned frame table
+
+Frame strings are stored once in a FrameTable and parsed errors only keep
+integer frame IDs, so deep stacks repeated thousands of times cost a few
+integers per error. A fingerprint over the top frames groups identical
+crashes exactly.
+"""
+import hashlib
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# Stack frame lines, English and German .NET runtimes ("at ... in ...:line N" / "bei ... in ...:Zeile N").
+# The method must look like a frame (Namespace.Type.Method(args), including generic, nested and
+# compiler-generated names), so message text such as "at least one ..." is not taken for one
+FRAME_PATTERN = re.compile(
+    r'^\s*(?:at|bei)\s+(?P<method>[\w.`<>$+|\[\],]+\(.*?\))'
+    r'(?:\s+in\s+(?P<location>.+?):(?:line|Zeile)\s+(?P<line>\d+))?\s*$'
+)
+
+# Fully qualified exception class names (System.*, Microsoft.*, application namespaces)
+EXCEPTION_PATTERN = re.compile(r'\b((?:[A-Za-z_]\w*\.)+\w*Exception)\b')
+
+
+class FrameTable:
+    """Interned stack frame strings, addressed by integer ID"""
+
+    def __init__(self, frames: Optional[Iterable[str]] = None):
+        self.frames: List[str] = list(frames or [])
+        self._ids: Dict[str, int] = {frame: i for i, frame in enumerate(self.frames)}
+
+    def intern(self, frame: str) -> int:
+        """Get the ID of a frame, adding it on first sight"""
+        frame_id = self._ids.get(frame)
+        if frame_id is None:
+            frame_id = len(self.frames)
+            self.frames.append(frame)
+            self._ids[frame] = frame_id
+        return frame_id
+
+    def resolve(self, frame_ids: Iterable[int]) -> List[str]:
+        """Turn frame IDs back into frame strings"""
+        return [self.frames[i] for i in frame_ids if 0 <= i < len(self.frames)]
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+
+def extract_stack_trace(block: str, max_frames: int = 100) -> Dict[str, List[str]]:
+    """
+    Extract the exception chain (outer to inner) and the stack frames of one .NET log block
+    """
+    exceptions = []
+    frames = []
+
+    for line in block.splitlines():
+        frame_match = FRAME_PATTERN.match(line)
+        if frame_match:
+            if len(frames) < max_frames:
+                frame = frame_match.group('method').strip()
+                if frame_match.group('location'):
+                    frame += f" in {frame_match.group('location')}:line {frame_match.group('line')}"
+                frames.append(frame)
+            continue
+
+        # Inner exceptions appear as "---> System.X: ..." or on "Inner Exception" lines
+        for exception_type in EXCEPTION_PATTERN.findall(line):
+            if not exceptions or exceptions[-1] != exception_type:
+                exceptions.append(exception_type)
+
+    return {"exceptions": exceptions, "frames": frames}
+
+
+def frame_method(frame: str) -> str:
+    """Strip file and line information so fingerprints survive rebuilds"""
+    return frame.split(' in ', 1)[0]
+
+
+def stack_fingerprint(exception_type: str, frames: List[str], top_n: int) -> Optional[str]:
+    """Fingerprint of an exception type and its top N stack frames"""
+    if not frames:
+        return None
+    key = "|".join([exception_type] + [frame_method(frame) for frame in frames[:top_n]])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def attach_stack_trace(error: Dict[str, Any], block: str, frame_table: FrameTable,
+                       top_n: int, max_frames: int = 100) -> Dict[str, Any]:
+    """Add exception chain, interned frame IDs and stack fingerprint to a parsed error"""
+    trace = extract_stack_trace(block, max_frames)
+    exceptions = trace["exceptions"]
+    error["exceptions"] = exceptions
+    error["frames"] = [frame_table.intern(frame) for frame in trace["frames"]]
+    error["stack_fingerprint"] = stack_fingerprint(
+        exceptions[0] if exceptions else error.get("type", ""), trace["frames"], top_n
+    )
+    return error
@@ -0,0 +1,49 @@
+"""
+Time ordering of parsed error streams
+
+Each log file is written in (almost) chronological order, so every file is
+turned into a sorted run and the runs are combined with a streaming k-way
+heap merge into one globally time-ordered error list.
+"""
+import calendar
+import heapq
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+def timestamp_sort_key(timestamp: str) -> str:
+    """Turn a 'DD.MM.YYYY HH:MM:SS' timestamp into a lexicographically sortable key"""
+    if len(timestamp) >= 19 and timestamp[2] == '.' and timestamp[5] == '.':
+        return timestamp[6:10] + timestamp[3:5] + timestamp[0:2] + timestamp[10:19]
+    return timestamp
+
+
+def timestamp_epoch(timestamp: str) -> Optional[int]:
+    """Seconds since the epoch of a 'DD.MM.YYYY HH:MM:SS' timestamp (None if malformed)"""
+    try:
+        return calendar.timegm((
+            int(timestamp[6:10]), int(timestamp[3:5]), int(timestamp[0:2]),
+            int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19])
+        ))
+    except (ValueError, TypeError):
+        return None
+
+
+def error_sort_key(error: Dict[str, Any]) -> str:
+    """Sort key of a parsed error"""
+    return timestamp_sort_key(error.get('timestamp', ''))
+
+
+def sort_run(errors: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sort the errors of one file by time, in place
+
+    The sort is stable and close to linear for the almost-sorted input of a
+    single log file.
+    """
+    errors.sort(key=error_sort_key)
+    return errors
+
+
+def merge_runs(runs: Iterable[List[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """Lazily merge sorted runs into one time-ordered stream (ties keep run order)"""
+    return heapq.merge(*runs, key=error_sort_key)
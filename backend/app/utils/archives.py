@@ -0,0 +1,121 @@
+"""
+Streaming access to uploaded log archives (.zip, .tar.gz/.tgz, .gz)
+
+Members are decompressed chunk by chunk straight from the uploaded file;
+nothing is extracted to disk and no member is held in memory as a whole.
+Decompressed bytes are counted as they flow, so a member larger than
+MAX_FILE_SIZE or an archive expanding beyond MAX_DECOMPRESSED_SIZE is
+rejected as soon as the limit is crossed rather than after inflating it.
+
+Zip members can be opened independently and are read in parallel; tar
+streams only allow one member at a time.
+"""
+import gzip
+import os
+import tarfile
+import threading
+import zipfile
+from typing import BinaryIO, Callable, Iterator, NamedTuple, Optional
+
+from app.core.config import settings
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar.gz", ".tgz", ".gz")
+
+
+class ArchiveLimitError(ValueError):
+    """Raised when decompressed data exceeds a size limit"""
+
+
+class ArchiveMember(NamedTuple):
+    """A log file inside an archive; open() returns a fresh decompressing stream"""
+    name: str
+    open: Callable[[], BinaryIO]
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_log_member(name: str) -> bool:
+    """Whether an archive member is a log file (directories and other files are skipped)"""
+    base = os.path.basename(name)
+    return bool(base) and not base.startswith(".") and any(
+        base.lower().endswith(ext.lower()) for ext in settings.ALLOWED_FILE_EXTENSIONS if not is_archive(ext)
+    )
+
+
+class ByteBudget:
+    """Decompressed bytes allowed for one upload, shared by all its members"""
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = settings.MAX_DECOMPRESSED_SIZE if limit is None else limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def spend(self, count: int):
+        with self._lock:
+            self.used += count
+            if self.used > self.limit:
+                raise ArchiveLimitError(
+                    f"Decompressed upload exceeds limit ({self.limit} bytes)"
+                )
+
+
+def read_member(member: ArchiveMember, budget: ByteBudget,
+                chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """Decompressed chunks of a member, enforcing the member and upload limits"""
+    chunk_size = chunk_size or settings.UPLOAD_READ_CHUNK_SIZE
+    size = 0
+    with member.open() as stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            size += len(chunk)
+            if size > settings.MAX_FILE_SIZE:
+                raise ArchiveLimitError(
+                    f"Archive member '{member.name}' exceeds limit ({settings.MAX_FILE_SIZE} bytes)"
+                )
+            budget.spend(len(chunk))
+            yield chunk
+
+
+def _zip_members(fileobj: BinaryIO) -> Iterator[ArchiveMember]:
+    archive = zipfile.ZipFile(fileobj)
+    for info in archive.infolist():
+        if not info.is_dir() and is_log_member(info.filename):
+            yield ArchiveMember(info.filename, lambda info=info: archive.open(info))
+
+
+def _tar_members(fileobj: BinaryIO) -> Iterator[ArchiveMember]:
+    # Stream mode: members are visited in order, each readable only until the next
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for info in archive:
+            if info.isfile() and is_log_member(info.name):
+                yield ArchiveMember(info.name, lambda info=info: archive.extractfile(info))
+
+
+def _gzip_member(fileobj: BinaryIO, filename: str) -> Iterator[ArchiveMember]:
+    name = os.path.basename(filename)[:-3]
+    yield ArchiveMember(name, lambda: gzip.GzipFile(fileobj=fileobj, mode="rb"))
+
+
+def archive_members(fileobj: BinaryIO, filename: str) -> Iterator[ArchiveMember]:
+    """
+    Log members of an uploaded archive
+
+    Zip members may be read in any order and concurrently. For tar and gzip
+    archives each member must be read before the iterator advances.
+    """
+    lower = filename.lower()
+    if lower.endswith(".zip"):
+        return _zip_members(fileobj)
+    if lower.endswith((".tar.gz", ".tgz")):
+        return _tar_members(fileobj)
+    if lower.endswith(".gz"):
+        return _gzip_member(fileobj, filename)
+    raise ValueError(f"Unsupported archive '{filename}'. Allowed: {', '.join(ARCHIVE_EXTENSIONS)}")
+
+
+def supports_parallel_members(filename: str) -> bool:
+    return filename.lower().endswith(".zip")
@@ -0,0 +1,121 @@
+"""
+In-process columnar view of the stored error dataset
+
+The analyzed_errors list is decoded once per dataset version and turned
+into NumPy columns (categorical fields factorized into integer codes), so
+query and facet evaluation runs as vectorized array operations. Other
+derived structures (indexes, feature matrices) share the same per-version
+cache through get_versioned(). Entries are kept per dataset and dropped when
+the dataset is republished (by any worker) or evicted.
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.storage import get_storage
+from app.core.metrics import record_cache, stage
+from app.utils.datasets import on_dataset_published, on_dataset_removed
+from app.utils.http_cache import get_dataset_version
+
+# Fields stored as integer codes plus a table of unique values
+CATEGORICAL_FIELDS = ('severity', 'user', 'type', 'filename', 'fingerprint', 'stack_fingerprint')
+
+# Sentinel for rows without a parseable timestamp
+MISSING_TIME = np.iinfo(np.int64).min
+
+
+class ErrorColumns:
+    """Column arrays of one dataset version"""
+
+    def __init__(self, version: str, errors: List[Dict[str, Any]]):
+        self.version = version
+        self.errors = errors
+        self.size = len(errors)
+
+        df = pd.DataFrame(errors, columns=['id', 'code', 'timestamp', 'content', *CATEGORICAL_FIELDS])
+
+        self.ids = df['id'].fillna(0).to_numpy(dtype=np.int64)
+        self.codes = df['code'].fillna(-1).to_numpy(dtype=np.int64)
+        self.content_lower = df['content'].fillna('').astype(str).str.lower()
+
+        times = pd.to_datetime(df['timestamp'], format='%d.%m.%Y %H:%M:%S', errors='coerce')
+        self.times = np.where(times.isna(), MISSING_TIME, times.to_numpy(dtype='datetime64[s]').astype(np.int64))
+
+        # Categorical columns: integer codes into a table of unique values (-1 = missing)
+        self.categories: Dict[str, np.ndarray] = {}
+        self.category_codes: Dict[str, np.ndarray] = {}
+        for field in CATEGORICAL_FIELDS:
+            codes, uniques = pd.factorize(df[field])
+            self.category_codes[field] = codes
+            self.categories[field] = np.asarray(uniques, dtype=object)
+
+    def rows(self, indices: np.ndarray) -> List[Dict[str, Any]]:
+        """Materialize the error dicts at the given row positions"""
+        return [self.errors[i] for i in indices]
+
+    def facet(self, field: str, indices: np.ndarray, top: int = 10) -> Dict[str, int]:
+        """Value counts of a categorical field over the given rows"""
+        codes = self.category_codes[field][indices]
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return {}
+        counts = np.bincount(codes, minlength=len(self.categories[field]))
+        order = np.argsort(counts)[::-1][:top]
+        return {str(self.categories[field][i]): int(counts[i]) for i in order if counts[i] > 0}
+
+
+_lock = threading.Lock()
+
+# (name, dataset namespace) -> (dataset version, derived object)
+_cached: Dict[Tuple[str, Optional[str]], Tuple[str, Any]] = {}
+
+
+def get_versioned(name: str, loader: Callable[[Any, str], Any], storage=None) -> Any:
+    """
+    Get an object derived from the current dataset, cached per dataset version
+
+    loader(storage, version) is called only when the dataset version changed.
+    """
+    storage = storage or get_storage()
+    version = get_dataset_version(storage)
+    key = (name, getattr(storage, "namespace", None))
+
+    cached = _cached.get(key)
+    if cached is not None and cached[0] == version:
+        record_cache(name, True)
+        return cached[1]
+
+    with _lock:
+        cached = _cached.get(key)
+        if cached is not None and cached[0] == version:
+            record_cache(name, True)
+            return cached[1]
+        record_cache(name, False)
+        with stage(f"load.{name}"):
+            value = loader(storage, version)
+        _cached[key] = (version, value)
+        return value
+
+
+def _load_error_columns(storage, version: str) -> ErrorColumns:
+    return ErrorColumns(version, storage.get_json("analyzed_errors") or [])
+
+
+def get_error_columns(storage=None) -> ErrorColumns:
+    """Get the column view of a dataset, rebuilding it when the version changed"""
+    return get_versioned("error_columns", _load_error_columns, storage)
+
+
+def clear_dataset_cache(namespace: Optional[str] = None):
+    """Drop the cached views of one dataset, or all of them"""
+    # Without _lock, which is held while loading: a stale value stored by a
+    # load in flight is never served, since entries are checked by version
+    for key in list(_cached):
+        if namespace is None or key[1] == namespace:
+            _cached.pop(key, None)
+
+
+on_dataset_published(clear_dataset_cache)
+on_dataset_removed(clear_dataset_cache)
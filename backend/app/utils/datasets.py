@@ -0,0 +1,462 @@
+"""
+Dataset registry: every upload is stored as its own dataset
+
+Dataset keys (analyzed_errors, error_summary, ...) live in a namespace per
+dataset ID, so uploads of different investigations no longer overwrite
+each other. The registry records per dataset its stored size, creation
+time, last publish and last access. Keys stored outside any dataset (the
+parse cache, the sketch history) have their sizes recorded as well. When
+the stored size of both exceeds DATASET_MEMORY_BUDGET, parse cache entries
+are evicted first, oldest first, then the least recently used datasets. Requests without a dataset parameter read the current dataset,
+which is the most recent upload.
+
+Each publish writes its keys under a new version (ns:<id>@<version>:) and
+then swaps the dataset's version pointer (ns:<id>:dataset_version) in one
+write. A reader resolves the pointer once and reads every key of that
+version, so it never mixes keys of two publishes; replaced versions are
+deleted DATASET_RETIRE_GRACE seconds later by a timer of the publishing
+process (or by the next registry update, should that process be gone)
+and count against the budget until then. Pointer swaps and removals are
+broadcast over the storage's pub/sub channel: every process drops its
+derived caches right away, and where broadcasts reach all processes the
+pointers themselves are cached in-process between publishes.
+
+Registry updates hold the storage lock of the registry key, so workers
+sharing the storage do not lose each other's entries, and the pointers a
+publish changes are written in one transaction (see storage.lock() and
+setex_many() for what each backend guarantees).
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from app.core.config import settings
+from app.core.storage import NamespacedStorage, StorageBackend, get_storage
+from app.analyzers.feature_store import feature_store_path
+from app.analyzers.neighbor_table import neighbor_table_path
+
+# Key holding the published version: of a dataset inside its namespace, and
+# of the latest publish of any dataset in the shared storage
+DATASET_VERSION_KEY = "dataset_version"
+
+# Version reported while no dataset has been uploaded (demo data)
+EMPTY_DATASET_VERSION = "empty"
+
+DATASET_REGISTRY_KEY = "dataset_registry"
+CURRENT_DATASET_KEY = "current_dataset"
+DATASET_ACCESS_PREFIX = "dataset_access:"
+
+# Keys outside the datasets counted against the budget: key -> [size, expiry time, evictable]
+SHARED_SIZES_KEY = "shared_sizes"
+
+# Pub/sub channel announcing published and removed datasets
+DATASET_EVENTS_CHANNEL = "dataset_events"
+
+# Namespace read while no dataset exists (nothing is stored under it)
+EMPTY_DATASET = "empty"
+
+_DATASET_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# dataset ID -> time this process last persisted an access
+_access_written: Dict[str, float] = {}
+
+# Called with the ID of every published, and every removed, dataset
+_publish_listeners: List[Callable[[str], None]] = []
+_removal_listeners: List[Callable[[str], None]] = []
+
+# Identifies this process's own broadcasts
+_process_id = uuid.uuid4().hex
+
+# Storage backends this process listens to
+_subscribed: List[StorageBackend] = []
+
+# pointer key -> (value, time read); bumping the generation invalidates reads in flight
+_pointers: Dict[str, Tuple[Optional[str], float]] = {}
+_pointer_generation = 0
+
+
+class DatasetStorage(NamespacedStorage):
+    """
+    The keys of one version of a dataset
+
+    The version is fixed when the view is created, so all reads through it
+    see the same publish. The namespace stays the dataset ID.
+    """
+
+    def __init__(self, backend: StorageBackend, dataset_id: str, version: Optional[str]):
+        super().__init__(backend, dataset_id)
+        self.version = version
+        self.prefix = f"ns:{dataset_id}@{version or EMPTY_DATASET_VERSION}:"
+
+
+def new_dataset_id() -> str:
+    """Create a fresh dataset identifier"""
+    return uuid.uuid4().hex[:16]
+
+
+def _pointer_key(dataset_id: str) -> str:
+    return f"ns:{dataset_id}:{DATASET_VERSION_KEY}"
+
+
+def _handle_event(message: str):
+    """Apply a dataset event: drop cached pointers and notify the listeners"""
+    global _pointer_generation
+    event = json.loads(message)
+    _pointer_generation += 1
+    _pointers.clear()
+    listeners = _publish_listeners if event["event"] == "published" else _removal_listeners
+    for listener in listeners:
+        listener(event["dataset"])
+
+
+def _on_broadcast(message: str):
+    if json.loads(message).get("origin") != _process_id:
+        _handle_event(message)
+
+
+def _listen(storage: StorageBackend):
+    backend = getattr(storage, "backend", storage)
+    if not any(subscribed is backend for subscribed in _subscribed):
+        _subscribed.append(backend)
+        backend.subscribe(DATASET_EVENTS_CHANNEL, _on_broadcast)
+
+
+def _announce(storage: StorageBackend, event: str, dataset_id: str):
+    """Apply an event in this process, then broadcast it to the others"""
+    message = json.dumps({"event": event, "dataset": dataset_id, "origin": _process_id})
+    _handle_event(message)
+    try:
+        storage.publish(DATASET_EVENTS_CHANNEL, message)
+    except Exception as e:
+        print(f"Error broadcasting dataset event: {str(e)}")
+
+
+def read_pointer(storage: StorageBackend, key: str) -> Optional[str]:
+    """
+    Read a version or current-dataset pointer
+
+    Cached for up to DATASET_POINTER_CACHE_SECONDS while the storage
+    broadcasts pointer changes to all processes; read from storage otherwise.
+    """
+    _listen(storage)
+    if not storage.broadcasts:
+        return storage.get(key)
+    cached = _pointers.get(key)
+    if cached is not None and time.monotonic() - cached[1] < settings.DATASET_POINTER_CACHE_SECONDS:
+        return cached[0]
+    generation = _pointer_generation
+    value = storage.get(key)
+    if generation == _pointer_generation:
+        # No event arrived while reading, so the value is not already stale
+        _pointers[key] = (value, time.monotonic())
+    return value
+
+
+def dataset_storage(dataset_id: str, storage: Optional[StorageBackend] = None) -> DatasetStorage:
+    """Storage view holding the keys of the published version of one dataset"""
+    storage = storage or get_storage()
+    return DatasetStorage(storage, dataset_id, read_pointer(storage, _pointer_key(dataset_id)))
+
+
+def stage_dataset(dataset_id: str, version: str, storage: Optional[StorageBackend] = None) -> DatasetStorage:
+    """Storage view to write a new version of a dataset into, invisible until published"""
+    return DatasetStorage(storage or get_storage(), dataset_id, version)
+
+
+def on_dataset_published(listener: Callable[[str], None]):
+    """Register a callback for published datasets in any process (to drop derived caches)"""
+    _publish_listeners.append(listener)
+
+
+def on_dataset_removed(listener: Callable[[str], None]):
+    """Register a callback for evicted and deleted datasets (to drop derived caches)"""
+    _removal_listeners.append(listener)
+
+
+def _dataset_exists(dataset_id: str, storage: StorageBackend) -> bool:
+    return read_pointer(storage, _pointer_key(dataset_id)) is not None
+
+
+def resolve_dataset(dataset: Optional[str] = None, storage: Optional[StorageBackend] = None) -> str:
+    """
+    ID of the requested dataset, or of the current one if none is given
+
+    Raises KeyError for an unknown dataset. Without any dataset the empty
+    namespace is returned.
+    """
+    storage = storage or get_storage()
+    if dataset:
+        if not _DATASET_ID.match(dataset) or not _dataset_exists(dataset, storage):
+            raise KeyError(dataset)
+        return dataset
+    current = read_pointer(storage, CURRENT_DATASET_KEY)
+    if current and _dataset_exists(current, storage):
+        return current
+    return EMPTY_DATASET
+
+
+def touch_dataset(dataset_id: str, storage: Optional[StorageBackend] = None):
+    """Record an access, persisted at most every DATASET_ACCESS_RESOLUTION seconds"""
+    if dataset_id == EMPTY_DATASET:
+        return
+    now = time.time()
+    if now - _access_written.get(dataset_id, 0.0) < settings.DATASET_ACCESS_RESOLUTION:
+        return
+    _access_written[dataset_id] = now
+    storage = storage or get_storage()
+    try:
+        storage.setex(DATASET_ACCESS_PREFIX + dataset_id, settings.DATASET_TTL, str(now))
+    except Exception as e:
+        print(f"Error recording dataset access: {str(e)}")
+
+
+async def get_dataset_storage(request: Request, dataset: Optional[str] = None) -> StorageBackend:
+    """
+    Storage of the dataset named by the optional dataset query parameter
+    (FastAPI dependency; unknown datasets are a 404)
+
+    Reuses the version the conditional GET middleware derived the ETag from.
+    """
+    pinned = request.scope.get("state", {}).get("dataset")
+    if pinned is not None:
+        touch_dataset(pinned.namespace, pinned.backend)
+        return pinned
+    storage = get_storage()
+    try:
+        dataset_id = resolve_dataset(dataset, storage)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Dataset '{dataset}' not found")
+    touch_dataset(dataset_id, storage)
+    return dataset_storage(dataset_id, storage)
+
+
+def _load_registry(storage: StorageBackend) -> Dict[str, Dict[str, Any]]:
+    registry = storage.get_json(DATASET_REGISTRY_KEY) or {}
+    # Copy: the memory backend returns the stored object itself
+    cutoff = time.time() - settings.DATASET_TTL
+    return {
+        dataset_id: dict(entry)
+        for dataset_id, entry in registry.items()
+        if entry["updated"] >= cutoff
+    }
+
+
+def _last_access(storage: StorageBackend, dataset_id: str, entry: Dict[str, Any]) -> float:
+    accessed = storage.get(DATASET_ACCESS_PREFIX + dataset_id)
+    return max(entry["last_access"], float(accessed) if accessed else 0.0)
+
+
+def list_datasets(storage: Optional[StorageBackend] = None) -> List[Dict[str, Any]]:
+    """Registered datasets, most recently created first"""
+    storage = storage or get_storage()
+    current = resolve_dataset(None, storage)
+    datasets = []
+    for dataset_id, entry in _load_registry(storage).items():
+        info = {key: value for key, value in entry.items() if key not in ("keys", "version", "retired")}
+        info["id"] = dataset_id
+        info["last_access"] = _last_access(storage, dataset_id, entry)
+        info["current"] = dataset_id == current
+        datasets.append(info)
+    datasets.sort(key=lambda info: info["created"], reverse=True)
+    return datasets
+
+
+def _remove_files(version: Optional[str]):
+    """Delete the on-disk feature store and neighbour table of a dataset version"""
+    if not version:
+        return
+    for path in (feature_store_path(version), neighbor_table_path(version)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _remove_version(storage: StorageBackend, dataset_id: str, version: str, keys: List[str]):
+    stage_dataset(dataset_id, version, storage).delete(*keys)
+    _remove_files(version)
+
+
+def _purge_retired(storage: StorageBackend, registry: Dict[str, Dict[str, Any]]) -> bool:
+    """Delete replaced versions once readers had DATASET_RETIRE_GRACE seconds to finish; True if any was"""
+    cutoff = time.time() - settings.DATASET_RETIRE_GRACE
+    purged = False
+    for dataset_id, entry in registry.items():
+        retired = entry.get("retired", [])
+        for version, keys, replaced, *_ in retired:
+            if replaced < cutoff:
+                _remove_version(storage, dataset_id, version, keys)
+                purged = True
+        entry["retired"] = [item for item in retired if item[2] >= cutoff]
+    return purged
+
+
+def purge_retired_versions(storage: Optional[StorageBackend] = None):
+    """Delete the replaced versions whose grace period has passed"""
+    storage = storage or get_storage()
+    try:
+        with storage.lock(DATASET_REGISTRY_KEY):
+            registry = _load_registry(storage)
+            if _purge_retired(storage, registry):
+                storage.set_json(DATASET_REGISTRY_KEY, settings.DATASET_TTL, registry)
+    except Exception as e:
+        print(f"Error purging retired dataset versions: {str(e)}")
+
+
+def _schedule_purge(storage: StorageBackend):
+    """Purge a version retired now once its grace period has passed, even if nothing is published after it"""
+    timer = threading.Timer(settings.DATASET_RETIRE_GRACE + 1, purge_retired_versions, (storage,))
+    timer.daemon = True
+    timer.start()
+
+
+def _stored_size(entry: Dict[str, Any]) -> int:
+    """Bytes of a dataset's published version plus its retired versions not yet deleted"""
+    return entry["size"] + sum(item[3] for item in entry.get("retired", []) if len(item) > 3)
+
+
+def _remove(storage: StorageBackend, dataset_id: str, entry: Dict[str, Any]):
+    storage.delete(_pointer_key(dataset_id), DATASET_ACCESS_PREFIX + dataset_id)
+    _remove_version(storage, dataset_id, entry["version"], entry.get("keys", []))
+    for version, keys, *_ in entry.get("retired", []):
+        _remove_version(storage, dataset_id, version, keys)
+    _access_written.pop(dataset_id, None)
+    _announce(storage, "removed", dataset_id)
+
+
+def _load_shared_sizes(storage: StorageBackend) -> Dict[str, List[Any]]:
+    now = time.time()
+    return {key: list(item) for key, item in (storage.get_json(SHARED_SIZES_KEY) or {}).items() if item[1] > now}
+
+
+def _save_shared_sizes(storage: StorageBackend, sizes: Dict[str, List[Any]]):
+    ttl = max((item[1] for item in sizes.values()), default=0) - time.time()
+    storage.set_json(SHARED_SIZES_KEY, max(int(ttl) + 1, 1), sizes)
+
+
+def record_shared_size(storage: StorageBackend, key: str, size: int, ttl: int, evictable: bool = True):
+    """
+    Count a key stored outside the datasets against DATASET_MEMORY_BUDGET
+
+    Evictable keys (caches) are deleted before any dataset is evicted.
+    """
+    with storage.lock(SHARED_SIZES_KEY):
+        sizes = _load_shared_sizes(storage)
+        sizes[key] = [size, time.time() + ttl, evictable]
+        _save_shared_sizes(storage, sizes)
+
+
+def _evict_shared(storage: StorageBackend, excess: int) -> int:
+    """Delete evictable shared keys, the oldest first, until excess bytes are freed; returns the bytes freed"""
+    freed = 0
+    with storage.lock(SHARED_SIZES_KEY):
+        sizes = _load_shared_sizes(storage)
+        for key in sorted((key for key in sizes if sizes[key][2]), key=lambda key: sizes[key][1]):
+            if freed >= excess:
+                break
+            storage.delete(key)
+            freed += sizes.pop(key)[0]
+        if freed:
+            _save_shared_sizes(storage, sizes)
+    return freed
+
+
+def _evict(storage: StorageBackend, registry: Dict[str, Dict[str, Any]], keep: str) -> List[str]:
+    """Evict parse cache entries, then least recently used datasets, until the budget holds again"""
+    evicted = []
+    shared = sum(item[0] for item in _load_shared_sizes(storage).values())
+    total = sum(_stored_size(entry) for entry in registry.values()) + shared
+    if total <= settings.DATASET_MEMORY_BUDGET:
+        return evicted
+    if shared:
+        total -= _evict_shared(storage, total - settings.DATASET_MEMORY_BUDGET)
+        if total <= settings.DATASET_MEMORY_BUDGET:
+            return evicted
+    candidates = sorted(
+        (dataset_id for dataset_id in registry if dataset_id != keep),
+        key=lambda dataset_id: _last_access(storage, dataset_id, registry[dataset_id])
+    )
+    for dataset_id in candidates:
+        if total <= settings.DATASET_MEMORY_BUDGET:
+            break
+        entry = registry.pop(dataset_id)
+        total -= _stored_size(entry)
+        _remove(storage, dataset_id, entry)
+        evicted.append(dataset_id)
+    return evicted
+
+
+def _latest(registry: Dict[str, Dict[str, Any]]) -> str:
+    """Most recently created dataset, the fallback for the current one"""
+    return max(registry, key=lambda dataset_id: registry[dataset_id]["created"])
+
+
+def publish_version(storage: StorageBackend, dataset_id: str, version: str, size: int,
+                    keys: List[str], info: Dict[str, Any], make_current: bool = True) -> List[str]:
+    """
+    Publish a version written through stage_dataset() and evict others beyond the memory budget
+
+    The dataset's version pointer is swapped in one transaction with the
+    latest and current dataset pointers, then the event is broadcast. The
+    previous version is retired rather than deleted, so readers still
+    holding it can finish; its size counts against the budget until it is
+    purged. Blocks while another process updates the
+    registry. Returns the IDs of evicted datasets.
+    """
+    now = time.time()
+    with storage.lock(DATASET_REGISTRY_KEY):
+        registry = _load_registry(storage)
+        previous = registry.get(dataset_id)
+        retired = list(previous.get("retired", [])) if previous else []
+        if previous is not None and previous["version"] != version:
+            # [version, keys, time replaced, size]
+            retired.append([previous["version"], previous.get("keys", []), now, previous["size"]])
+        registry[dataset_id] = {
+            **info,
+            "created": previous["created"] if previous else now,
+            "updated": now,
+            "last_access": now,
+            "size": size,
+            "version": version,
+            "keys": keys,
+            "retired": retired
+        }
+        evicted = _evict(storage, registry, dataset_id)
+        _purge_retired(storage, registry)
+        storage.set_json(DATASET_REGISTRY_KEY, settings.DATASET_TTL, registry)
+
+        # The swap: from here on readers resolve the new version
+        pointers = {_pointer_key(dataset_id): version, DATASET_VERSION_KEY: version}
+        current = storage.get(CURRENT_DATASET_KEY)
+        if make_current or current is None or current in evicted:
+            pointers[CURRENT_DATASET_KEY] = dataset_id if make_current else _latest(registry)
+        storage.setex_many(pointers, settings.DATASET_TTL)
+        _announce(storage, "published", dataset_id)
+    if registry[dataset_id]["retired"]:
+        _schedule_purge(storage)
+    return evicted
+
+
+def delete_dataset(dataset_id: str, storage: Optional[StorageBackend] = None) -> bool:
+    """Remove a dataset; False if it is not registered"""
+    storage = storage or get_storage()
+    with storage.lock(DATASET_REGISTRY_KEY):
+        registry = _load_registry(storage)
+        entry = registry.pop(dataset_id, None)
+        if entry is None:
+            return False
+        if storage.get(CURRENT_DATASET_KEY) == dataset_id:
+            if registry:
+                storage.setex(CURRENT_DATASET_KEY, settings.DATASET_TTL, _latest(registry))
+            else:
+                storage.delete(CURRENT_DATASET_KEY)
+        _remove(storage, dataset_id, entry)
+        _purge_retired(storage, registry)
+        storage.set_json(DATASET_REGISTRY_KEY, settings.DATASET_TTL, registry)
+    return True
@@ -0,0 +1,209 @@
+"""
+HTTP caching utilities: dataset-versioned ETags and conditional GET handling
+"""
+import hashlib
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import record_cache
+from app.core.storage import get_storage
+from app.utils.datasets import (
+    DATASET_VERSION_KEY, EMPTY_DATASET_VERSION, DatasetStorage, dataset_storage,
+    on_dataset_published, on_dataset_removed, read_pointer, resolve_dataset
+)
+
+
+def new_dataset_version() -> str:
+    """Create a fresh dataset version identifier"""
+    return uuid.uuid4().hex
+
+
+def get_dataset_version(storage=None) -> str:
+    """
+    Get the version of the data in storage: that of a dataset view, or for
+    the shared storage the version of the latest publish of any dataset
+    """
+    storage = storage or get_storage()
+    if isinstance(storage, DatasetStorage):
+        return storage.version or EMPTY_DATASET_VERSION
+    try:
+        version = read_pointer(storage, DATASET_VERSION_KEY)
+    except Exception as e:
+        print(f"Error reading dataset version: {str(e)}")
+        return EMPTY_DATASET_VERSION
+    return version or EMPTY_DATASET_VERSION
+
+
+def request_dataset(query_string: str) -> Optional[DatasetStorage]:
+    """Dataset named by a request's dataset parameter, or the current one (None if unknown)"""
+    storage = get_storage()
+    dataset = parse_qs(query_string).get("dataset", [None])[0]
+    try:
+        return dataset_storage(resolve_dataset(dataset, storage), storage)
+    except KeyError:
+        return None
+
+
+def request_version(dataset: DatasetStorage) -> str:
+    """
+    Version of the data behind a request: that of its dataset combined with
+    the version of the latest publish of any dataset, which the shared
+    history depends on
+    """
+    return f"{get_dataset_version(dataset)}.{get_dataset_version(dataset.backend)}"
+
+
+def make_etag(version: str, path: str, query_string: str = "") -> str:
+    """Build a weak ETag from the dataset version and request parameters"""
+    # Sort parameters so that ?a=1&b=2 and ?b=2&a=1 share one ETag
+    params = "&".join(sorted(p for p in query_string.split("&") if p))
+    digest = hashlib.sha1(f"{version}|{path}|{params}".encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    LRU cache of finished (possibly compressed) response bodies
+
+    Keys start with the ETag, which is derived from the dataset version, so
+    bodies of replaced versions are never hit again. Every ETag includes the
+    version of the latest publish, so the cache is emptied on each publish.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, bool], Tuple[int, list, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, bool]) -> Optional[Tuple[int, list, bytes]]:
+        # clear() may run on the pub/sub thread and swap the dict meanwhile
+        entries = self._entries
+        entry = entries.get(key)
+        if entry is None:
+            self.misses += 1
+            record_cache("response", False)
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        record_cache("response", True)
+        return entry
+
+    def put(self, key: Tuple[str, bool], entry: Tuple[int, list, bytes]):
+        entries = self._entries
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def clear(self, *_):
+        self._entries = OrderedDict()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
+on_dataset_published(response_cache.clear)
+on_dataset_removed(response_cache.clear)
+
+
+class ConditionalGetMiddleware:
+    """
+    Answer GETs on dataset-backed routes with ETags derived from the dataset version.
+
+    Matching If-None-Match requests get a 304 before the route runs, and finished
+    bodies (already gzip-compressed when placed outside GZipMiddleware) are cached
+    per version so repeat requests skip recomputation and recompression.
+    """
+
+    def __init__(self, app: ASGIApp, path_prefixes: Tuple[str, ...] = ("/api/errors", "/api/ml"),
+                 cache: ResponseCache = response_cache):
+        self.app = app
+        self.path_prefixes = path_prefixes
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (scope["type"] != "http" or scope["method"] not in ("GET", "HEAD")
+                or not scope["path"].startswith(self.path_prefixes)):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        query_string = scope.get("query_string", b"").decode("latin-1")
+        dataset = request_dataset(query_string)
+        if dataset is None:
+            # Unknown dataset: the route answers 404
+            await self.app(scope, receive, send)
+            return
+        # The route reads the same version the ETag is derived from
+        scope.setdefault("state", {})["dataset"] = dataset
+        etag = make_etag(request_version(dataset), scope["path"], query_string)
+
+        if etag_matches(headers.get("if-none-match"), etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", etag.encode("latin-1")), (b"vary", b"Accept-Encoding")],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        cache_key = (etag, "gzip" in headers.get("accept-encoding", ""))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            status, raw_headers, body = cached
+            await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start_message: Message = {}
+        body_parts = []
+        cacheable = True
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal start_message, cacheable
+            if message["type"] == "http.response.start":
+                if message["status"] == 200:
+                    response_headers = MutableHeaders(raw=message["headers"])
+                    response_headers["ETag"] = etag
+                    response_headers["Cache-Control"] = "no-cache"
+                else:
+                    cacheable = False
+                start_message = message
+            elif message["type"] == "http.response.body":
+                more_body = message.get("more_body", False)
+                if more_body:
+                    # Streaming responses are passed through but never cached
+                    cacheable = False
+                if cacheable:
+                    body_parts.append(message.get("body", b""))
+                    if not more_body:
+                        self.cache.put(cache_key, (
+                            start_message["status"], list(start_message["headers"]), b"".join(body_parts)
+                        ))
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,188 @@
+"""
+Token-level inverted index over error content
+
+Each token maps to the sorted list of error IDs containing it. Posting
+lists are stored delta-encoded as unsigned varints, so long lists of
+close-together IDs cost about one byte per entry. Searches intersect or
+unite posting lists, costing roughly the size of the lists involved
+instead of a scan over every error. Lists are decoded with vectorized
+NumPy operations and the decoded arrays of the index of each dataset
+version are kept (up to SEARCH_POSTINGS_CACHE_IDS IDs, least recently
+used dropped first), so frequent tokens are decoded once, not per search.
+"""
+import base64
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.dataset_cache import get_versioned
+
+# Redis key holding the serialized content index
+CONTENT_INDEX_KEY = "content_index"
+
+TOKEN_PATTERN = re.compile(r'\w+')
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+EMPTY_POSTINGS = np.array([], dtype=np.int64)
+
+
+def tokenize_text(text: str) -> List[str]:
+    """Lowercase word tokens of a text"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def encode_postings(ids: Iterable[int]) -> bytes:
+    """Delta-encode a sorted ID list as unsigned varints"""
+    out = bytearray()
+    previous = 0
+    for doc_id in ids:
+        delta = doc_id - previous
+        previous = doc_id
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data: bytes) -> np.ndarray:
+    """Decode a varint delta posting list into a sorted ID array"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    # The last byte of every varint has the continuation bit clear
+    ends = np.flatnonzero(buffer < 0x80)
+    if len(ends) == len(buffer):
+        # Every delta fits in one byte
+        return np.cumsum(buffer, dtype=np.int64)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # Shift of each byte: 7 times its position within its varint
+    positions = np.arange(len(buffer), dtype=np.int64) - np.repeat(starts, ends - starts + 1)
+    values = (buffer & 0x7F).astype(np.int64) << (7 * positions)
+    return np.cumsum(np.add.reduceat(values, starts))
+
+
+def intersect_postings(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Intersect two sorted ID arrays by probing the shorter into the longer"""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return EMPTY_POSTINGS
+    positions = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[positions] == a]
+
+
+class InvertedIndexBuilder:
+    """Collects postings while errors are ingested (IDs must arrive in increasing order)"""
+
+    def __init__(self):
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+    def add(self, doc_id: int, text: str):
+        for token in set(tokenize_text(text)):
+            self._postings[token].append(doc_id)
+
+    def build(self) -> "InvertedIndex":
+        return InvertedIndex({token: encode_postings(ids) for token, ids in self._postings.items()})
+
+
+class InvertedIndex:
+    """Compressed token -> posting list index with AND/OR/phrase search"""
+
+    def __init__(self, postings: Dict[str, bytes]):
+        self._postings = postings
+        # token -> decoded IDs, least recently used first
+        self._decoded: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._decoded_ids = 0
+        self._decoded_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def postings(self, token: str) -> np.ndarray:
+        """Sorted IDs of the errors containing a token (treat as read-only)"""
+        with self._decoded_lock:
+            ids = self._decoded.get(token)
+            if ids is not None:
+                self._decoded.move_to_end(token)
+                return ids
+        data = self._postings.get(token)
+        if not data:
+            return EMPTY_POSTINGS
+        ids = decode_postings(data)
+        ids.flags.writeable = False
+        with self._decoded_lock:
+            if token not in self._decoded and len(ids) <= settings.SEARCH_POSTINGS_CACHE_IDS:
+                self._decoded[token] = ids
+                self._decoded_ids += len(ids)
+                while self._decoded_ids > settings.SEARCH_POSTINGS_CACHE_IDS:
+                    _, evicted = self._decoded.popitem(last=False)
+                    self._decoded_ids -= len(evicted)
+        return ids
+
+    def match_all(self, tokens: Iterable[str]) -> np.ndarray:
+        """IDs containing every token (shortest lists intersected first)"""
+        lists = sorted((self.postings(token) for token in set(tokens)), key=len)
+        if not lists:
+            return EMPTY_POSTINGS
+        result = lists[0]
+        for postings in lists[1:]:
+            if len(result) == 0:
+                break
+            result = intersect_postings(result, postings)
+        return result
+
+    def search(self, query: str, phrase_check: Optional[Callable[[np.ndarray, str], np.ndarray]] = None) -> np.ndarray:
+        """
+        Search the index
+
+        Terms are combined with AND, clauses separated by OR are united, and
+        "quoted phrases" require their tokens in order - candidates from the
+        token intersection are confirmed with phrase_check(ids, phrase) when given.
+        """
+        clauses: List[List[tuple]] = [[]]
+        for match in QUERY_PATTERN.finditer(query):
+            phrase, word = match.groups()
+            if word == 'OR':
+                clauses.append([])
+            elif word == 'AND':
+                continue
+            elif phrase is not None:
+                clauses[-1].append(('phrase', phrase))
+            else:
+                clauses[-1].append(('word', word))
+
+        result = EMPTY_POSTINGS
+        for clause in clauses:
+            if not clause:
+                continue
+            tokens = [token for _, text in clause for token in tokenize_text(text)]
+            if not tokens:
+                continue
+            matches = self.match_all(tokens)
+            if phrase_check is not None:
+                for kind, text in clause:
+                    if kind == 'phrase' and len(matches):
+                        matches = phrase_check(matches, text)
+            result = np.union1d(result, matches)
+        return result
+
+    def to_json(self) -> Dict[str, str]:
+        return {token: base64.b64encode(data).decode('ascii') for token, data in self._postings.items()}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, str]) -> "InvertedIndex":
+        return cls({token: base64.b64decode(encoded) for token, encoded in data.items()})
+
+
+def _load_content_index(storage, version: str) -> InvertedIndex:
+    return InvertedIndex.from_json(storage.get_json(CONTENT_INDEX_KEY) or {})
+
+
+def get_content_index(storage=None) -> InvertedIndex:
+    """Get the content index of the current dataset (decoded once per version)"""
+    return get_versioned("content_index", _load_content_index, storage)
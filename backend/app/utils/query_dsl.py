@@ -0,0 +1,278 @@
+"""
+Small query language over the stored error columns
+
+Example:
+    severity:Critical AND user:GAM AND time:[26.06.2025 10:00 TO 26.06.2025 12:00] AND content:"ACCESS"
+
+Supported syntax:
+    field:value           exact match (case-insensitive), * and ? wildcards
+    field:"two words"     quoted value
+    field:[low TO high]   inclusive range for time, code and id (* = open bound)
+    word / "phrase"       substring search in content
+    AND, OR, NOT, ( )     boolean logic; adjacent terms are combined with AND
+
+Queries are parsed once and compiled into a plan that evaluates to a NumPy
+boolean mask over ErrorColumns. Compiled plans are cached per query string.
+"""
+import fnmatch
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_collector
+from app.utils.dataset_cache import MISSING_TIME, ErrorColumns
+
+# Query field -> column name
+FIELD_ALIASES = {
+    'severity': 'severity',
+    'user': 'user',
+    'type': 'type',
+    'file': 'filename',
+    'filename': 'filename',
+    'fingerprint': 'fingerprint',
+    'stack': 'stack_fingerprint',
+    'code': 'code',
+    'id': 'id',
+    'time': 'time',
+    'content': 'content',
+}
+
+TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<lparen>\() |
+        (?P<rparen>\)) |
+        (?P<range>\[\s*(?P<low>[^\]]*?)\s+TO\s+(?P<high>[^\]]*?)\s*\]) |
+        (?P<quoted>"(?:[^"\\]|\\.)*") |
+        (?P<word>[^\s()"\[\]]+)
+    )''', re.VERBOSE)
+
+# Accepted timestamp formats and the span a value without a range covers
+TIME_FORMATS = [
+    ('%d.%m.%Y %H:%M:%S', timedelta(seconds=1)),
+    ('%d.%m.%Y %H:%M', timedelta(minutes=1)),
+    ('%d.%m.%Y', timedelta(days=1)),
+    ('%Y-%m-%dT%H:%M:%S', timedelta(seconds=1)),
+    ('%Y-%m-%d %H:%M:%S', timedelta(seconds=1)),
+    ('%Y-%m-%d', timedelta(days=1)),
+]
+
+Plan = Callable[[ErrorColumns], np.ndarray]
+
+
+class QueryError(ValueError):
+    """Invalid query syntax or value"""
+
+
+def tokenize(query: str) -> List[Tuple[str, str]]:
+    """Split a query into (kind, value) tokens"""
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if not match or match.end() == position:
+            raise QueryError(f"Unexpected character at position {position}: '{query[position]}'")
+        position = match.end()
+        kind = match.lastgroup if match.lastgroup not in ('low', 'high') else 'range'
+        if kind == 'range':
+            tokens.append(('range', (match.group('low').strip(), match.group('high').strip())))
+        elif kind == 'quoted':
+            tokens.append(('quoted', re.sub(r'\\(.)', r'\1', match.group('quoted')[1:-1])))
+        elif kind == 'word' and match.group('word') in ('AND', 'OR', 'NOT'):
+            tokens.append(('op', match.group('word')))
+        else:
+            tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser producing a nested tuple AST"""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise QueryError("Unexpected end of query")
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("Empty query")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError(f"Unexpected token '{self.peek()[1]}'")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ('op', 'OR'):
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while True:
+            token = self.peek()
+            if token == ('op', 'AND'):
+                self.take()
+            elif token is None or token == ('op', 'OR') or token[0] == 'rparen':
+                return node
+            node = ('and', node, self.parse_not())
+
+    def parse_not(self):
+        if self.peek() == ('op', 'NOT'):
+            self.take()
+            return ('not', self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, value = self.take()
+        if kind == 'lparen':
+            node = self.parse_or()
+            if self.take()[0] != 'rparen':
+                raise QueryError("Missing closing parenthesis")
+            return node
+        if kind == 'quoted':
+            return ('term', 'content', value)
+        if kind == 'word':
+            field, separator, rest = value.partition(':')
+            if separator and field.lower() in FIELD_ALIASES:
+                column = FIELD_ALIASES[field.lower()]
+                if rest:
+                    return ('term', column, rest)
+                value_kind, field_value = self.take()
+                if value_kind == 'range':
+                    return ('range', column, field_value[0], field_value[1])
+                if value_kind in ('quoted', 'word'):
+                    return ('term', column, field_value)
+                raise QueryError(f"Missing value for field '{field}'")
+            return ('term', 'content', value)
+        raise QueryError(f"Unexpected token '{value}'")
+
+
+def _parse_time(value: str) -> Tuple[int, int]:
+    """Parse a timestamp into the [start, end) epoch seconds it covers"""
+    for time_format, span in TIME_FORMATS:
+        try:
+            start = datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+        epoch = datetime(1970, 1, 1)
+        return int((start - epoch).total_seconds()), int((start + span - epoch).total_seconds())
+    raise QueryError(f"Invalid time value '{value}'")
+
+
+def _parse_int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise QueryError(f"Invalid number '{value}'")
+
+
+def _compile_node(node) -> Plan:
+    kind = node[0]
+
+    if kind == 'and':
+        left, right = _compile_node(node[1]), _compile_node(node[2])
+        return lambda columns: left(columns) & right(columns)
+
+    if kind == 'or':
+        left, right = _compile_node(node[1]), _compile_node(node[2])
+        return lambda columns: left(columns) | right(columns)
+
+    if kind == 'not':
+        inner = _compile_node(node[1])
+        return lambda columns: ~inner(columns)
+
+    if kind == 'range':
+        _, column, low, high = node
+        if column == 'time':
+            low_bound = _parse_time(low)[0] if low != '*' else None
+            high_bound = _parse_time(high)[1] if high != '*' else None
+
+            def time_range(columns: ErrorColumns) -> np.ndarray:
+                mask = columns.times != MISSING_TIME
+                if low_bound is not None:
+                    mask &= columns.times >= low_bound
+                if high_bound is not None:
+                    mask &= columns.times < high_bound
+                return mask
+            return time_range
+
+        if column in ('code', 'id'):
+            low_bound = _parse_int(low) if low != '*' else None
+            high_bound = _parse_int(high) if high != '*' else None
+
+            def number_range(columns: ErrorColumns) -> np.ndarray:
+                values = columns.codes if column == 'code' else columns.ids
+                mask = np.ones(columns.size, dtype=bool)
+                if low_bound is not None:
+                    mask &= values >= low_bound
+                if high_bound is not None:
+                    mask &= values <= high_bound
+                return mask
+            return number_range
+
+        raise QueryError(f"Field '{column}' does not support ranges")
+
+    # Single term
+    _, column, value = node
+
+    if column == 'time':
+        start, end = _parse_time(value)
+        return lambda columns: (columns.times >= start) & (columns.times < end)
+
+    if column in ('code', 'id'):
+        number = _parse_int(value)
+        return lambda columns: (columns.codes if column == 'code' else columns.ids) == number
+
+    if column == 'content':
+        needle = value.lower()
+        return lambda columns: columns.content_lower.str.contains(needle, regex=False).to_numpy(dtype=bool)
+
+    # Categorical field: match against the (small) table of unique values,
+    # then select rows by integer code
+    wildcard = any(c in value for c in '*?')
+    pattern = value.lower()
+
+    def categorical(columns: ErrorColumns) -> np.ndarray:
+        uniques = columns.categories[column]
+        if wildcard:
+            matches = [i for i, u in enumerate(uniques) if fnmatch.fnmatchcase(str(u).lower(), pattern)]
+        else:
+            matches = [i for i, u in enumerate(uniques) if str(u).lower() == pattern]
+        return np.isin(columns.category_codes[column], matches)
+    return categorical
+
+
+@lru_cache(maxsize=settings.QUERY_PLAN_CACHE_SIZE)
+def compile_query(query: str) -> Plan:
+    """Parse and compile a query string into a mask-producing plan (cached per string)"""
+    return _compile_node(_Parser(tokenize(query)).parse())
+
+
+def _plan_cache_metrics() -> List[str]:
+    info = compile_query.cache_info()
+    return [
+        "# TYPE errlog_query_plan_cache_hits_total counter",
+        f"errlog_query_plan_cache_hits_total {info.hits}",
+        "# TYPE errlog_query_plan_cache_misses_total counter",
+        f"errlog_query_plan_cache_misses_total {info.misses}",
+        "# TYPE errlog_query_plan_cache_entries gauge",
+        f"errlog_query_plan_cache_entries {info.currsize}",
+    ]
+
+
+register_collector(_plan_cache_metrics)
@@ -0,0 +1,240 @@
+"""
+Uploaded log files kept on disk for on-demand retrieval of complete entries
+
+Parsed errors keep only a short content preview. Each error also records
+the file ID plus byte offset and length of its entry in the original file,
+so the full entry can be sliced out of a memory-mapped file when it is
+actually requested. Files are content-addressed, so uploading the same file
+twice stores it once. Files ingested from a watched directory are linked
+rather than copied, since they keep growing in place. They are read with
+pread() instead of being mapped: a mapped file that is truncated (e.g. by
+copytruncate rotation) raises SIGBUS on access and kills the process. The encoding a file
+was parsed with is kept next to it (file ID + ".encoding") so entries are
+decoded the same way, whatever their own bytes would suggest.
+"""
+import hashlib
+import mmap
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+_FILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_WHITESPACE = frozenset(b" \t\n\r\x0b\x0c")
+
+# file ID -> memory map of the open file, least recently used first
+_maps: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+_maps_lock = threading.Lock()
+
+
+def raw_log_dir() -> str:
+    return os.path.join(settings.UPLOAD_DIR, "raw")
+
+
+def raw_log_path(file_id: str) -> str:
+    return os.path.join(raw_log_dir(), f"{file_id}.log")
+
+
+def _encoding_path(file_id: str) -> str:
+    return os.path.join(raw_log_dir(), f"{file_id}.encoding")
+
+
+def raw_log_encoding(file_id: str) -> Optional[str]:
+    """Encoding a kept file was parsed with (None if not recorded, e.g. while it was all ASCII)"""
+    if not _FILE_ID.match(file_id or ""):
+        return None
+    try:
+        with open(_encoding_path(file_id), encoding="ascii") as handle:
+            return handle.read().strip() or None
+    except OSError:
+        return None
+
+
+def _record_encoding(file_id: str, encoding: Optional[str]):
+    """Keep a file's encoding next to it; an unknown one leaves the recorded encoding as it is"""
+    if encoding is None or raw_log_encoding(file_id) == encoding:
+        return
+    path = _encoding_path(file_id)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="ascii") as handle:
+        handle.write(encoding)
+    os.replace(temp_path, path)
+
+
+def entry_spans(data: bytes, delimiter: bytes) -> List[Tuple[int, int]]:
+    """
+    (offset, length) of every delimiter-separated block, surrounding whitespace excluded
+
+    Block i corresponds to element i of content.split(delimiter) on the
+    decoded text, including the header block 0.
+    """
+    spans = []
+    start = 0
+    while True:
+        end = data.find(delimiter, start)
+        stop = end if end >= 0 else len(data)
+        first, last = start, stop
+        while first < last and data[first] in _WHITESPACE:
+            first += 1
+        while last > first and data[last - 1] in _WHITESPACE:
+            last -= 1
+        spans.append((first, last - first))
+        if end < 0:
+            return spans
+        start = end + len(delimiter)
+
+
+def save_raw_log(data: bytes, encoding: Optional[str] = None) -> str:
+    """Keep an uploaded file parsed with the given encoding and return its file ID"""
+    file_id = hashlib.sha256(data).hexdigest()[:32]
+    path = raw_log_path(file_id)
+    os.makedirs(raw_log_dir(), exist_ok=True)
+    if os.path.exists(path):
+        # Refresh the retention clock of a re-uploaded file
+        os.utime(path)
+    else:
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(data)
+        os.replace(temp_path, path)
+    _record_encoding(file_id, encoding)
+    prune_raw_logs()
+    return file_id
+
+
+def adopt_raw_log(path: str, content_hash: str, encoding: Optional[str] = None) -> str:
+    """Keep a file already written to disk (moved, not copied) given its SHA-256 and return its file ID"""
+    file_id = content_hash[:32]
+    target = raw_log_path(file_id)
+    os.makedirs(raw_log_dir(), exist_ok=True)
+    if os.path.exists(target):
+        os.utime(target)
+        os.remove(path)
+    else:
+        os.replace(path, target)
+    _record_encoding(file_id, encoding)
+    prune_raw_logs()
+    return file_id
+
+
+def watched_file_id(path: str, inode: int, generation: int = 0) -> str:
+    """
+    File ID of one incarnation of a watched file: its path, inode and the
+    number of rotations seen for the path, so entries of a file that was
+    replaced or truncated never resolve into its successor
+    """
+    identity = f"watch:{os.path.abspath(path)}:{inode}:{generation}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+
+
+def register_watched_file(path: str, inode: int, generation: int = 0, encoding: Optional[str] = None) -> str:
+    """File ID of a watched log file, linked into the raw log directory"""
+    path = os.path.abspath(path)
+    file_id = watched_file_id(path, inode, generation)
+    link_path = raw_log_path(file_id)
+    if not os.path.islink(link_path):
+        os.makedirs(raw_log_dir(), exist_ok=True)
+        os.symlink(path, link_path)
+    _record_encoding(file_id, encoding)
+    return file_id
+
+
+def forget_watched_file(file_id: str):
+    """Unlink a watched file that was rotated away; its entries are no longer available"""
+    _remove(raw_log_path(file_id))
+    _remove(_encoding_path(file_id))
+
+
+def prune_raw_logs(max_age: Optional[int] = None):
+    """Delete kept files older than the retention period"""
+    max_age = settings.RAW_LOG_RETENTION_SECONDS if max_age is None else max_age
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(raw_log_dir()))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.endswith(".encoding"):
+            if not os.path.lexists(raw_log_path(entry.name[:-9])):
+                _remove(entry.path)
+            continue
+        try:
+            # Links to watched files follow the age of the file itself
+            if entry.name.endswith(".log") and entry.stat().st_mtime < cutoff:
+                _close_map(entry.name[:-4])
+                os.remove(entry.path)
+        except OSError:
+            if entry.is_symlink() and not os.path.exists(entry.path):
+                # The watched file is gone
+                os.remove(entry.path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _close_map(file_id: str):
+    with _maps_lock:
+        mapped = _maps.pop(file_id, None)
+    if mapped is not None:
+        mapped.close()
+
+
+def _open_map(file_id: str) -> Optional[mmap.mmap]:
+    """Memory map of a kept, content-addressed file; callers hold _maps_lock"""
+    mapped = _maps.get(file_id)
+    if mapped is not None:
+        _maps.move_to_end(file_id)
+        return mapped
+
+    try:
+        with open(raw_log_path(file_id), "rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Missing file, or an empty one which cannot be mapped
+        return None
+
+    _maps[file_id] = mapped
+    while len(_maps) > settings.RAW_LOG_OPEN_FILES:
+        _, evicted = _maps.popitem(last=False)
+        evicted.close()
+    return mapped
+
+
+def _read_watched(path: str, offset: int, length: int) -> Optional[bytes]:
+    """Read one entry of a watched file (None if the file is gone or now shorter)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        data = os.pread(fd, length, offset)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    return data if len(data) == length else None
+
+
+def read_raw_entry(file_id: str, offset: int, length: int) -> Optional[bytes]:
+    """Slice one entry out of a kept file (None if the file is gone)"""
+    if not _FILE_ID.match(file_id or "") or offset < 0 or length < 0:
+        return None
+    path = raw_log_path(file_id)
+    if os.path.islink(path):
+        # Watched files change in place; only uploaded files, which never do, are mapped
+        return _read_watched(path, offset, length)
+    # Slice under the lock so eviction cannot close the map mid-read
+    with _maps_lock:
+        mapped = _open_map(file_id)
+        if mapped is None or offset + length > len(mapped):
+            return None
+        return mapped[offset:offset + length]
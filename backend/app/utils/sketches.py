@@ -0,0 +1,359 @@
+"""
+Mergeable probabilistic sketches for approximate statistics over unbounded ingest
+
+HyperLogLog estimates distinct counts and Count-Min with a top-k candidate
+set tracks heavy hitters, each in fixed memory regardless of the number of
+rows. Sketches of the same shape merge losslessly (register max / counter
+sum), so per-hour buckets can be rolled up into days or ranges and sketches
+built by different workers can be combined.
+
+Error bounds:
+    HyperLogLog with m = 2^precision registers has a relative standard error
+    of about 1.04 / sqrt(m) (1.6% for precision 12).
+    Count-Min with width w and depth d never underestimates; an estimate
+    exceeds the true count by more than (e / w) * N with probability at most
+    e^-d, where N is the total count added to the sketch.
+"""
+import base64
+import hashlib
+import math
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.parsers.timeline import timestamp_epoch
+
+# Redis key of the serialized sketch history
+SKETCH_HISTORY_KEY = "sketch_history"
+
+HOUR_SECONDS = 3600
+DAY_SECONDS = 24 * HOUR_SECONDS
+
+
+def _hash64(value: str) -> int:
+    """Stable 64-bit hash of a string (the same across processes and workers)"""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _encode_array(array: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(array.tobytes())).decode('ascii')
+
+
+def _decode_array(data: str, dtype, shape) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=dtype).reshape(shape).copy()
+
+
+class HyperLogLog:
+    """Distinct-count estimator with 2^precision one-byte registers"""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, value: str):
+        hashed = _hash64(value)
+        index = hashed & (self.m - 1)
+        remaining = hashed >> self.precision
+        bits = 64 - self.precision
+        # Rank = position of the lowest set bit among the remaining bits
+        rank = (remaining & -remaining).bit_length() if remaining else bits + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'p': self.precision, 'r': _encode_array(self.registers)}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(data['p'])
+        sketch.registers = _decode_array(data['r'], np.uint8, (sketch.m,))
+        return sketch
+
+
+class CountMinSketch:
+    """Frequency estimator that never underestimates"""
+
+    def __init__(self, width: int = 1024, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self._rows = np.arange(depth)
+
+    def _columns(self, value: str) -> np.ndarray:
+        # Double hashing: d indexes from the two halves of one 64-bit hash
+        hashed = _hash64(value)
+        h1, h2 = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return (h1 + self._rows * h2) % self.width
+
+    def add(self, value: str, count: int = 1):
+        self.table[self._rows, self._columns(value)] += count
+        self.total += count
+
+    def estimate(self, value: str) -> int:
+        return int(self.table[self._rows, self._columns(value)].min())
+
+    def merge(self, other: "CountMinSketch"):
+        if other.table.shape != self.table.shape:
+            raise ValueError("Cannot merge Count-Min sketches of different shape")
+        self.table += other.table
+        self.total += other.total
+
+    def error_bound(self) -> Tuple[float, float]:
+        """(maximum overcount, probability that it is exceeded)"""
+        return math.e / self.width * self.total, math.exp(-self.depth)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'w': self.width, 'd': self.depth, 'n': self.total, 't': _encode_array(self.table)}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "CountMinSketch":
+        sketch = cls(data['w'], data['d'])
+        sketch.table = _decode_array(data['t'], np.int64, (sketch.depth, sketch.width))
+        sketch.total = data['n']
+        return sketch
+
+
+class HeavyHitters:
+    """Count-Min sketch plus the k values with the highest estimated counts"""
+
+    def __init__(self, k: int = 20, width: int = 1024, depth: int = 4):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self.candidates: Dict[str, int] = {}
+        self._floor = 0  # Smallest candidate estimate once the set is full
+
+    def add(self, value: str, count: int = 1):
+        self.sketch.add(value, count)
+        estimate = self.sketch.estimate(value)
+        if value in self.candidates:
+            self.candidates[value] = estimate
+        elif len(self.candidates) < self.k:
+            self.candidates[value] = estimate
+        elif estimate > self._floor:
+            smallest = min(self.candidates, key=self.candidates.get)
+            if estimate > self.candidates[smallest]:
+                del self.candidates[smallest]
+                self.candidates[value] = estimate
+        if len(self.candidates) >= self.k:
+            self._floor = min(self.candidates.values())
+
+    def merge(self, other: "HeavyHitters"):
+        self.sketch.merge(other.sketch)
+        merged = {value: self.sketch.estimate(value) for value in set(self.candidates) | set(other.candidates)}
+        self.candidates = dict(sorted(merged.items(), key=lambda item: item[1], reverse=True)[:self.k])
+        self._floor = min(self.candidates.values()) if len(self.candidates) >= self.k else 0
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        ranked = sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n] if n else ranked
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'k': self.k, 'cms': self.sketch.to_json(), 'c': self.candidates}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "HeavyHitters":
+        sketch = cls(data['k'])
+        sketch.sketch = CountMinSketch.from_json(data['cms'])
+        sketch.candidates = dict(data['c'])
+        sketch._floor = min(sketch.candidates.values()) if len(sketch.candidates) >= sketch.k else 0
+        return sketch
+
+
+class BucketSketch:
+    """Sketches of all errors within one time bucket"""
+
+    def __init__(self, precision: int = 12, top_k: int = 20, width: int = 1024, depth: int = 4):
+        self.errors = 0
+        self.users = HyperLogLog(precision)
+        self.fingerprints = HyperLogLog(precision)
+        self.types = HeavyHitters(top_k, width, depth)
+
+    def add(self, error: Dict[str, Any]):
+        self.errors += 1
+        self.users.add(str(error.get('user', '')))
+        if error.get('fingerprint'):
+            self.fingerprints.add(error['fingerprint'])
+        self.types.add(str(error.get('type', '')))
+
+    def merge(self, other: "BucketSketch"):
+        self.errors += other.errors
+        self.users.merge(other.users)
+        self.fingerprints.merge(other.fingerprints)
+        self.types.merge(other.types)
+
+    def summary(self, top: int = 5) -> Dict[str, Any]:
+        overcount, probability = self.types.sketch.error_bound()
+        return {
+            'errors': self.errors,
+            'distinct_users': self.users.count(),
+            'distinct_fingerprints': self.fingerprints.count(),
+            'top_types': [{'type': value, 'count': count} for value, count in self.types.top(top)],
+            'error_bounds': {
+                'distinct_relative_error': round(self.users.relative_error(), 4),
+                'type_count_max_overcount': round(overcount, 2),
+                'type_count_bound_failure_probability': round(probability, 4)
+            }
+        }
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'n': self.errors,
+            'u': self.users.to_json(),
+            'f': self.fingerprints.to_json(),
+            't': self.types.to_json()
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "BucketSketch":
+        bucket = cls.__new__(cls)
+        bucket.errors = data['n']
+        bucket.users = HyperLogLog.from_json(data['u'])
+        bucket.fingerprints = HyperLogLog.from_json(data['f'])
+        bucket.types = HeavyHitters.from_json(data['t'])
+        return bucket
+
+
+class SketchHistory:
+    """Hourly bucket sketches that can be merged into days or arbitrary ranges"""
+
+    def __init__(self, precision: int = 12, top_k: int = 20, width: int = 1024, depth: int = 4, max_buckets: int = 2160):
+        self.shape = (precision, top_k, width, depth)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, BucketSketch] = {}
+        # Content hashes of the files already added, with the time they were
+        self.sources: Dict[str, float] = {}
+
+    def _new_bucket(self) -> BucketSketch:
+        return BucketSketch(*self.shape)
+
+    def add(self, error: Dict[str, Any]):
+        epoch = timestamp_epoch(error.get('timestamp', ''))
+        if epoch is None:
+            return
+        hour = epoch - epoch % HOUR_SECONDS
+        bucket = self.buckets.get(hour)
+        if bucket is None:
+            bucket = self.buckets[hour] = self._new_bucket()
+        bucket.add(error)
+
+    def add_all(self, errors: Iterable[Dict[str, Any]]):
+        for error in errors:
+            self.add(error)
+
+    def add_source(self, source: str, errors: List[Dict[str, Any]], base: Optional[str] = None, base_size: int = 0) -> int:
+        """
+        Add the errors of a file with content hash source unless it was added before
+
+        A file that extends an added file (content hash base, base_size bytes
+        long) only adds its errors past base_size. Returns the number of
+        errors added.
+        """
+        if source in self.sources:
+            return 0
+        if base is not None and base in self.sources:
+            errors = [error for error in errors if error.get('offset', base_size) >= base_size]
+        self.add_all(errors)
+        self.sources[source] = time.time()
+        return len(errors)
+
+    def merge(self, other: "SketchHistory"):
+        for hour, bucket in other.buckets.items():
+            if hour in self.buckets:
+                self.buckets[hour].merge(bucket)
+            else:
+                self.buckets[hour] = bucket
+        for source, added in other.sources.items():
+            self.sources[source] = max(added, self.sources.get(source, 0))
+        self.trim()
+
+    def trim(self):
+        """Drop the oldest hourly buckets beyond max_buckets, and sources added longer ago"""
+        if len(self.buckets) > self.max_buckets:
+            for hour in sorted(self.buckets)[:len(self.buckets) - self.max_buckets]:
+                del self.buckets[hour]
+        cutoff = time.time() - self.max_buckets * HOUR_SECONDS
+        self.sources = {source: added for source, added in self.sources.items() if added >= cutoff}
+
+    def rollup(self, granularity: int = HOUR_SECONDS, start: Optional[int] = None, end: Optional[int] = None) -> Dict[int, BucketSketch]:
+        """Merge hourly buckets into buckets of the given length (in seconds) within [start, end)"""
+        rolled: Dict[int, BucketSketch] = {}
+        for hour in sorted(self.buckets):
+            if (start is not None and hour < start) or (end is not None and hour >= end):
+                continue
+            key = hour - hour % granularity
+            if key not in rolled:
+                rolled[key] = self._new_bucket()
+            rolled[key].merge(self.buckets[hour])
+        return rolled
+
+    def total(self, start: Optional[int] = None, end: Optional[int] = None) -> BucketSketch:
+        """One sketch covering every hourly bucket within [start, end)"""
+        total = self._new_bucket()
+        for hour, bucket in self.buckets.items():
+            if (start is None or hour >= start) and (end is None or hour < end):
+                total.merge(bucket)
+        return total
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'shape': list(self.shape),
+            'buckets': {str(hour): bucket.to_json() for hour, bucket in self.buckets.items()},
+            'sources': self.sources
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any], max_buckets: int = 2160) -> "SketchHistory":
+        history = cls(*data['shape'], max_buckets=max_buckets)
+        history.buckets = {int(hour): BucketSketch.from_json(bucket) for hour, bucket in data['buckets'].items()}
+        history.sources = dict(data.get('sources', {}))
+        return history
+
+
+def new_sketch_history() -> SketchHistory:
+    """Empty sketch history shaped by the application settings"""
+    return SketchHistory(
+        precision=settings.SKETCH_HLL_PRECISION,
+        top_k=settings.SKETCH_TOP_K,
+        width=settings.SKETCH_CMS_WIDTH,
+        depth=settings.SKETCH_CMS_DEPTH,
+        max_buckets=settings.SKETCH_HISTORY_MAX_HOURS
+    )
+
+
+def load_sketch_history(storage) -> SketchHistory:
+    """Load the stored sketch history (an empty one if missing or shaped differently)"""
+    history = new_sketch_history()
+    history_data = storage.get_json(SKETCH_HISTORY_KEY)
+    if history_data:
+        stored = SketchHistory.from_json(history_data, history.max_buckets)
+        if stored.shape == history.shape:
+            return stored
+    return history
+
+
+def save_sketch_history(storage, history: SketchHistory) -> int:
+    """Store the sketch history; returns the stored size in bytes"""
+    return storage.set_json(SKETCH_HISTORY_KEY, settings.SKETCH_HISTORY_TTL, history.to_json())
@@ -0,0 +1,330 @@
+"""
+Server-side ingestion of log files written continuously to a watched directory
+
+A background task polls settings.TAIL_WATCH_DIR for files matching
+TAIL_FILE_PATTERNS and parses only the bytes appended since the last poll.
+Per file a checkpoint keeps:
+
+    inode    identity of the file; a new inode (rotation) starts over
+    generation
+             rotations and truncations seen for the path; with the inode
+             part of the file ID of its entries
+    size     bytes seen at the last poll
+    offset   start of the last, possibly still growing entry; everything
+             before it has been ingested
+    emitted  whether that last entry was ingested anyway because the file
+             went idle (it is then skipped once the entry is complete)
+    encoding encoding of the file, None while everything read was ASCII
+
+An entry only counts as complete once the next delimiter follows it, or
+when the file has not changed for TAIL_SETTLE_SECONDS. New errors are
+appended to the dataset "watch" (TAIL_DATASET_ID) and the checkpoints are
+stored with it, so a restart continues where the stored dataset ends:
+nothing is read twice and nothing is lost. When the dataset expires or is
+evicted the checkpoints go with it and the watched files are ingested again
+from the start. The watch dataset only becomes current while no uploaded
+dataset exists.
+
+Publishing a version rewrites the whole dataset, so new errors are
+collected over polls and published together once TAIL_PUBLISH_INTERVAL
+has passed or TAIL_PUBLISH_BATCH are pending. Between publishes the
+ingestor keeps the published errors, frame table, anomaly detector and
+feature store in memory and only reloads them when the stored version is
+no longer the one it published (evicted, expired or replaced elsewhere);
+pending errors and checkpoints are then dropped and read again.
+"""
+import asyncio
+import fnmatch
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import count_items, stage
+from app.core.storage import get_storage
+from app.api.upload import dataset_lock, parse_log_format, publish_dataset
+from app.parsers.sniffer import decode_log, delimiter_bytes, sniff_encoding, sniff_log
+from app.parsers.stack_trace import FrameTable
+from app.parsers.timeline import sort_run
+from app.analyzers.anomaly_detector import AnomalyDetector, load_anomaly_detector
+from app.analyzers.feature_store import load_feature_store
+from app.utils.datasets import EMPTY_DATASET, dataset_storage, resolve_dataset
+from app.utils.http_cache import EMPTY_DATASET_VERSION, get_dataset_version, new_dataset_version
+from app.utils.raw_logs import forget_watched_file, register_watched_file, watched_file_id
+
+TAIL_CHECKPOINTS_KEY = "tail_checkpoints"
+
+# Dataset the watched files are ingested into
+TAIL_DATASET_ID = "watch"
+
+
+class TailIngestor:
+    """Polls a directory and appends newly written log entries to the dataset"""
+
+    def __init__(self, directory: str, patterns: Optional[List[str]] = None,
+                 settle_seconds: Optional[float] = None):
+        self.directory = directory
+        self.patterns = [pattern.upper() for pattern in (patterns or settings.TAIL_FILE_PATTERNS)]
+        self.settle_seconds = settings.TAIL_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.last_poll: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.errors_ingested = 0
+        # Published version the state below belongs to (None: load it from storage)
+        self._version: Optional[str] = None
+        self._errors: List[dict] = []
+        self._next_id = 1
+        self._files_analyzed = 0
+        self._frame_table = FrameTable()
+        self._anomaly_detector: Optional[AnomalyDetector] = None
+        self._feature_store = None
+        # Checkpoints of everything read, published or pending
+        self._checkpoints: Dict[str, Dict[str, Any]] = {}
+        # Read but not yet published
+        self._pending: List[dict] = []
+        self._pending_files = 0
+        self._pending_since: Optional[float] = None
+
+    def matches(self, filename: str) -> bool:
+        name = filename.upper()
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.patterns)
+
+    def watched_files(self) -> List[str]:
+        try:
+            entries = sorted(os.scandir(self.directory), key=lambda entry: entry.name)
+        except OSError:
+            return []
+        return [entry.path for entry in entries if entry.is_file() and self.matches(entry.name)]
+
+    def read_appended(self, path: str, checkpoint: Optional[Dict[str, Any]],
+                      frame_table: FrameTable) -> Tuple[List[dict], Optional[Dict[str, Any]]]:
+        """Parse the complete entries appended to a file since its checkpoint"""
+        stat = os.stat(path)
+        generation = 0
+        if checkpoint and (checkpoint["inode"] != stat.st_ino or stat.st_size < checkpoint["size"]):
+            # Rotated or truncated: the file is new, and entries of the old one cannot be served anymore
+            generation = checkpoint.get("generation", 0) + 1
+            forget_watched_file(watched_file_id(path, checkpoint["inode"], checkpoint.get("generation", 0)))
+            checkpoint = None
+        checkpoint = checkpoint or {
+            "inode": stat.st_ino, "generation": generation, "size": 0, "offset": 0, "emitted": False, "encoding": None
+        }
+
+        settled = time.time() - stat.st_mtime >= self.settle_seconds
+        if stat.st_size == checkpoint["size"] and (checkpoint["emitted"] or not settled):
+            return [], checkpoint
+
+        base = checkpoint["offset"]
+        with open(path, "rb") as handle:
+            # Format and encoding are sniffed from the start of the file, not of the appended part
+            head = handle.read(settings.LOG_SNIFF_BYTES)
+            handle.seek(base)
+            data = handle.read(stat.st_size - base)
+        filename = os.path.basename(path)
+        log_format, encoding = sniff_log(head, filename)
+        if log_format is None:
+            return [], dict(checkpoint, size=stat.st_size)
+
+        # An ASCII start leaves the encoding to the first appended bytes that are not
+        encoding = checkpoint.get("encoding") or encoding or sniff_encoding(data)
+        delimiter = delimiter_bytes(log_format, encoding)
+        last = data.rfind(delimiter)
+        # An idle file's last entry is complete; otherwise stop before it
+        end = len(data) if settled else max(last, 0)
+        start = 0
+        if checkpoint["emitted"]:
+            # The entry at the checkpoint offset was ingested when the file went idle; parse from the next one
+            start = data.find(delimiter, len(delimiter))
+            start = len(data) if start < 0 else start
+        chunk = data[start:end]
+        errors = []
+        if chunk:
+            errors = parse_log_format(log_format, decode_log(chunk, encoding), filename, frame_table, chunk, encoding)
+
+        file_id = register_watched_file(
+            path, stat.st_ino, checkpoint.get("generation", 0), encoding
+        ) if errors else None
+        for error in errors:
+            if "offset" in error:
+                error["offset"] += base + start
+                error["file_id"] = file_id
+
+        if last > 0:
+            offset, emitted = base + last, settled
+        else:
+            offset, emitted = base, checkpoint["emitted"] or (settled and last == 0)
+        return errors, {
+            "inode": stat.st_ino, "generation": checkpoint.get("generation", 0), "size": stat.st_size,
+            "offset": offset, "emitted": emitted, "encoding": encoding
+        }
+
+    def scan(self, checkpoints: Dict[str, Dict[str, Any]],
+             frame_table: FrameTable) -> Tuple[List[dict], Dict[str, Dict[str, Any]], int]:
+        """New errors of all watched files, the updated checkpoints and the number of files seen first"""
+        new_errors = []
+        new_checkpoints = {}
+        new_files = 0
+        for path in self.watched_files():
+            previous = checkpoints.get(path)
+            try:
+                errors, checkpoint = self.read_appended(path, previous, frame_table)
+            except OSError as e:
+                print(f"Error reading watched file {path}: {str(e)}")
+                if previous:
+                    new_checkpoints[path] = previous
+                continue
+            if previous is None or previous["inode"] != checkpoint["inode"]:
+                new_files += 1
+            new_checkpoints[path] = checkpoint
+            new_errors.extend(errors)
+        return new_errors, new_checkpoints, new_files
+
+    async def _load(self, storage, version: str):
+        """Take the published dataset as the state to append to; pending errors are dropped"""
+        has_dataset = version != EMPTY_DATASET_VERSION
+        stored = storage.get_json(TAIL_CHECKPOINTS_KEY) if has_dataset else None
+        # Checkpoints describe what the stored dataset contains
+        self._checkpoints = stored["files"] if stored else {}
+        self._frame_table = FrameTable(storage.get_json("stack_frames") or []) if has_dataset else FrameTable()
+        self._errors = list(storage.get_json("analyzed_errors") or []) if has_dataset else []
+        self._next_id = max((error['id'] for error in self._errors), default=0) + 1
+        summary = (storage.get_json("error_summary") or {}) if has_dataset else {}
+        self._files_analyzed = summary.get("files_analyzed", 0)
+        if self._errors:
+            self._anomaly_detector = load_anomaly_detector(storage)
+            self._feature_store = await run_in_threadpool(load_feature_store, version)
+        else:
+            self._anomaly_detector = AnomalyDetector.from_settings()
+            self._feature_store = None
+        self._pending = []
+        self._pending_files = 0
+        self._pending_since = None
+        self._version = version
+
+    async def poll(self, flush: bool = False) -> int:
+        """
+        Read what was appended since the last poll; returns the number of new errors
+
+        They are published once enough are pending or have waited long
+        enough, or right away with flush.
+        """
+        async with dataset_lock:
+            storage = dataset_storage(TAIL_DATASET_ID, get_storage())
+            version = get_dataset_version(storage)
+            if version != self._version:
+                await self._load(storage, version)
+
+            with stage("tail.parse"):
+                new_errors, new_checkpoints, new_files = await run_in_threadpool(
+                    self.scan, self._checkpoints, self._frame_table
+                )
+            self.last_poll = time.time()
+            self._checkpoints = new_checkpoints
+            self._pending_files += new_files
+            if new_errors:
+                self._pending.extend(new_errors)
+                self._pending_since = self._pending_since or self.last_poll
+
+            # Checkpoints without new errors wait for the next publish; until then a restart reads those bytes again
+            due = (
+                flush or len(self._pending) >= settings.TAIL_PUBLISH_BATCH
+                or self.last_poll - self._pending_since >= settings.TAIL_PUBLISH_INTERVAL
+            ) if self._pending else False
+            if due:
+                await self._publish(storage)
+
+        count_items("tail.errors", len(new_errors))
+        return len(new_errors)
+
+    async def _publish(self, storage):
+        """Publish the pending errors with the checkpoints as a new version of the watch dataset"""
+        new_errors = sort_run(self._pending)
+        for error in new_errors:
+            error['id'] = self._next_id
+            self._next_id += 1
+        if self._feature_store is None and self._errors:
+            self._feature_store = await run_in_threadpool(load_feature_store, self._version)
+
+        version = new_dataset_version()
+        self._errors.extend(new_errors)
+        try:
+            await publish_dataset(
+                TAIL_DATASET_ID, self._errors, new_errors, self._frame_table,
+                self._files_analyzed + self._pending_files, self._anomaly_detector,
+                feature_store=self._feature_store,
+                extra={TAIL_CHECKPOINTS_KEY: {"files": self._checkpoints}},
+                stage_prefix="tail",
+                make_current=resolve_dataset(None, storage.backend) in (EMPTY_DATASET, TAIL_DATASET_ID),
+                extra_info={"source": "watch", "directory": self.directory},
+                dataset_version=version
+            )
+        except Exception:
+            # The state may hold part of the batch; reload it and read the pending bytes again
+            self._version = None
+            raise
+
+        self._version = version
+        self._files_analyzed += self._pending_files
+        self.errors_ingested += len(new_errors)
+        self._pending = []
+        self._pending_files = 0
+        self._pending_since = None
+
+    async def run(self, stop: asyncio.Event):
+        """Poll until stop is set, then publish what is pending"""
+        while not stop.is_set():
+            try:
+                await self.poll()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error ingesting watched directory: {str(e)}")
+            try:
+                await asyncio.wait_for(stop.wait(), settings.TAIL_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        try:
+            await self.poll(flush=True)
+        except Exception as e:
+            print(f"Error ingesting watched directory: {str(e)}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "patterns": self.patterns,
+            "last_poll": self.last_poll,
+            "last_error": self.last_error,
+            "errors_ingested": self.errors_ingested,
+            "errors_pending": len(self._pending)
+        }
+
+
+_ingestor: Optional[TailIngestor] = None
+_task: Optional[asyncio.Task] = None
+_stop: Optional[asyncio.Event] = None
+
+
+def start_tail_ingestion() -> Optional[TailIngestor]:
+    """Start the ingestion task if a watch directory is configured"""
+    global _ingestor, _task, _stop
+    if not settings.TAIL_WATCH_DIR or _task is not None:
+        return _ingestor
+    _ingestor = TailIngestor(settings.TAIL_WATCH_DIR)
+    _stop = asyncio.Event()
+    _task = asyncio.create_task(_ingestor.run(_stop))
+    return _ingestor
+
+
+async def stop_tail_ingestion():
+    """Stop the ingestion task after its current poll"""
+    global _task
+    if _task is None:
+        return
+    _stop.set()
+    await _task
+    _task = None
+
+
+def get_tail_ingestor() -> Optional[TailIngestor]:
+    return _ingestor
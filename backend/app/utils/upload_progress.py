@@ -0,0 +1,191 @@
+"""
+Upload progress tracking for streaming progress and partial results to clients
+
+Starlette reads the whole multipart body before the upload route runs, so
+UploadProgressMiddleware creates the tracker of an upload sent with an
+upload_id as soon as the request starts and counts body bytes as they
+arrive; the route picks that tracker up for the parsing phase.
+"""
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.storage import get_storage
+
+# Storage key prefix for progress snapshots (shared between workers)
+PROGRESS_KEY_PREFIX = "upload_progress:"
+
+# Upload states
+STATUS_PENDING = "pending"
+STATUS_RECEIVING = "receiving"
+STATUS_PARSING = "parsing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+FINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+# Trackers of uploads running in this process
+_trackers: Dict[str, "UploadProgress"] = {}
+
+
+def new_upload_id() -> str:
+    """Create a fresh upload identifier"""
+    return uuid.uuid4().hex
+
+
+class UploadProgress:
+    """Running counters of a single upload, mirrored to storage for other workers"""
+
+    def __init__(self, upload_id: str, total_files: int, total_bytes: int, storage=None):
+        self.upload_id = upload_id
+        self.storage = storage or get_storage()
+        self.status = STATUS_PENDING
+        self.message = ""
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.files_parsed = 0
+        self.errors_found = 0
+        self.critical_found = 0
+        self.type_counts: Dict[str, int] = {}
+        self.user_counts: Dict[str, int] = {}
+        self.critical_errors: List[Dict[str, Any]] = []
+        self.sequence = 0
+        self.started_at = time.time()
+        self._last_publish = 0.0
+        # Set when UploadProgressMiddleware counts the request body as it arrives
+        self.body_counted = False
+
+    def add_bytes(self, count: int):
+        """Record bytes received from the client"""
+        self.status = STATUS_RECEIVING
+        self.bytes_read += count
+        self._publish()
+
+    def add_file_errors(self, file_errors: List[Dict[str, Any]]):
+        """Record the errors of one parsed file"""
+        self.status = STATUS_PARSING
+        self.files_parsed += 1
+        self.errors_found += len(file_errors)
+        for error in file_errors:
+            self.type_counts[error['type']] = self.type_counts.get(error['type'], 0) + 1
+            self.user_counts[error['user']] = self.user_counts.get(error['user'], 0) + 1
+            if error['severity'] == 'Critical':
+                self.critical_found += 1
+                if len(self.critical_errors) < settings.UPLOAD_PROGRESS_CRITICAL_LIMIT:
+                    self.critical_errors.append(error)
+        # File boundaries are always pushed so critical errors surface immediately
+        self._publish(force=True)
+
+    def finish(self, status: str = STATUS_COMPLETED, message: str = ""):
+        """Mark the upload as finished and release the in-process tracker"""
+        self.status = status
+        self.message = message
+        self._publish(force=True)
+        _trackers.pop(self.upload_id, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "status": self.status,
+            "message": self.message,
+            "sequence": self.sequence,
+            "total_files": self.total_files,
+            "total_bytes": self.total_bytes,
+            "bytes_read": self.bytes_read,
+            "files_parsed": self.files_parsed,
+            "errors_found": self.errors_found,
+            "critical_found": self.critical_found,
+            "type_counts": self.type_counts,
+            "user_counts": self.user_counts,
+            "critical_errors": self.critical_errors,
+            "elapsed_seconds": round(time.time() - self.started_at, 3)
+        }
+
+    def _publish(self, force: bool = False):
+        self.sequence += 1
+        now = time.time()
+        if not force and now - self._last_publish < settings.UPLOAD_PROGRESS_INTERVAL:
+            return
+        self._last_publish = now
+        try:
+            # Stored encoded: the snapshot shares the tracker's live counters
+            self.storage.setex(
+                PROGRESS_KEY_PREFIX + self.upload_id,
+                settings.REDIS_CACHE_TTL,
+                json.dumps(self.snapshot())
+            )
+        except Exception as e:
+            print(f"Error publishing upload progress: {str(e)}")
+
+
+def start_upload_progress(upload_id: str, total_files: int, total_bytes: int) -> UploadProgress:
+    """Register a tracker for a new upload"""
+    tracker = UploadProgress(upload_id, total_files, total_bytes)
+    _trackers[upload_id] = tracker
+    tracker._publish(force=True)
+    return tracker
+
+
+def drop_upload_progress(upload_id: str):
+    """Release the tracker of an upload another process finished, without publishing"""
+    _trackers.pop(upload_id, None)
+
+
+def get_upload_progress(upload_id: str) -> Optional[UploadProgress]:
+    """Tracker of an upload running in this process"""
+    return _trackers.get(upload_id)
+
+
+def get_progress_snapshot(upload_id: str) -> Optional[Dict[str, Any]]:
+    """Get the latest progress of an upload, from this process or from storage"""
+    tracker = _trackers.get(upload_id)
+    if tracker is not None:
+        return tracker.snapshot()
+    try:
+        return get_storage().get_json(PROGRESS_KEY_PREFIX + upload_id)
+    except Exception as e:
+        print(f"Error reading upload progress: {str(e)}")
+        return None
+
+
+class UploadProgressMiddleware:
+    """
+    Track uploads sent with an upload_id query parameter from the first body
+    byte on, so progress streams see the upload while it is still received
+    """
+
+    def __init__(self, app: ASGIApp, paths: Tuple[str, ...] = ("/api/upload",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        upload_id = None
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            upload_id = query.get("upload_id", [None])[0]
+        if not upload_id or upload_id in _trackers:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        tracker = start_upload_progress(upload_id, 0, int(content_length) if content_length.isdigit() else 0)
+        tracker.body_counted = True
+
+        async def counting_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request" and message.get("body"):
+                tracker.add_bytes(len(message["body"]))
+            return message
+
+        try:
+            await self.app(scope, counting_receive, send)
+        finally:
+            if _trackers.get(upload_id) is tracker:
+                # The route did not get to finish it (rejected or aborted request)
+                tracker.finish(STATUS_FAILED, "Upload aborted")
@@ -0,0 +1,260 @@
+"""
+Resumable chunked upload sessions
+
+A session is created with the names and sizes of the files to upload.
+Chunks are then PUT at explicit byte offsets; every chunk is appended to a
+partial file on disk and fed to the file's incremental parser right away,
+so when the last chunk arrives almost all parsing is done. A client whose
+connection drops asks the session for the bytes received per file and
+continues from there.
+
+Each session directory holds the partial files and session.json with the
+announced files, the bytes committed per file and, once a file is
+complete, its raw log ID. That metadata is the state every worker works
+from: a process that meets a session it did not create, or one that
+received chunks elsewhere, reads the metadata and replays the committed
+bytes it has not parsed yet, from the partial file or, for complete
+files, from the kept raw log. Bytes beyond the committed count are an
+interrupted write and are cut off before the next chunk. Chunk writes and
+finalize hold an flock() on the session directory, so workers on one host
+never write the same session at once. Idle sessions are discarded after
+UPLOAD_SESSION_TTL together with their partial files.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.parsers.parse_cache import StreamingHasher
+from app.parsers.stack_trace import FrameTable
+from app.utils.upload_progress import drop_upload_progress
+
+SESSION_METADATA = "session.json"
+SESSION_LOCK = "session.lock"
+
+_SESSION_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Sessions this process has worked on, by ID
+_sessions: Dict[str, "UploadSession"] = {}
+
+
+class SessionBusyError(Exception):
+    """Another process is writing to the session"""
+
+
+class SessionFile:
+    """One file of a session: bytes received so far and its parse state"""
+
+    def __init__(self, index: int, filename: str, size: int, path: str):
+        self.index = index
+        self.filename = filename
+        self.size = size
+        self.path = path
+        self.received = 0  # Committed bytes, as recorded in the session metadata
+        self.parsed = 0  # Bytes fed to this process's hasher and parser
+        self.hasher = StreamingHasher()
+        self.parser: Any = None  # LogStreamParser, attached by the upload API
+        self.errors: List[dict] = []
+        self.file_id: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.size
+
+    def reset(self):
+        """Forget this process's parse state (the file is replayed from disk)"""
+        self.parsed = 0
+        self.hasher = StreamingHasher()
+        self.parser = None
+        self.errors = []
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "filename": self.filename,
+            "size": self.size,
+            "received": self.received,
+            "complete": self.complete,
+            "errors_found": len(self.errors)
+        }
+
+
+class UploadSession:
+    """Files announced for one upload and the state of their transfer"""
+
+    def __init__(self, session_id: str, directory: str):
+        self.session_id = session_id
+        self.directory = directory
+        self.files: List[SessionFile] = []
+        self.frame_table = FrameTable()
+        self.touched = time.time()
+        self.finalized = False
+        # Serializes chunk writes and finalize of this process, so offsets cannot interleave
+        self.lock = asyncio.Lock()
+
+    def add_file(self, filename: str, size: int) -> SessionFile:
+        index = len(self.files)
+        session_file = SessionFile(index, filename, size, os.path.join(self.directory, f"{index}.part"))
+        open(session_file.path, "wb").close()
+        self.files.append(session_file)
+        return session_file
+
+    def touch(self):
+        self.touched = time.time()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(session_file.size for session_file in self.files)
+
+    @property
+    def received_bytes(self) -> int:
+        return sum(session_file.received for session_file in self.files)
+
+    def save(self):
+        """Commit the session's state to its metadata file (atomically replaced)"""
+        self.touch()
+        metadata = {
+            "session_id": self.session_id,
+            "touched": self.touched,
+            "finalized": self.finalized,
+            "files": [
+                {
+                    "filename": session_file.filename,
+                    "size": session_file.size,
+                    "received": session_file.received,
+                    "file_id": session_file.file_id
+                }
+                for session_file in self.files
+            ]
+        }
+        path = os.path.join(self.directory, SESSION_METADATA)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(metadata, handle)
+        os.replace(temp_path, path)
+
+    def refresh(self, metadata: Dict[str, Any]):
+        """Take over state committed by other processes"""
+        self.touched = metadata["touched"]
+        self.finalized = metadata["finalized"]
+        for session_file, stored in zip(self.files, metadata["files"]):
+            if stored["received"] < session_file.parsed:
+                session_file.reset()  # Cannot happen unless the files were rewritten; start over
+            session_file.received = stored["received"]
+            session_file.file_id = stored["file_id"]
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """flock() the session against other processes; raises SessionBusyError if one holds it"""
+        with open(os.path.join(self.directory, SESSION_LOCK), "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise SessionBusyError(self.session_id)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "finalized": self.finalized,
+            "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+            "total_bytes": self.total_bytes,
+            "received_bytes": self.received_bytes,
+            "files": [session_file.info() for session_file in self.files]
+        }
+
+
+def sessions_dir() -> str:
+    return os.path.join(settings.UPLOAD_DIR, "sessions")
+
+
+def _read_metadata(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, SESSION_METADATA), encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def create_session() -> UploadSession:
+    """Start a new, empty session (save() it once its files are added)"""
+    prune_sessions()
+    session_id = uuid.uuid4().hex
+    directory = os.path.join(sessions_dir(), session_id)
+    os.makedirs(directory, exist_ok=True)
+    session = UploadSession(session_id, directory)
+    _sessions[session_id] = session
+    return session
+
+
+def get_session(session_id: str) -> Optional[UploadSession]:
+    """
+    A session with the state last committed by any process
+
+    Files may have committed bytes this process has not parsed yet
+    (received > parsed); the upload API replays them before use.
+    """
+    if not _SESSION_ID.match(session_id):
+        return None
+    directory = os.path.join(sessions_dir(), session_id)
+    metadata = _read_metadata(directory)
+    if metadata is None:
+        _sessions.pop(session_id, None)
+        return None
+    session = _sessions.get(session_id)
+    if session is None:
+        session = UploadSession(session_id, directory)
+        for index, stored in enumerate(metadata["files"]):
+            session.files.append(SessionFile(
+                index, stored["filename"], stored["size"], os.path.join(directory, f"{index}.part")
+            ))
+        _sessions[session_id] = session
+    session.refresh(metadata)
+    return session
+
+
+def discard_session(session_id: str):
+    """Forget a session and delete its remaining partial files"""
+    session = _sessions.pop(session_id, None)
+    directory = session.directory if session is not None else os.path.join(sessions_dir(), session_id)
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def prune_sessions(max_idle: Optional[int] = None):
+    """Discard sessions of any process idle for longer than the session TTL"""
+    max_idle = settings.UPLOAD_SESSION_TTL if max_idle is None else max_idle
+    cutoff = time.time() - max_idle
+    try:
+        entries = list(os.scandir(sessions_dir()))
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.is_dir() or not _SESSION_ID.match(entry.name):
+            continue
+        metadata = _read_metadata(entry.path)
+        try:
+            touched = metadata["touched"] if metadata else entry.stat().st_mtime
+        except OSError:
+            continue
+        session = _sessions.get(entry.name)
+        if touched >= cutoff or (session is not None and session.lock.locked()):
+            continue
+        try:
+            with UploadSession(entry.name, entry.path).exclusive():
+                discard_session(entry.name)
+        except (SessionBusyError, OSError):
+            pass
+    for session_id in [session_id for session_id, session in _sessions.items() if not os.path.isdir(session.directory)]:
+        # Finalized or discarded by another process
+        _sessions.pop(session_id, None)
+        drop_upload_progress(session_id)
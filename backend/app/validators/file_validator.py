@@ -2,11 +2,13 @@
 File validation utilities
 """
 import os
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from fastapi import UploadFile
 
 from app.core.config import settings
+from app.parsers.sniffer import format_from_filename, sniff_log
+from app.utils.archives import is_archive
 
 @dataclass
 class ValidationResult:
@@ -45,8 +47,12 @@ async def validate_uploaded_files(files: List[UploadFile]) -> ValidationResult:
                 errors.append(f"File '{file.filename}' is too large ({file.size} bytes)")
                 continue
         
-        # Detect log type
-        log_type = detect_log_type(file.filename)
+        # Detect log type from the first bytes
+        head = None
+        if not is_archive(file.filename):
+            head = await file.read(settings.LOG_SNIFF_BYTES)
+            await file.seek(0)
+        log_type = detect_log_type(file.filename, head)
         file_types[file.filename] = log_type
         
         if log_type == "unknown":
@@ -62,15 +68,44 @@ async def validate_uploaded_files(files: List[UploadFile]) -> ValidationResult:
     
     return ValidationResult(is_valid, valid_files, errors, warnings, file_types)
 
-def detect_log_type(filename: str) -> str:
+def validate_announced_files(files: List[Tuple[str, int]]) -> List[str]:
     """
-    Detect log file type from filename
+    Validate the (filename, size) pairs announced for a chunked upload session
     """
-    filename_upper = filename.upper()
+    errors = []
+    
+    if not files:
+        errors.append("No files provided")
+        return errors
     
-    if filename_upper.startswith("E_") and filename_upper.endswith(".LOG"):
-        return "visual_objects"
-    elif filename_upper.startswith("EC_") and filename_upper.endswith(".LOG"):
-        return "dotnet"
-    else:
-        return "unknown"
\ No newline at end of file
+    total_size = 0
+    
+    for filename, size in files:
+        if is_archive(filename) or not any(filename.lower().endswith(ext.lower()) for ext in settings.ALLOWED_FILE_EXTENSIONS):
+            errors.append(f"File '{filename}' has invalid extension. Chunked uploads accept .log files only")
+            continue
+        
+        if size < 0 or size > settings.MAX_FILE_SIZE:
+            errors.append(f"File '{filename}' is too large ({size} bytes)")
+            continue
+        
+        total_size += size
+    
+    # Sessions are meant for large sets; the limit is that of decompressed archives
+    if total_size > settings.MAX_DECOMPRESSED_SIZE:
+        errors.append(f"Total file size ({total_size} bytes) exceeds limit ({settings.MAX_DECOMPRESSED_SIZE} bytes)")
+    
+    return errors
+
+def detect_log_type(filename: str, head: Optional[bytes] = None) -> str:
+    """
+    Detect log file type from the first bytes of the file, or from the
+    filename alone when they are not given
+    """
+    if is_archive(filename):
+        return "archive"
+    if head is not None:
+        return sniff_log(head, filename).log_format or "unknown"
+    if filename.upper().endswith(".LOG"):
+        return format_from_filename(filename) or "unknown"
+    return "unknown"
\ No newline at end of file
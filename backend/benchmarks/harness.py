@@ -0,0 +1,60 @@
+"""
+Shared setup for benchmarks and load tests: generated datasets and an
+in-process app running on the memory storage backend
+"""
+import glob
+import json
+import os
+import tempfile
+from typing import Any, Dict, List
+
+from benchmarks.log_generator import LogGenerator
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(BENCHMARK_DIR, '.data')
+DEFAULT_RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+
+def install_memory_storage():
+    """Run the app on the in-process storage backend with a throwaway upload directory"""
+    import app.api.upload
+    from app.core.config import settings
+    from app.core.storage import MemoryStorage, set_storage
+
+    storage = MemoryStorage()
+    set_storage(storage)
+    # The upload module binds the backend at import time
+    app.api.upload.storage = storage
+    settings.STORAGE_BACKEND = 'memory'
+    settings.UPLOAD_DIR = tempfile.mkdtemp(prefix='errlog-bench-')
+    return storage
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def prepare_dataset(size: int, seed: int, data_dir: str = DEFAULT_DATA_DIR) -> Dict[str, Any]:
+    """Generate the dataset of a size and seed, or reuse it if it was generated before"""
+    directory = os.path.join(data_dir, f"seed{seed}_{size}")
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            return {'directory': directory, **json.load(handle)}
+
+    manifest = LogGenerator(seed=seed).write_dataset(directory, size)
+    with open(manifest_path, 'w') as handle:
+        json.dump(manifest, handle)
+    return {'directory': directory, **manifest}
+
+
+def load_files(dataset: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Read the log files of a generated dataset"""
+    files = []
+    for path in sorted(glob.glob(os.path.join(dataset['directory'], '*.LOG'))):
+        with open(path, 'rb') as handle:
+            files.append({'filename': os.path.basename(path), 'data': handle.read()})
+    return files
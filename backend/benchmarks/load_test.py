@@ -0,0 +1,257 @@
+"""
+Load test replaying the dashboard's request fan-out against the app in-process
+
+The app runs in the load generator's own event loop (httpx ASGITransport)
+on the in-process memory storage backend, so no server is needed and every request
+can be attributed the event-loop time it consumed. A generated dataset is
+uploaded first; then `concurrency` virtual users repeatedly load the
+dashboard, each page load firing the whole request mix at once like
+DashboardPage.vue does.
+
+Reported per endpoint: p50/p95/p99 latency, throughput and event-loop
+blocking (total synchronous time the request's coroutine held the loop and
+its longest single uninterrupted step). A loop-lag probe reports how late
+timers fired overall.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --size 10MB --concurrency 8 --page-loads 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import types
+from collections import defaultdict
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.harness import DEFAULT_DATA_DIR, install_memory_storage, load_files, percentile, prepare_dataset
+from benchmarks.log_generator import parse_size
+
+# Requests fired in parallel on one dashboard load: (endpoint name, path)
+DASHBOARD_MIX: List[Tuple[str, str]] = [
+    ('summary', '/api/errors/summary'),
+    ('errors', '/api/errors?page=1&limit=1000'),
+    ('timeline', '/api/errors/timeline'),
+    ('types', '/api/errors/types'),
+    ('users', '/api/errors/users'),
+    ('critical', '/api/errors/critical'),
+    ('heatmap', '/api/ml/user-risk-heatmap'),
+    ('root_causes', '/api/ml/root-cause-suggestions'),
+    ('insights', '/api/ml/insights-summary'),
+]
+
+# Interval of the event-loop lag probe
+LAG_PROBE_INTERVAL = 0.005
+
+
+@types.coroutine
+def _timed_steps(coroutine: Awaitable, on_step):
+    """
+    Drive a coroutine step by step, reporting how long each step held the loop
+
+    Each send()/throw() into the coroutine runs synchronously until it next
+    suspends, so the elapsed time of one step is time the event loop could not
+    serve anything else.
+    """
+    value: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        started = time.perf_counter()
+        try:
+            if error is not None:
+                yielded = coroutine.throw(error)
+            else:
+                yielded = coroutine.send(value)
+        except StopIteration as stop:
+            on_step(time.perf_counter() - started)
+            return stop.value
+        except BaseException:
+            on_step(time.perf_counter() - started)
+            raise
+        on_step(time.perf_counter() - started)
+        try:
+            value, error = (yield yielded), None
+        except BaseException as e:
+            value, error = None, e
+
+
+class LoopBlockingRecorder:
+    """Wraps an ASGI app and records loop-holding steps per request path"""
+
+    def __init__(self, app, names: Dict[str, str]):
+        self.app = app
+        self.names = names
+        self.total: Dict[str, float] = defaultdict(float)
+        self.longest: Dict[str, float] = defaultdict(float)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '')
+        query = scope.get('query_string', b'').decode('latin-1')
+        name = self.names.get(f"{path}?{query}" if query else path, path)
+
+        def on_step(elapsed: float):
+            self.total[name] += elapsed
+            if elapsed > self.longest[name]:
+                self.longest[name] = elapsed
+
+        await _timed_steps(self.app(scope, receive, send), on_step)
+
+
+async def _lag_probe(samples: List[float], stop: asyncio.Event):
+    """Measure how late a short timer fires; lateness means the loop was blocked"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_PROBE_INTERVAL
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def _page_load(client: httpx.AsyncClient, latencies: Dict[str, List[float]], failures: Dict[str, int]) -> float:
+    async def fetch(name: str, path: str):
+        started = time.perf_counter()
+        response = await client.get(path)
+        latencies[name].append(time.perf_counter() - started)
+        if response.status_code != 200:
+            failures[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(name, path) for name, path in DASHBOARD_MIX))
+    return time.perf_counter() - started
+
+
+async def run_load_test(files: List[Dict[str, Any]], concurrency: int, page_loads: int,
+                        duration: Optional[float], response_cache: bool) -> Dict[str, Any]:
+    from app.main import app
+    from app.utils.http_cache import response_cache as cache
+
+    if not response_cache:
+        # Every request recomputes its response
+        cache.max_entries = 0
+
+    recorder = LoopBlockingRecorder(app, {path: name for name, path in DASHBOARD_MIX})
+    transport = httpx.ASGITransport(app=recorder)
+    async with httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=None) as client:
+        started = time.perf_counter()
+        response = await client.post(
+            '/api/upload',
+            files=[('files', (file['filename'], file['data'], 'text/plain')) for file in files]
+        )
+        response.raise_for_status()
+        upload_seconds = time.perf_counter() - started
+        print(f"Uploaded {response.json()['total_errors']} errors in {upload_seconds:.2f}s")
+
+        # Measure the replay only
+        recorder.total.clear()
+        recorder.longest.clear()
+
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        failures: Dict[str, int] = defaultdict(int)
+        page_latencies: List[float] = []
+        lag_samples: List[float] = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_lag_probe(lag_samples, stop))
+
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = [page_loads]
+
+        async def virtual_user():
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif remaining[0] <= 0:
+                    return
+                else:
+                    remaining[0] -= 1
+                page_latencies.append(await _page_load(client, latencies, failures))
+
+        replay_started = time.perf_counter()
+        await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - replay_started
+        stop.set()
+        await probe
+
+    endpoints = {}
+    for name, _ in DASHBOARD_MIX:
+        values = latencies.get(name, [])
+        if not values:
+            continue
+        endpoints[name] = {
+            'requests': len(values),
+            'failures': failures.get(name, 0),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'throughput_rps': round(len(values) / elapsed, 2),
+            'loop_blocking_ms': round(recorder.total.get(name, 0.0) * 1000, 2),
+            'loop_blocking_per_request_ms': round(recorder.total.get(name, 0.0) * 1000 / len(values), 2),
+            'longest_block_ms': round(recorder.longest.get(name, 0.0) * 1000, 2)
+        }
+
+    total_requests = sum(endpoint['requests'] for endpoint in endpoints.values())
+    return {
+        'concurrency': concurrency,
+        'response_cache': response_cache,
+        'upload_seconds': round(upload_seconds, 3),
+        'seconds': round(elapsed, 3),
+        'page_loads': len(page_latencies),
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / elapsed, 2),
+        'page_load_p50_ms': round(percentile(page_latencies, 50) * 1000, 2) if page_latencies else None,
+        'page_load_p95_ms': round(percentile(page_latencies, 95) * 1000, 2) if page_latencies else None,
+        'loop_lag_p99_ms': round(percentile(lag_samples, 99) * 1000, 2) if lag_samples else None,
+        'loop_lag_max_ms': round(max(lag_samples) * 1000, 2) if lag_samples else None,
+        'endpoints': endpoints
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"\n{report['page_loads']} page loads, {report['requests']} requests in {report['seconds']}s "
+        f"({report['throughput_rps']} req/s, concurrency {report['concurrency']})"
+    )
+    print(f"Page load p50 {report['page_load_p50_ms']} ms, p95 {report['page_load_p95_ms']} ms")
+    print(f"Event loop lag p99 {report['loop_lag_p99_ms']} ms, max {report['loop_lag_max_ms']} ms\n")
+    print(f"{'endpoint':<12} {'req':>5} {'fail':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'block ms/req':>13} {'max block':>10}")
+    for name, stats in report['endpoints'].items():
+        print(
+            f"{name:<12} {stats['requests']:>5} {stats['failures']:>5} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+            f"{stats['p99_ms']:>9} {stats['throughput_rps']:>8} {stats['loop_blocking_per_request_ms']:>13} "
+            f"{stats['longest_block_ms']:>10}"
+        )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay the dashboard request mix against the app in-process")
+    parser.add_argument('--size', default='5MB', help="Size of the generated dataset to preload")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument('--page-loads', type=int, default=20, help="Total dashboard loads (ignored with --duration)")
+    parser.add_argument('--duration', type=float, help="Run for this many seconds instead of a fixed number of loads")
+    parser.add_argument('--no-response-cache', action='store_true', help="Disable the ETag response cache")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    install_memory_storage()
+    dataset = prepare_dataset(parse_size(args.size), args.seed, args.data_dir)
+    files = load_files(dataset)
+
+    report = asyncio.run(run_load_test(
+        files, args.concurrency, args.page_loads, args.duration, not args.no_response_cache
+    ))
+    report['dataset'] = {'size': args.size, 'seed': args.seed, 'bytes': dataset['total_bytes']}
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Deterministic generator for synthetic Visual Objects (E_*.LOG) and .NET (EC_*.LOG) logs
+
+The same seed and options always produce byte-identical files, so benchmark
+runs on different machines or commits parse exactly the same input. Files
+are written block by block, so datasets from a few KB to several GB can be
+generated without holding them in memory.
+
+Usage:
+    python -m benchmarks.log_generator OUTPUT_DIR --size 50MB --seed 42 --users 8
+"""
+import argparse
+import os
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+VO_DELIMITER = '***********************ERROR********************************'
+DOTNET_DELIMITER = '------------------------------'
+
+# (code, type) pairs as written by the Visual Objects runtime
+VO_ERROR_TYPES: List[Tuple[int, str]] = [
+    (2, 'BOUND ERROR'),
+    (5, 'INVALID OPERATION'),
+    (11, 'DIVISION BY ZERO'),
+    (16, 'NO EXPORTED METHOD'),
+    (33, 'DATA TYPE ERROR'),
+    (36, 'ARRAY ACCESS'),
+    (50, 'ACCESS VIOLATION'),
+]
+
+DOTNET_EXCEPTIONS: List[str] = [
+    'System.AccessViolationException',
+    'System.OutOfMemoryException',
+    'System.InvalidOperationException',
+    'System.NullReferenceException',
+    'System.ArgumentOutOfRangeException',
+    'System.ObjectDisposedException',
+]
+
+INNER_EXCEPTIONS: List[str] = [
+    'System.ComponentModel.Win32Exception (0x80004005): Access denied',
+    'System.Data.SqlClient.SqlException (0x80131904): Timeout expired',
+    'System.IO.IOException: The process cannot access the file because it is being used by another process',
+]
+
+NAMESPACES = ['AMS.Data', 'AMS.UI', 'AMS.Core', 'AMS.Reports', 'AMS.Import', 'AMS.Sync']
+CLASSES = ['Loader', 'MainForm', 'OrderService', 'Repository', 'Exporter', 'CacheManager', 'Scheduler']
+METHODS = ['Load', 'Save', 'OnClick', 'Execute', 'Refresh', 'Validate', 'Process', 'Dispose']
+
+# Errors of one file are spread over a ten-hour working day
+WORKDAY_SECONDS = 10 * 3600
+
+USER_NAMES = ['GAM', 'SWE', 'MUE', 'KLA', 'HOF', 'BER', 'WAG', 'SCH', 'FIS', 'WEB', 'MEY', 'BAU']
+
+SIZE_PATTERN = re.compile(r'^\s*([\d.]+)\s*([KMG]?B?)\s*$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3}
+
+
+def parse_size(size: str) -> int:
+    """Parse a size such as '512KB', '10MB' or '2GB' into bytes"""
+    match = SIZE_PATTERN.match(size)
+    if not match:
+        raise ValueError(f"Invalid size: {size}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+class LogGenerator:
+    """Seeded generator of realistic E_/EC_ log files"""
+
+    def __init__(
+        self,
+        seed: int = 42,
+        users: int = 8,
+        vo_types: Optional[List[Tuple[int, str]]] = None,
+        dotnet_exceptions: Optional[List[str]] = None,
+        burst_rate: float = 0.02,
+        burst_size: Tuple[int, int] = (10, 60),
+        stack_depth: Tuple[int, int] = (3, 20),
+        dotnet_share: float = 0.5,
+        start: datetime = datetime(2025, 6, 2, 7, 0, 0)
+    ):
+        self.seed = seed
+        self.users = [USER_NAMES[i] if i < len(USER_NAMES) else f"U{i:03d}" for i in range(users)]
+        self.vo_types = vo_types or VO_ERROR_TYPES
+        self.dotnet_exceptions = dotnet_exceptions or DOTNET_EXCEPTIONS
+        self.burst_rate = burst_rate
+        self.burst_size = burst_size
+        self.stack_depth = stack_depth
+        self.dotnet_share = dotnet_share
+        self.start = start
+
+    def _rng(self, *parts) -> random.Random:
+        # One independent stream per file keeps files identical regardless of generation order
+        return random.Random(f"{self.seed}:" + ":".join(str(part) for part in parts))
+
+    def _type_weights(self, rng: random.Random, count: int) -> List[float]:
+        # Skewed per-user type mix: a few types dominate, as in real logs
+        return [rng.paretovariate(1.5) for _ in range(count)]
+
+    def _block_bytes(self, kind: str) -> int:
+        """Approximate size of one error block, used to spread a file over the day"""
+        depth = sum(self.stack_depth) / 2
+        return int(200 + 40 * depth) if kind == 'vo' else int(120 + 85 * depth)
+
+    def _timestamps(self, rng: random.Random, day: datetime, expected: int):
+        """
+        Yield (timestamp, burst_id) pairs in increasing time order, spaced so
+        that about `expected` errors fill one working day
+        """
+        current = day
+        mean_gap = max(1.0, WORKDAY_SECONDS / max(expected, 1))
+        burst_left = 0
+        burst_id = 0
+        while True:
+            if burst_left:
+                burst_left -= 1
+                current += timedelta(seconds=rng.randint(1, 5))
+            else:
+                current += timedelta(seconds=max(1, int(rng.expovariate(1 / mean_gap))))
+                if rng.random() < self.burst_rate:
+                    burst_id += 1
+                    burst_left = rng.randint(*self.burst_size)
+            yield current, burst_id if burst_left else 0
+
+    def visual_objects_blocks(self, user: str, day: datetime, expected: int):
+        """Yield the text of Visual Objects error blocks (endless; the caller stops)"""
+        rng = self._rng('vo', user, day.date())
+        weights = self._type_weights(rng, len(self.vo_types))
+        burst_type = None
+        last_burst = 0
+        for timestamp, burst_id in self._timestamps(rng, day, expected):
+            if burst_id and burst_id != last_burst:
+                burst_type = rng.choices(self.vo_types, weights)[0]
+            last_burst = burst_id
+            code, error_type = burst_type if burst_id else rng.choices(self.vo_types, weights)[0]
+            function = f"{rng.choice(CLASSES)}:{rng.choice(METHODS)}"
+            yield (
+                f"{VO_DELIMITER}\n"
+                f"Error Code: {code} [ {error_type} ]\n"
+                f"Timestamp: {timestamp.strftime('%d.%m.%Y %H:%M:%S')}\n"
+                f"Subsystem: BASE\n"
+                f"Function: {function}\n"
+                f"Args: 0x{rng.getrandbits(32):08X} C:\\AMS\\DATA\\{rng.choice(CLASSES).upper()}{rng.randint(1, 99)}.DBF\n"
+                f"Callstack:\n"
+                + "".join(
+                    f"  {rng.choice(CLASSES).upper()}:{rng.choice(METHODS).upper()} (Line: {rng.randint(1, 3000)})\n"
+                    for _ in range(rng.randint(*self.stack_depth))
+                )
+            )
+
+    def dotnet_blocks(self, user: str, day: datetime, expected: int):
+        """Yield the text of .NET error blocks (endless; the caller stops)"""
+        rng = self._rng('dotnet', user, day.date())
+        weights = self._type_weights(rng, len(self.dotnet_exceptions))
+        burst_exception = None
+        last_burst = 0
+        for timestamp, burst_id in self._timestamps(rng, day, expected):
+            if burst_id and burst_id != last_burst:
+                burst_exception = rng.choices(self.dotnet_exceptions, weights)[0]
+            last_burst = burst_id
+            exception = burst_exception if burst_id else rng.choices(self.dotnet_exceptions, weights)[0]
+            lines = [
+                f"Logged at: {timestamp.strftime('%d.%m.%Y %H:%M:%S')}",
+                f"{exception}: Operation failed at 0x{rng.getrandbits(32):08X} for record {rng.randint(1, 100000)}",
+            ]
+            if rng.random() < 0.4:
+                lines.append(f" ---> {rng.choice(INNER_EXCEPTIONS)}")
+            for _ in range(rng.randint(*self.stack_depth)):
+                namespace, cls, method = rng.choice(NAMESPACES), rng.choice(CLASSES), rng.choice(METHODS)
+                if rng.random() < 0.6:
+                    lines.append(
+                        f"   at {namespace}.{cls}.{method}(Object sender, EventArgs e) "
+                        f"in C:\\src\\{namespace.split('.')[-1]}\\{cls}.cs:line {rng.randint(1, 2000)}"
+                    )
+                else:
+                    lines.append(f"   at {namespace}.{cls}.{method}()")
+            yield f"{DOTNET_DELIMITER}\n" + "\n".join(lines) + "\n"
+
+    def write_file(self, path: str, kind: str, user: str, day: datetime, target_bytes: int) -> Dict[str, int]:
+        """Write one log file of roughly target_bytes; returns its size and error count"""
+        header = (
+            f"AMS error log {user} {day.strftime('%d.%m.%Y')}\n" if kind == 'vo'
+            else f"AMS .NET error log {user} {day.strftime('%d.%m.%Y')}\n"
+        )
+        blocks = self.visual_objects_blocks if kind == 'vo' else self.dotnet_blocks
+        written = 0
+        errors = 0
+        with open(path, 'w', encoding='utf-8', newline='\n') as handle:
+            handle.write(header)
+            written += len(header)
+            expected = max(1, target_bytes // self._block_bytes(kind))
+            for block in blocks(user, day, expected):
+                handle.write(block)
+                written += len(block.encode('utf-8'))
+                errors += 1
+                if written >= target_bytes:
+                    break
+        return {'bytes': written, 'errors': errors}
+
+    def write_dataset(self, output_dir: str, total_bytes: int, file_bytes: int = 2 * 1024 ** 2) -> Dict[str, Any]:
+        """
+        Write E_/EC_ files for every user, one day after another, until about
+        total_bytes have been written
+
+        Returns a manifest with every file's name, size and error count.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        rng = self._rng('dataset')
+        files = []
+        written = 0
+        day = self.start
+        while written < total_bytes:
+            for user in self.users:
+                kind = 'dotnet' if rng.random() < self.dotnet_share else 'vo'
+                prefix = 'EC' if kind == 'dotnet' else 'E'
+                filename = f"{prefix}_{day.strftime('%Y%m%d')}_{user}.LOG"
+                size = min(file_bytes, total_bytes - written)
+                # Users differ in how much they log on a given day
+                size = max(512, int(size * rng.uniform(0.5, 1.0)))
+                stats = self.write_file(os.path.join(output_dir, filename), kind, user, day, size)
+                files.append({'filename': filename, **stats})
+                written += stats['bytes']
+                if written >= total_bytes:
+                    break
+            day += timedelta(days=1)
+        return {
+            'seed': self.seed,
+            'total_bytes': written,
+            'total_errors': sum(file['errors'] for file in files),
+            'files': files
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate synthetic E_/EC_ log files")
+    parser.add_argument('output_dir')
+    parser.add_argument('--size', default='10MB', help="Total dataset size, e.g. 512KB, 50MB, 2GB")
+    parser.add_argument('--file-size', default='2MB', help="Approximate size of each file")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--burst-rate', type=float, default=0.02, help="Probability that an error starts a burst")
+    parser.add_argument('--burst-size', default='10:60', help="Min:max errors per burst")
+    parser.add_argument('--stack-depth', default='3:20', help="Min:max stack frames per error")
+    parser.add_argument('--dotnet-share', type=float, default=0.5, help="Share of EC_ (.NET) files")
+    args = parser.parse_args(argv)
+
+    generator = LogGenerator(
+        seed=args.seed,
+        users=args.users,
+        burst_rate=args.burst_rate,
+        burst_size=tuple(int(value) for value in args.burst_size.split(':')),
+        stack_depth=tuple(int(value) for value in args.stack_depth.split(':')),
+        dotnet_share=args.dotnet_share
+    )
+    manifest = generator.write_dataset(args.output_dir, parse_size(args.size), parse_size(args.file_size))
+    print(f"Wrote {len(manifest['files'])} files, {manifest['total_bytes']} bytes, {manifest['total_errors']} errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""
+Benchmark suite for the log parsers, the upload pipeline, stored payload
+encoding and the ML analyses
+
+Every run generates (or reuses) deterministic datasets with the log
+generator, measures throughput, latency and peak memory, and writes the
+results to a JSON file so runs can be compared across commits.
+
+Usage (from backend/):
+    python -m benchmarks.run_benchmarks --sizes 1MB,10MB,50MB --label baseline
+    python -m benchmarks.run_benchmarks --sizes 10MB --compare benchmarks/results/<baseline>.json
+
+Upload benchmarks run in-process on the memory storage backend, so
+no server is needed; they are skipped for datasets above MAX_FILE_SIZE.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.harness import (
+    BENCHMARK_DIR, DEFAULT_DATA_DIR, DEFAULT_RESULTS_DIR, install_memory_storage, load_files, percentile, prepare_dataset
+)
+from benchmarks.log_generator import parse_size
+
+# Metrics compared between runs; lower is better for all of them
+COMPARED_METRICS = ('seconds', 'peak_memory_mb', 'stored_bytes')
+
+
+def measure(func: Callable[[], Any], repeat: int = 3) -> Dict[str, Any]:
+    """
+    Time func over several runs, then run it once more under tracemalloc
+
+    Timings are taken without tracemalloc, which slows allocation-heavy code
+    down considerably; peak memory comes from the separate traced run.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': min(timings),
+        'median_seconds': statistics.median(timings),
+        'peak_memory_mb': round(peak / 1024 ** 2, 2),
+        'result': result
+    }
+
+
+def bench_parse(files: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    from app.api.upload import parse_log_file
+    from app.parsers.stack_trace import FrameTable
+
+    contents = [(file['filename'], file['data'].decode('utf-8', errors='ignore')) for file in files]
+    total_bytes = sum(len(file['data']) for file in files)
+    file_latencies: List[float] = []
+
+    def run():
+        file_latencies.clear()
+        frame_table = FrameTable()
+        errors = 0
+        for filename, content in contents:
+            started = time.perf_counter()
+            errors += len(parse_log_file(content, filename, frame_table))
+            file_latencies.append(time.perf_counter() - started)
+        return errors
+
+    metrics = measure(run, repeat)
+    errors = metrics.pop('result')
+    latencies = list(file_latencies)
+    return {
+        **metrics,
+        'errors': errors,
+        'mb_per_s': round(total_bytes / 1024 ** 2 / metrics['seconds'], 2),
+        'errors_per_s': round(errors / metrics['seconds'], 1),
+        'file_latency_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'file_latency_p95_ms': round(percentile(latencies, 95) * 1000, 2)
+    }
+
+
+def bench_upload(files: List[Dict[str, Any]], repeat: int, parse_cache: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Upload the whole dataset; without parse_cache every run parses from
+    scratch, with it every timed run is a re-upload of known files
+    """
+    from fastapi.testclient import TestClient
+    from app.core.config import settings
+    from app.main import app
+
+    total_bytes = sum(len(file['data']) for file in files)
+    if total_bytes > settings.MAX_FILE_SIZE:
+        return None
+
+    settings.PARSE_CACHE_ENABLED = parse_cache
+    client = TestClient(app)
+
+    def run():
+        response = client.post(
+            '/api/upload',
+            files=[('files', (file['filename'], file['data'], 'text/plain')) for file in files]
+        )
+        response.raise_for_status()
+        return response.json()['total_errors']
+
+    metrics = measure(run, repeat)
+    errors = metrics.pop('result')
+    return {
+        **metrics,
+        'errors': errors,
+        'mb_per_s': round(total_bytes / 1024 ** 2 / metrics['seconds'], 2),
+        'errors_per_s': round(errors / metrics['seconds'], 1)
+    }
+
+
+def parsed_errors(files: List[Dict[str, Any]], max_errors: int) -> List[Dict[str, Any]]:
+    """Parse and time-merge the dataset like the upload does, capped at max_errors"""
+    from app.api.upload import parse_log_file
+    from app.parsers.stack_trace import FrameTable
+    from app.parsers.timeline import merge_runs, sort_run
+
+    frame_table = FrameTable()
+    runs = [
+        sort_run(parse_log_file(file['data'].decode('utf-8', errors='ignore'), file['filename'], frame_table))
+        for file in files
+    ]
+    errors = []
+    for error in merge_runs(runs):
+        error['id'] = len(errors) + 1
+        errors.append(error)
+        if len(errors) >= max_errors:
+            break
+    return errors
+
+
+def bench_storage(errors: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Stored size, encode/decode time and end-to-end read latency of the error
+    list per payload encoding
+
+    Reads go through the file backend so they include the I/O of the stored
+    bytes; 'seconds' is the end-to-end get_json latency.
+    """
+    import tempfile
+    from app.core import codec
+    from app.core.storage import FileStorage
+
+    variants: Dict[str, Callable[[Any], bytes]] = {
+        'legacy_json': lambda value: json.dumps(value).encode('utf-8'),
+        'json_zlib': lambda value: codec.encode_value(value, 'zlib', columnar=False),
+        'columnar': lambda value: codec.encode_value(value, 'none', columnar=True),
+        'columnar_zlib': lambda value: codec.encode_value(value, 'zlib', columnar=True)
+    }
+    if codec.zstandard is not None:
+        variants['columnar_zstd'] = lambda value: codec.encode_value(value, 'zstd', columnar=True)
+
+    legacy_bytes = None
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='errlog-storage-') as directory:
+        storage = FileStorage(directory)
+        for name, encode in variants.items():
+            encoded = encode(errors)
+            legacy_bytes = legacy_bytes or len(encoded)
+            encode_metrics = measure(lambda: encode(errors), repeat)
+            decode_metrics = measure(lambda: codec.decode_value(encoded), repeat)
+            storage.setex_bytes('analyzed_errors', 3600, encoded)
+            read_metrics = measure(lambda: storage.get_json('analyzed_errors'), repeat)
+            read_metrics.pop('result')
+            results[name] = {
+                **read_metrics,
+                'stored_bytes': len(encoded),
+                'size_ratio': round(len(encoded) / legacy_bytes, 3),
+                'encode_seconds': encode_metrics['seconds'],
+                'decode_seconds': decode_metrics['seconds'],
+                'encode_mb_per_s': round(legacy_bytes / 1024 ** 2 / encode_metrics['seconds'], 2),
+                'decode_mb_per_s': round(legacy_bytes / 1024 ** 2 / decode_metrics['seconds'], 2),
+                'errors': len(errors)
+            }
+    return results
+
+
+def bench_ml(errors: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    from app.analyzers.ml_analyzer import MLAnalyzer
+
+    analyzer = MLAnalyzer()
+    step = max(1, len(errors) // 5)
+    targets = errors[::step][:5]
+    batch_ids = [error['id'] for error in errors[::max(1, len(errors) // 100)][:100]]
+
+    def similar_latency():
+        latencies = []
+        for target in targets:
+            started = time.perf_counter()
+            analyzer.find_similar_errors(target, errors, limit=5)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    cases = {
+        'user_risk_scores': lambda: analyzer.calculate_user_risk_scores(errors),
+        'similar_errors': similar_latency,
+        'similar_errors_batch_100': lambda: analyzer.find_similar_errors_batch(batch_ids, errors, limit=5),
+        'auto_categorize': lambda: analyzer.auto_categorize_errors(errors),
+        'root_cause_correlations': lambda: analyzer.find_root_cause_correlations(errors)
+    }
+
+    results = {}
+    for name, case in cases.items():
+        metrics = measure(case, repeat)
+        result = metrics.pop('result')
+        metrics['errors'] = len(errors)
+        metrics['errors_per_s'] = round(len(errors) / metrics['seconds'], 1)
+        if name == 'similar_errors':
+            metrics['latency_p50_ms'] = round(percentile(result, 50) * 1000, 2)
+            metrics['latency_max_ms'] = round(max(result) * 1000, 2)
+        results[name] = metrics
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=BENCHMARK_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: List[str], seed: int, repeat: int, ml_max_errors: int, data_dir: str, skip: List[str]) -> Dict[str, Any]:
+    install_memory_storage()
+
+    results: Dict[str, Any] = {}
+    for size_label in sizes:
+        dataset = prepare_dataset(parse_size(size_label), seed, data_dir)
+        files = load_files(dataset)
+        print(f"[{size_label}] {len(files)} files, {dataset['total_bytes']} bytes, {dataset['total_errors']} errors")
+
+        size_results: Dict[str, Any] = {'bytes': dataset['total_bytes'], 'files': len(files)}
+        if 'parse' not in skip:
+            size_results['parse'] = bench_parse(files, repeat)
+            print(f"  parse: {size_results['parse']['mb_per_s']} MB/s, {size_results['parse']['errors_per_s']} errors/s")
+        if 'upload' not in skip:
+            upload = bench_upload(files, repeat)
+            if upload is None:
+                print("  upload: skipped (dataset above MAX_FILE_SIZE)")
+            else:
+                size_results['upload'] = upload
+                print(f"  upload: {upload['seconds']:.3f}s, {upload['mb_per_s']} MB/s")
+                reupload = bench_upload(files, repeat, parse_cache=True)
+                size_results['upload_reupload'] = reupload
+                print(f"  upload_reupload: {reupload['seconds']:.3f}s, {reupload['mb_per_s']} MB/s")
+        if 'storage' not in skip:
+            for name, metrics in bench_storage(parsed_errors(files, dataset['total_errors']), repeat).items():
+                size_results[f"storage.{name}"] = metrics
+                print(
+                    f"  storage.{name}: {metrics['stored_bytes']} bytes ({metrics['size_ratio']:.0%}), "
+                    f"encode {metrics['encode_seconds']:.3f}s, decode {metrics['decode_seconds']:.3f}s, "
+                    f"read {metrics['seconds'] * 1000:.1f} ms"
+                )
+        if 'ml' not in skip:
+            errors = parsed_errors(files, ml_max_errors)
+            for name, metrics in bench_ml(errors, repeat).items():
+                size_results[f"ml.{name}"] = metrics
+                print(f"  ml.{name}: {metrics['seconds']:.3f}s on {len(errors)} errors")
+        results[size_label] = size_results
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'ml_max_errors': ml_max_errors,
+        'results': results
+    }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print metric changes against a baseline run; returns the regressed metrics"""
+    regressions = []
+    print(f"\nComparison against {baseline.get('git_commit')} ({baseline.get('created')}):")
+    for size_label, benches in current['results'].items():
+        base_benches = baseline['results'].get(size_label)
+        if not base_benches:
+            continue
+        for bench, metrics in benches.items():
+            if not isinstance(metrics, dict) or bench not in base_benches:
+                continue
+            for metric in COMPARED_METRICS:
+                old, new = base_benches[bench].get(metric), metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                marker = ''
+                if change > threshold:
+                    marker = '  REGRESSION'
+                    regressions.append(f"{size_label} {bench} {metric}")
+                elif change < -threshold:
+                    marker = '  improved'
+                print(f"  {size_label:>6} {bench:<28} {metric:<15} {old:>10.3f} -> {new:>10.3f} ({change:+.1%}){marker}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the parser, upload and ML benchmarks")
+    parser.add_argument('--sizes', default='1MB,10MB', help="Comma-separated dataset sizes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark (best is reported)")
+    parser.add_argument('--ml-max-errors', type=int, default=20000, help="Errors fed to the ML benchmarks")
+    parser.add_argument('--skip', default='', help="Comma-separated groups to skip: parse, upload, storage, ml")
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--compare', help="Baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change reported as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = run_suite(
+        [size.strip() for size in args.sizes.split(',') if size.strip()],
+        args.seed,
+        args.repeat,
+        args.ml_max_errors,
+        args.data_dir,
+        [group.strip() for group in args.skip.split(',') if group.strip()]
+    )
+    report['label'] = args.label
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{args.label}.json")
+    with open(path, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare_results(json.load(handle), report, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
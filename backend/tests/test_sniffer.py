@@ -0,0 +1,68 @@
+"""
+Encoding detection of log files whose first bytes are plain ASCII
+"""
+from app.api.upload import LogStreamParser, parse_log_bytes
+from app.core.config import settings
+from app.parsers.sniffer import VISUAL_OBJECTS_DELIMITER, decode_complete, sniff_encoding, sniff_log
+from app.parsers.stack_trace import FrameTable
+
+FILENAME = "E_20250626_GAM.LOG"
+
+
+def _entry(index: int, function: str) -> str:
+    return (
+        f"{VISUAL_OBJECTS_DELIMITER}\r\n"
+        f"Error Code: 2 [ BOUND ERROR ]\r\n"
+        f"Timestamp: 26.06.2025 10:{index % 60:02d}:00\r\n"
+        f"Function: {function}\r\n"
+        f"Args: C:\\AMS\\file{index}.dbf\r\n"
+    )
+
+
+def _cp1252_log() -> bytes:
+    """Visual Objects log in cp1252 whose first umlaut comes after LOG_SNIFF_BYTES of ASCII"""
+    text = "Header line\r\n"
+    index = 0
+    while len(text) <= settings.LOG_SNIFF_BYTES:
+        text += _entry(index, "DoThing")
+        index += 1
+    text += _entry(index, "Prüfe Größe")
+    return text.encode("cp1252")
+
+
+def test_ascii_prefix_leaves_encoding_open():
+    raw = _cp1252_log()
+    assert raw[:settings.LOG_SNIFF_BYTES].isascii()
+    assert sniff_log(raw).encoding is None
+    assert sniff_encoding(raw) == "cp1252"
+    assert decode_complete(raw)[1] == "cp1252"
+
+
+def test_parse_log_bytes_keeps_late_umlauts():
+    _, errors, encoding = parse_log_bytes(_cp1252_log(), FILENAME, FrameTable())
+    assert encoding == "cp1252"
+    assert "Function: Prüfe Größe" in errors[-1]["content"]
+
+
+def test_stream_parser_keeps_late_umlauts():
+    raw = _cp1252_log()
+    parser = LogStreamParser(FILENAME, FrameTable(), offsets=True)
+    errors = []
+    for start in range(0, len(raw), 4096):
+        errors.extend(parser.feed(raw[start:start + 4096]))
+    errors.extend(parser.close())
+
+    assert parser.encoding == "cp1252"
+    assert "Function: Prüfe Größe" in errors[-1]["content"]
+    whole = parse_log_bytes(raw, FILENAME, FrameTable())[1]
+    assert [(error["offset"], error["content"]) for error in errors] == [
+        (error["offset"], error["content"]) for error in whole
+    ]
+
+
+def test_utf8_after_ascii_prefix():
+    raw = _cp1252_log().decode("cp1252").encode("utf-8")
+    assert sniff_encoding(raw) == "utf-8"
+    _, errors, encoding = parse_log_bytes(raw, FILENAME, FrameTable())
+    assert encoding == "utf-8"
+    assert "Function: Prüfe Größe" in errors[-1]["content"]
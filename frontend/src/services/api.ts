@@ -49,7 +49,7 @@ api.interceptors.response.use(
 )
 
 // File upload
-export async function uploadFiles(files: File[]) {
+export async function uploadFiles(files: File[], uploadId?: string) {
   const formData = new FormData()
   files.forEach((file) => {
     formData.append('files', file)
@@ -58,16 +58,97 @@ export async function uploadFiles(files: File[]) {
   const response = await api.post('/api/upload', formData, {
     headers: {
       'Content-Type': 'multipart/form-data'
-    }
+    },
+    params: uploadId ? { upload_id: uploadId } : undefined
   })
 
   return response.data
 }
 
-// Log type detection
-export async function detectLogTypes(filenames: string[]) {
-  const response = await api.post('/api/analyze/detect-types', {
-    filenames
+// Resumable chunked upload for large log sets: each chunk is retried from
+// the offset the server reports, so a dropped connection resends one chunk.
+// onSession receives the session ID, which is also its progress stream's upload ID
+export async function uploadFilesResumable(
+  files: File[], maxRetries = 5, onSession?: (sessionId: string) => void
+) {
+  const session = (await api.post('/api/upload-sessions', {
+    files: files.map((file) => ({ filename: file.name, size: file.size }))
+  })).data
+  onSession?.(session.session_id)
+  const chunkSize: number = session.chunk_size
+
+  for (const [index, file] of files.entries()) {
+    let offset = 0
+    let failures = 0
+    while (offset < file.size) {
+      try {
+        const response = await api.put(
+          `/api/upload-sessions/${session.session_id}/files/${index}`,
+          file.slice(offset, offset + chunkSize),
+          {
+            params: { offset },
+            headers: { 'Content-Type': 'application/octet-stream' },
+            timeout: 0
+          }
+        )
+        offset = response.data.received
+        failures = 0
+      } catch (error: any) {
+        if (++failures > maxRetries) throw error
+        const status = (await api.get(`/api/upload-sessions/${session.session_id}`)).data
+        offset = status.files[index].received
+      }
+    }
+  }
+
+  const response = await api.post(`/api/upload-sessions/${session.session_id}/finalize`, null, {
+    timeout: 0
+  })
+  return response.data
+}
+
+// Upload progress stream (Server-Sent Events)
+export interface UploadProgressHandlers {
+  onProgress?: (progress: any) => void
+  onCritical?: (error: any) => void
+  onDone?: (progress: any) => void
+}
+
+export function subscribeUploadProgress(uploadId: string, handlers: UploadProgressHandlers) {
+  const source = new EventSource(`${API_BASE_URL}/api/upload/${uploadId}/events`)
+
+  source.addEventListener('progress', (event) => {
+    handlers.onProgress?.(JSON.parse((event as MessageEvent).data))
+  })
+  source.addEventListener('critical', (event) => {
+    handlers.onCritical?.(JSON.parse((event as MessageEvent).data))
+  })
+  const finish = (event: Event) => {
+    source.close()
+    const data = (event as MessageEvent).data
+    handlers.onDone?.(data ? JSON.parse(data) : null)
+  }
+  source.addEventListener('completed', finish)
+  source.addEventListener('failed', finish)
+  source.addEventListener('error', finish)
+
+  return source
+}
+
+// Bytes the server inspects to detect format and encoding (LOG_SNIFF_BYTES)
+const SNIFF_BYTES = 64 * 1024
+
+// Log type detection; only the beginning of each file is sent
+export async function detectLogTypes(files: File[]) {
+  const formData = new FormData()
+  files.forEach((file) => {
+    formData.append('files', file.slice(0, SNIFF_BYTES), file.name)
+  })
+
+  const response = await api.post('/api/analyze/detect-types', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data'
+    }
   })
   return response.data
 }
@@ -112,6 +193,12 @@ export async function getErrors(page = 1, limit = 100) {
   return response.data
 }
 
+// Get the complete original log entry of an error
+export async function getErrorRawEntry(errorId: number) {
+  const response = await api.get(`/api/errors/${errorId}/raw`)
+  return response.data
+}
+
 // Get error types distribution
 export async function getErrorTypes() {
   const response = await api.get('/api/errors/types')